@@ -16,6 +16,7 @@
 #include "packets.h"
 
 #include "ipc/MongoIPC.h"
+#include "ipc/IPCService.h"
 #include "ipc/RFProtocol.h"
 #include "ipc/RFProtocolFactory.h"
 #include "OFInterface.hh"
@@ -181,6 +182,43 @@ bool rfproxy::process(const string &from, const string &to,
             send_of_msg(rmmsg->get_id(), ofmsg.get());
         }
     }
+    else if (type == ROUTE_MOD_BATCH) {
+        RouteModBatch* rmbmsg = static_cast<RouteModBatch*>(&msg);
+        std::vector<Route> routes = rmbmsg->get_routes();
+        std::vector<Option> batch_options = rmbmsg->get_options();
+        int sent = 0;
+
+        // Send the flow_mods back to back, followed by a single barrier
+        std::vector<Route>::iterator iter;
+        for (iter = routes.begin(); iter != routes.end(); ++iter) {
+            std::vector<Option> options = batch_options;
+            std::vector<Option> route_options = iter->get_options();
+            options.insert(options.end(), route_options.begin(),
+                           route_options.end());
+            boost::shared_array<uint8_t> ofmsg = create_flow_mod(
+                                        rmbmsg->get_mod(),
+                                        iter->get_matches(),
+                                        iter->get_actions(),
+                                        options);
+            if (ofmsg.get() == NULL) {
+                VLOG_DBG(lg, "Failed to create OpenFlow FlowMod");
+            } else if (send_of_msg(rmbmsg->get_id(), ofmsg.get()) == SUCCESS) {
+                sent++;
+            }
+        }
+
+        if (sent > 0) {
+            ofp_header obr;
+            obr.type = OFPT_BARRIER_REQUEST;
+            obr.version = OFP_VERSION;
+            obr.length = htons(sizeof obr);
+            obr.xid = 0;
+            send_of_msg(rmbmsg->get_id(), (uint8_t*) &obr);
+        }
+        VLOG_INFO(lg,
+            "%d ofp_flow_mod(s) were sent to datapath (dp_id=%0#"PRIx64")",
+            sent, rmbmsg->get_id());
+    }
     else if (type == DATA_PLANE_MAP) {
         DataPlaneMap* dpmmsg = dynamic_cast<DataPlaneMap*>(&msg);
         table.update_dp_port(dpmmsg->get_dp_id(), dpmmsg->get_dp_port(),
@@ -195,7 +233,7 @@ void rfproxy::configure(const Configuration* c) {
 }
 
 void rfproxy::install() {
-    ipc = new MongoIPCMessageService(MONGO_ADDRESS, MONGO_DB_NAME, to_string<uint64_t>(ID));
+    ipc = createIPCService(MONGO_ADDRESS, to_string<uint64_t>(ID));
     factory = new RFProtocolFactory();
     ipc->listen(RFSERVER_RFPROXY_CHANNEL, factory, this, false);
 
@@ -1,37 +1,58 @@
 import struct
+import time
 import logging
+from collections import deque
 
 from pox.core import core
 from pox.openflow.libopenflow_01 import *
 import pymongo as mongo
 
 import rflib.ipc.IPC as IPC
-import rflib.ipc.MongoIPC as MongoIPC
+import rflib.ipc.IPCService as IPCService
+from rflib.ipc.IPCMetrics import ROUTE_INSTALL_LATENCY
+from rflib.ipc.MongoIPC import format_address
 from rflib.ipc.RFProtocol import *
 from rflib.openflow.rfofmsg import *
 from rflib.ipc.RFProtocolFactory import RFProtocolFactory
 from rflib.defs import *
+from rflib.types.Route import Route
 
 FAILURE = 0
 SUCCESS = 1
 
 # Association table
+#
+# dp_to_vs is indexed by datapath (dp_id -> {dp_port -> (vs_id, vs_port)}), so
+# the mappings of a datapath going down are dropped without scanning the rest.
 class Table:
     def __init__(self):
         self.dp_to_vs = {}
         self.vs_to_dp = {}
 
     def update_dp_port(self, dp_id, dp_port, vs_id, vs_port):
+        ports = self.dp_to_vs.setdefault(dp_id, {})
         # If there was a mapping for this DP port, reset it
-        if (dp_id, dp_port) in self.dp_to_vs:
-            old_vs_port = self.dp_to_vs[(dp_id, dp_port)]
+        old_vs_port = ports.get(dp_port)
+        if old_vs_port is not None and \
+           self.vs_to_dp.get(old_vs_port) == (dp_id, dp_port):
             del self.vs_to_dp[old_vs_port]
-        self.dp_to_vs[(dp_id, dp_port)] = (vs_id, vs_port)
+        # If the VS port was mapped to another DP port, that mapping is stale
+        old_dp_port = self.vs_to_dp.get((vs_id, vs_port))
+        if old_dp_port is not None and old_dp_port != (dp_id, dp_port):
+            self._delete_dp_port(*old_dp_port)
+        ports[dp_port] = (vs_id, vs_port)
         self.vs_to_dp[(vs_id, vs_port)] = (dp_id, dp_port)
 
+    def _delete_dp_port(self, dp_id, dp_port):
+        ports = self.dp_to_vs.get(dp_id)
+        if ports is not None:
+            ports.pop(dp_port, None)
+            if not ports:
+                del self.dp_to_vs[dp_id]
+
     def dp_port_to_vs_port(self, dp_id, dp_port):
         try:
-            return self.dp_to_vs[(dp_id, dp_port)]
+            return self.dp_to_vs[dp_id][dp_port]
         except KeyError:
             return None
 
@@ -42,118 +63,419 @@ class Table:
             return None
 
     def delete_dp(self, dp_id):
-        for (id_, port) in self.dp_to_vs.keys():
-            if id_ == dp_id:
-                del self.dp_to_vs[(id_, port)]
-
-        for key in self.vs_to_dp.keys():
-            id_, port = self.vs_to_dp[key]
-            if id_ == dp_id:
-                del self.vs_to_dp[key]
-
-    # We're not considering the case of this table becoming invalid when a
-    # datapath goes down. When the datapath comes back, the server recreates
-    # the association, forcing new map messages to be generated, overriding the
-    # previous mapping.
-    # If a packet comes and matches the invalid mapping, it can be redirected
-    # to the wrong places. We have to fix this.
-
-netmask_prefix = lambda a: sum([bin(int(x)).count("1") for x in a.split(".", 4)])
+        # When the datapath comes back, the server recreates the association
+        # and sends new map messages
+        for (dp_port, vs_port) in self.dp_to_vs.pop(dp_id, {}).items():
+            if self.vs_to_dp.get(vs_port) == (dp_id, dp_port):
+                del self.vs_to_dp[vs_port]
+
+    # Returns every mapping as a (dp_id, dp_port, vs_id, vs_port) tuple
+    def snapshot(self):
+        return [(dp_id, dp_port, vs_id, vs_port)
+                for (dp_id, ports) in self.dp_to_vs.items()
+                for (dp_port, (vs_id, vs_port)) in ports.items()]
+
+    # Replaces the contents of the table with the given mappings
+    def restore(self, mappings):
+        self.dp_to_vs = {}
+        self.vs_to_dp = {}
+        for (dp_id, dp_port, vs_id, vs_port) in mappings:
+            self.update_dp_port(dp_id, dp_port, vs_id, vs_port)
 
 # TODO: add proper support for ID
 ID = 0
-ipc = MongoIPC.MongoIPCMessageService(MONGO_ADDRESS, MONGO_DB_NAME, str(ID))
+ipc = IPCService.create_ipc_service(str(ID))
 table = Table()
 
 # Logging
 log = core.getLogger("rfproxy")
 
-# Base methods
-def send_of_msg(dp_id, ofmsg):
-    topology = core.components['topology']
-    switch = topology.getEntityByID(dp_id)
-    if switch is not None and switch.connected:
-        try:
-            switch.send(ofmsg)
-        except:
-            return FAILURE
-        return SUCCESS
-    else:
-        return FAILURE
+# Packet relay
+#
+# Control-plane packets are relayed between RFVS and the datapaths without
+# building an ofp_packet_out: the part of the message after the header only
+# depends on the output port, so it is packed once per port and reused. The
+# whole packet is always sent, since a buffer_id is only valid on the datapath
+# that buffered the packet and the relay forwards to a different one.
+PACKET_OUT_HEADER = struct.Struct("!BBHL")
+PACKET_OUT_TAIL = struct.Struct("!LHH")
+packet_out_tails = {}
+
+# Connections of the datapaths that are up, by dp_id
+connections = {}
+
+def packet_out_tail(port):
+    tail = packet_out_tails.get(port)
+    if tail is None:
+        action = ofp_action_output(port=port).pack()
+        tail = PACKET_OUT_TAIL.pack(NO_BUFFER, OFPP_NONE, len(action)) + action
+        packet_out_tails[port] = tail
+    return tail
 
 def send_packet_out(dp_id, port, data):
-    msg = ofp_packet_out()
-    msg.actions.append(ofp_action_output(port=port))
-    msg.data = data
-    msg.in_port = OFPP_NONE
-    topology = core.components['topology']
-    switch = topology.getEntityByID(dp_id)
-    if switch is not None and switch.connected:
-        try:
-            switch.send(msg)
-        except:
-            return FAILURE
-        return SUCCESS
-    else:
+    connection = connections.get(dp_id)
+    if connection is None:
         return FAILURE
+    tail = packet_out_tail(port)
+    header = PACKET_OUT_HEADER.pack(OFP_VERSION, OFPT_PACKET_OUT,
+                                    PACKET_OUT_HEADER.size + len(tail) +
+                                    len(data), generateXID())
+    try:
+        connection.send(header + tail + data)
+    except:
+        return FAILURE
+    return SUCCESS
 
 # Flow installation methods
 def flow_config(dp_id, operation_id):
     ofmsg = create_config_msg(operation_id)
-    if send_of_msg(dp_id, ofmsg) == SUCCESS:
+    pipeline = pipelines.get(dp_id)
+    if pipeline is not None:
+        # Kept in order with the flow_mods waiting in the pipeline
+        pipeline.send(ofmsg)
         log.info("ofp_flow_mod(config) was sent to datapath (dp_id=%s)",
                  format_id(dp_id))
     else:
         log.info("Error sending ofp_flow_mod(config) to datapath (dp_id=%s)",
                  format_id(dp_id))
 
-def flow_add(dp_id, address, netmask, src_hwaddress, dst_hwaddress, dst_port):
-    netmask = netmask_prefix(netmask)
-    address = address + "/" + str(netmask)
-
-    ofmsg = create_flow_install_msg(address, netmask,
-                                    src_hwaddress, dst_hwaddress,
-                                    dst_port)
-    if send_of_msg(dp_id, ofmsg) == SUCCESS:
-        log.info("ofp_flow_mod(add) was sent to datapath (dp_id=%s)",
-                 format_id(dp_id))
-    else:
-        log.info("Error sending ofp_flow_mod(add) to datapath (dp_id=%s)",
-                 format_id(dp_id))
-
-def flow_delete(dp_id, address, netmask, src_hwaddress):
-    netmask = netmask_prefix(netmask)
-    address = address + "/" + str(netmask)
-
-    ofmsg1 = create_flow_remove_msg(address, netmask, src_hwaddress)
-    if send_of_msg(dp_id, ofmsg1) == SUCCESS:
-        log.info("ofp_flow_mod(delete) was sent to datapath (dp_id=%s)",
-                 format_id(dp_id))
-    else:
-        log.info("Error sending ofp_flow_mod(delete) to datapath (dp_id=%s)",
-                 format_id(dp_id))
-
-    ofmsg2 = create_temporary_flow_msg(address, netmask, src_hwaddress)
-    if send_of_msg(dp_id, ofmsg2) == SUCCESS:
-        log.info("ofp_flow_mod(delete) was sent to datapath (dp_id=%s)",
-                 format_id(dp_id))
+# Flow installation pipeline
+#
+# The flow_mods of every RouteMod for a datapath are sent back to back, with
+# a barrier after every BARRIER_INTERVAL of them and at the end of each burst
+# of RouteMods. A flow_mod is installed once a barrier sent after it is
+# answered without an error carrying its xid. When every flow_mod of a
+# RouteMod is settled, its outcome is queued as a RouteModResult; the results
+# queued for a datapath go to RFServer in a single insert once the barrier
+# reply (or flow stats reply) that settled them is handled. At most
+# MAX_IN_FLIGHT flow_mods are left unacknowledged per datapath, and none are
+# sent while the connection is blocked (between SendQueueHigh and
+# SendQueueLow); the others wait here until barrier replies come back or the
+# switch catches up.
+#
+# The pipelines run in the POX thread (see install_routes).
+BARRIER_INTERVAL = 64
+MAX_IN_FLIGHT = 1024
+
+class InstallRequest:
+    def __init__(self, dp_id, mod, type_, origin):
+        self.dp_id = dp_id
+        self.mod = mod
+        self.type_ = type_
+        self.origin = origin
+        self.started = time.time()
+        self.remaining = 0
+        self.installed = 0
+        self.failed = []
+        # Type and code of the first OpenFlow error
+        self.error = (0, 0)
+
+# Flow tables
+#
+# A flow table is viewed as a dict from (packed match, priority) to the
+# flow_mod (or flow stats entry) of the flow. rfproxy keeps the desired table
+# of every datapath, even while it is down, and applies the RouteMods that
+# arrive for it in the meantime, so a reconnecting switch only receives the
+# difference between what it holds and that table. Routes are not replayed by
+# rfclient, so dropping the table would make reconciliation delete every
+# flow of the switch. The routes a VM withdraws through the ports of a down
+# datapath are held back by rfclient, so those stay until they change again.
+RECONCILE_TIMEOUT = 10 # Seconds to wait for the flow stats of a switch
+
+# Desired flow table of each datapath, by dp_id
+desired_flows = {}
+
+def flow_key(flow):
+    return (flow.match.pack(), flow.priority)
+
+def flow_actions(flow):
+    return "".join(action.pack() for action in flow.actions)
+
+# Applies a flow_mod to a flow table. Returns False if it would not change it.
+def apply_flow_mod(flows, ofm):
+    key = flow_key(ofm)
+    if ofm.command == OFPFC_ADD:
+        current = flows.get(key)
+        if current is not None and \
+           flow_actions(current) == flow_actions(ofm):
+            return False
+        flows[key] = ofm
+    elif ofm.command == OFPFC_DELETE_STRICT:
+        if key not in flows:
+            return False
+        del flows[key]
+    elif ofm.command == OFPFC_DELETE:
+        # Only used to clear the whole table (DC_CLEAR_FLOW_TABLE)
+        flows.clear()
+    return True
+
+def create_flow_delete_msg(flow):
+    return ofp_flow_mod(command=OFPFC_DELETE_STRICT, match=flow.match,
+                        priority=flow.priority, out_port=OFPP_NONE)
+
+class InstallPipeline:
+    def __init__(self, dp_id, connection, reconcile=False):
+        self.dp_id = dp_id
+        self.connection = connection
+        self.flows = desired_flows.setdefault(dp_id, {})
+        # (flow_mod, route, request) waiting to be sent; flow_mods without a
+        # request are not tracked
+        self.queue = deque()
+        # xid -> (route, request) for flow_mods sent and not yet settled
+        self.in_flight = {}
+        # xids of the flow_mods sent since the last barrier
+        self.unbarriered = []
+        # barrier xid -> xids of the flow_mods it acknowledges
+        self.barriers = {}
+        self.flush_scheduled = False
+        # xid of the flow stats request the pipeline is held for
+        self.reconcile_xid = None
+        # RouteModResults waiting to be sent
+        self.results = []
+        if reconcile:
+            self.start_reconcile()
+
+    def submit(self, request, routes):
+        for route in routes:
+            ofmsg = create_flow_mod(request.mod, route.get_matches(),
+                                    route.get_actions(), route.get_options())
+            if ofmsg is None:
+                log.debug("Failed to create OpenFlow FlowMod")
+                request.failed.append(route)
+                continue
+            self.enqueue(ofmsg, route, request)
+            request.remaining += 1
+        if request.remaining == 0:
+            self.results.append(route_mod_result(request))
+            self.send_results()
+            return
+        self.pump()
+
+    # Sends a flow_mod that is not tracked, after the queued ones
+    def send(self, ofmsg):
+        self.enqueue(ofmsg)
+        self.pump()
+
+    def enqueue(self, ofmsg, route=None, request=None):
+        apply_flow_mod(self.flows, ofmsg)
+        self.queue.append((ofmsg, route, request))
+
+    def pump(self):
+        if self.reconcile_xid is not None:
+            return
+        frames = []
+        while self.queue and len(self.in_flight) < MAX_IN_FLIGHT and \
+              not self.connection.blocked:
+            (ofmsg, route, request) = self.queue.popleft()
+            ofmsg.xid = generateXID()
+            frames.append(ofmsg.pack())
+            if request is None:
+                continue
+            self.in_flight[ofmsg.xid] = (route, request)
+            self.unbarriered.append(ofmsg.xid)
+            if len(self.unbarriered) >= BARRIER_INTERVAL:
+                frames.append(self.barrier())
+        # Make sure a full window is acknowledged
+        if self.queue and self.unbarriered:
+            frames.append(self.barrier())
+        if frames:
+            self.connection.send("".join(frames))
+        if self.unbarriered and not self.flush_scheduled:
+            # Runs after the RouteMods that are already waiting
+            self.flush_scheduled = True
+            core.callLater(self.flush)
+
+    def flush(self):
+        self.flush_scheduled = False
+        if self.unbarriered:
+            self.connection.send(self.barrier())
+
+    def barrier(self):
+        msg = ofp_barrier_request(xid=generateXID())
+        self.barriers[msg.xid] = self.unbarriered
+        self.unbarriered = []
+        return msg.pack()
+
+    # Reconciliation
+    #
+    # The pipeline is held while the flows of the switch are fetched. The
+    # flows that are not queued are then brought to the desired state with
+    # a delete for every stale flow and an add for every missing or changed
+    # one. Queued flow_mods that would not change the switch are dropped.
+    def start_reconcile(self):
+        msg = ofp_stats_request(body=ofp_flow_stats_request())
+        msg.xid = generateXID()
+        self.reconcile_xid = msg.xid
+        self.connection.send(msg)
+        core.callDelayed(RECONCILE_TIMEOUT, self.reconcile_timeout, msg.xid)
+
+    def reconcile_timeout(self, xid):
+        if self.reconcile_xid == xid:
+            log.warning("No flow stats from datapath, sending every queued "
+                        "flow_mod (dp_id=%s)", format_id(self.dp_id))
+            self.reconcile_xid = None
+            self.pump()
+
+    def on_flow_stats(self, xid, stats):
+        if self.reconcile_xid != xid:
+            return
+        self.reconcile_xid = None
+
+        switch = {}
+        for flow in stats:
+            switch[flow_key(flow)] = flow
+        queued = set(flow_key(ofmsg) for (ofmsg, _, _) in self.queue)
+
+        diff = []
+        for (key, flow) in switch.items():
+            if key not in self.flows and key not in queued:
+                diff.append((create_flow_delete_msg(flow), None, None))
+                del switch[key]
+        for (key, ofm) in self.flows.items():
+            if key not in queued and apply_flow_mod(switch, ofm):
+                diff.append((ofm, None, None))
+
+        queue = self.queue
+        self.queue = deque(diff)
+        skipped = 0
+        for (ofmsg, route, request) in queue:
+            if apply_flow_mod(switch, ofmsg):
+                self.queue.append((ofmsg, route, request))
+            else:
+                # Already on the switch
+                skipped += 1
+                if request is not None:
+                    request.installed += 1
+                    self.settle(request)
+
+        log.info("Reconciled flow table (dp_id=%s, flows=%d, flow_mods=%d, "
+                 "skipped=%d)", format_id(self.dp_id), len(stats),
+                 len(self.queue), skipped)
+        self.send_results()
+        self.pump()
+
+    def on_error(self, xid, error_type, error_code):
+        if xid == self.reconcile_xid:
+            self.reconcile_timeout(xid)
+            return
+        entry = self.in_flight.pop(xid, None)
+        if entry is None:
+            return
+        (route, request) = entry
+        request.failed.append(route)
+        if len(request.failed) == 1:
+            request.error = (error_type, error_code)
+        self.settle(request)
+
+    def on_barrier(self, xid):
+        xids = self.barriers.pop(xid, None)
+        if xids is None:
+            return
+        for xid in xids:
+            entry = self.in_flight.pop(xid, None)
+            if entry is not None:
+                (route, request) = entry
+                request.installed += 1
+                self.settle(request)
+        # Along with the results of errors received before this reply
+        self.send_results()
+        self.pump()
+
+    def settle(self, request):
+        request.remaining -= 1
+        if request.remaining == 0:
+            self.results.append(route_mod_result(request))
+
+    def send_results(self):
+        if self.results:
+            ipc.send_many(RFSERVER_RFPROXY_CHANNEL, RFSERVER_ID, self.results)
+            self.results = []
+
+    # Returns the number of flow_mods that will never be acknowledged. The
+    # desired flow table is kept for when the datapath comes back.
+    def abort(self):
+        lost = len([entry for entry in self.queue if entry[2] is not None]) + \
+               len(self.in_flight)
+        self.queue.clear()
+        self.in_flight = {}
+        self.unbarriered = []
+        self.barriers = {}
+        self.reconcile_xid = None
+        self.send_results()
+        return lost
+
+# Pipelines of the datapaths that are up, by dp_id
+pipelines = {}
+
+# Called in the POX thread with the routes of a RouteMod or RouteModBatch
+def install_routes(dp_id, mod, routes, type_, origin):
+    request = InstallRequest(dp_id, mod, type_, origin)
+    pipeline = pipelines.get(dp_id)
+    if pipeline is None:
+        # Not installed now, but installed by reconciliation if the datapath
+        # comes back
+        flows = desired_flows.get(dp_id)
+        if flows is not None:
+            for route in routes:
+                ofmsg = create_flow_mod(mod, route.get_matches(),
+                                        route.get_actions(),
+                                        route.get_options())
+                if ofmsg is not None:
+                    apply_flow_mod(flows, ofmsg)
+        log.info("%d route(s) for disconnected datapath were not installed "
+                 "(dp_id=%s)", len(routes), format_id(dp_id))
+        request.failed = list(routes)
+        ipc.send(RFSERVER_RFPROXY_CHANNEL, RFSERVER_ID,
+                 route_mod_result(request))
+        return
+    pipeline.submit(request, routes)
+
+# Logs the outcome of a request and returns the RouteModResult reporting it
+def route_mod_result(request):
+    if request.failed:
+        log.warning("%d of %d ofp_flow_mod(s) failed on datapath "
+                    "(dp_id=%s, error_type=%d, error_code=%d)",
+                    len(request.failed),
+                    request.installed + len(request.failed),
+                    format_id(request.dp_id), request.error[0],
+                    request.error[1])
     else:
-        log.info("Error sending ofp_flow_mod(delete) to datapath (dp_id=%s)",
-                 format_id(dp_id))
+        log.debug("%d ofp_flow_mod(s) were installed on datapath (dp_id=%s)",
+                  request.installed, format_id(request.dp_id))
+
+    # From the rfclient RouteMod to the flow_mods being acknowledged
+    ipc.metrics.observe(ROUTE_INSTALL_LATENCY, RFSERVER_RFPROXY_CHANNEL,
+                        request.type_,
+                        time.time() - (request.origin or request.started))
+
+    msg = RouteModResult(ct_id=ID, id=request.dp_id, mod=request.mod,
+                         installed=request.installed,
+                         failed=[route.to_dict() for route in request.failed],
+                         error_type=request.error[0],
+                         error_code=request.error[1])
+    msg.origin = request.origin
+    return msg
 
 # Event handlers
 def on_datapath_up(event):
     topology = core.components['topology']
     dp_id = event.dpid
+    connections[dp_id] = event.connection
+    # RFVS is configured once by RFServer, so its flows are left alone
+    pipelines[dp_id] = InstallPipeline(dp_id, event.connection,
+                                       reconcile=RECONCILE_FLOW_TABLES and
+                                                 not is_rfvs(dp_id))
 
     ports = topology.getEntityByID(dp_id).ports
+    msgs = []
     for port in ports:
         if port <= OFPP_MAX:
-            msg = DatapathPortRegister(ct_id=ID, dp_id=dp_id, dp_port=port)
-            ipc.send(RFSERVER_RFPROXY_CHANNEL, RFSERVER_ID, msg)
-
+            msgs.append(DatapathPortRegister(ct_id=ID, dp_id=dp_id,
+                                             dp_port=port))
             log.info("Registering datapath port (dp_id=%s, dp_port=%d)",
                      format_id(dp_id), port)
+    # Register all ports of the datapath with a single insert
+    ipc.send_many(RFSERVER_RFPROXY_CHANNEL, RFSERVER_ID, msgs)
 
 def on_datapath_down(event):
     dp_id = event.dpid
@@ -161,37 +483,69 @@ def on_datapath_down(event):
     log.info("Datapath is down (dp_id=%s)", format_id(dp_id))
 
     table.delete_dp(dp_id)
+    if connections.get(dp_id) is event.connection:
+        del connections[dp_id]
+        lost = pipelines.pop(dp_id).abort()
+        if lost:
+            log.info("%d ofp_flow_mod(s) were not acknowledged (dp_id=%s)",
+                     lost, format_id(dp_id))
 
     msg = DatapathDown(ct_id=ID, dp_id=dp_id)
     ipc.send(RFSERVER_RFPROXY_CHANNEL, RFSERVER_ID, msg)
 
+# Ethertypes are compared as raw bytes, so packets are never parsed
+LLDP_ETHERTYPE = struct.pack("!H", ethernet.LLDP_TYPE)
+RF_ETHERTYPE = struct.pack("!H", RF_ETH_PROTO)
+MAPPING_PACKET = struct.Struct("QB")
+
+def on_barrier_in(event):
+    pipeline = pipelines.get(event.dpid)
+    if pipeline is not None:
+        pipeline.on_barrier(event.xid)
+
+def on_error_in(event):
+    pipeline = pipelines.get(event.connection.dpid)
+    if pipeline is not None:
+        pipeline.on_error(event.xid, event.ofp.type, event.ofp.code)
+
+def on_send_queue_low(event):
+    pipeline = pipelines.get(event.dpid)
+    if pipeline is not None and pipeline.connection is event.connection:
+        pipeline.pump()
+
+def on_flow_stats(event):
+    pipeline = pipelines.get(event.connection.dpid)
+    if pipeline is not None:
+        pipeline.on_flow_stats(event.ofp[0].xid, event.stats)
+
 def on_packet_in(event):
-    packet = event.parsed
+    data = event.data
     dp_id = event.dpid
     in_port = event.port
+    ethertype = data[12:14]
 
     # Drop all LLDP packets
-    if packet.type == ethernet.LLDP_TYPE:
+    if ethertype == LLDP_ETHERTYPE:
         return
 
     # If we have a mapping packet, inform RFServer through a Map message
-    if packet.type == RF_ETH_PROTO:
-        vm_id, vm_port = struct.unpack("QB", packet.raw[14:])
+    if ethertype == RF_ETHERTYPE:
+        vm_id, vm_port = MAPPING_PACKET.unpack_from(data, 14)
 
         log.info("Received mapping packet (vm_id=%s, vm_port=%d, vs_id=%s, vs_port=%d)",
-                 format_id(vm_id), vm_port, event.dpid, event.port)
+                 format_id(vm_id), vm_port, dp_id, in_port)
 
         msg = VirtualPlaneMap(vm_id=vm_id, vm_port=vm_port,
-                              vs_id=event.dpid, vs_port=event.port)
+                              vs_id=dp_id, vs_port=in_port)
         ipc.send(RFSERVER_RFPROXY_CHANNEL, RFSERVER_ID, msg)
         return
 
     # If the packet came from RFVS, redirect it to the right switch port
-    if is_rfvs(event.dpid):
+    if is_rfvs(dp_id):
         dp_port = table.vs_port_to_dp_port(dp_id, in_port)
         if dp_port is not None:
             dp_id, dp_port = dp_port
-            send_packet_out(dp_id, dp_port, event.data)
+            send_packet_out(dp_id, dp_port, data)
         else:
             log.debug("Unmapped RFVS port (vs_id=%s, vs_port=%d)",
                       format_id(dp_id), in_port)
@@ -200,28 +554,31 @@ def on_packet_in(event):
         vs_port = table.dp_port_to_vs_port(dp_id, in_port)
         if vs_port is not None:
             vs_id, vs_port = vs_port
-            send_packet_out(vs_id, vs_port, event.data)
+            send_packet_out(vs_id, vs_port, data)
         else:
             log.debug("Unmapped datapath port (dp_id=%s, dp_port=%d)",
                       format_id(dp_id), in_port)
 
 # IPC message Processing
 class RFProcessor(IPC.IPCMessageProcessor):
+    # Flow installation is handed to the POX thread, in the order the
+    # messages arrive
     def process(self, from_, to, channel, msg):
-        topology = core.components['topology']
         type_ = msg.get_type()
         if type_ == DATAPATH_CONFIG:
-            flow_config(msg.get_dp_id(), msg.get_operation_id())
-        elif type_ == FLOW_MOD:
-            if (msg.get_is_removal()):
-                flow_delete(msg.get_dp_id(),
-                            msg.get_address(), msg.get_netmask(),
-                            msg.get_src_hwaddress())
-            else:
-                flow_add(msg.get_dp_id(),
-                         msg.get_address(), msg.get_netmask(),
-                         msg.get_src_hwaddress(), msg.get_dst_hwaddress(),
-                         msg.get_dst_port())
+            core.callLater(flow_config, msg.get_dp_id(),
+                           msg.get_operation_id())
+        elif type_ == ROUTE_MOD:
+            core.callLater(install_routes, msg.get_id(), msg.get_mod(),
+                           [Route(msg.get_matches(), msg.get_actions(),
+                                  msg.get_options())],
+                           type_, msg.origin)
+        elif type_ == ROUTE_MOD_BATCH:
+            routes = [Route.from_dict(route) for route in msg.get_routes()]
+            for route in routes:
+                route.options = msg.get_options() + route.get_options()
+            core.callLater(install_routes, msg.get_id(), msg.get_mod(),
+                           routes, type_, msg.origin)
 
         if type_ == DATA_PLANE_MAP:
             table.update_dp_port(msg.get_dp_id(), msg.get_dp_port(),
@@ -229,10 +586,36 @@ class RFProcessor(IPC.IPCMessageProcessor):
 
         return True
 
+# Rebuild the association table from the active entries of RFServer's table,
+# instead of waiting for every DataPlaneMap to be sent again
+def restore_table():
+    fields = ("dp_id", "dp_port", "vs_id", "vs_port")
+    try:
+        connection = mongo.Connection(*format_address(MONGO_ADDRESS))
+        docs = connection[MONGO_DB_NAME][RFTABLE_NAME].find(
+                   {"ct_id": {"$in": [ID, str(ID)]}}, fields=fields)
+        mappings = [(parse_table_id(doc["dp_id"]), int(doc["dp_port"]),
+                     parse_table_id(doc["vs_id"]), int(doc["vs_port"]))
+                    for doc in docs
+                    if all(doc.get(f) not in (None, "") for f in fields)]
+    except mongo.errors.PyMongoError, e:
+        log.warning("Could not restore the association table: %s", e)
+        return
+    table.restore(mappings)
+    log.info("Restored %d port mappings", len(mappings))
+
 # Initialization
 def launch ():
+    restore_table()
+    if RECONCILE_FLOW_TABLES:
+        # Keep the flows of connecting switches for reconciliation
+        core.openflow.clear_flows_on_connect = False
     core.openflow.addListenerByName("ConnectionUp", on_datapath_up)
     core.openflow.addListenerByName("ConnectionDown", on_datapath_down)
     core.openflow.addListenerByName("PacketIn", on_packet_in)
+    core.openflow.addListenerByName("BarrierIn", on_barrier_in)
+    core.openflow.addListenerByName("ErrorIn", on_error_in)
+    core.openflow.addListenerByName("FlowStatsReceived", on_flow_stats)
+    core.openflow.addListenerByName("SendQueueLow", on_send_queue_low)
     ipc.listen(RFSERVER_RFPROXY_CHANNEL, RFProtocolFactory(), RFProcessor(), False)
     log.info("RFProxy running.")
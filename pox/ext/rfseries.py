@@ -0,0 +1,95 @@
+# Time series of switch counters
+#
+# Every sample goes into a set of tiers. Each tier has a fixed period: the
+# samples falling in the same period are downsampled into one point, which
+# keeps the last value of the counters and the mean of the rates. Every
+# finished point is pushed to a bucket document in Mongo, holding
+# POINTS_PER_DOCUMENT points of a tier, so that a range query (see series in
+# rfweb) only reads the buckets covering the range. Only the point being
+# built is kept in memory.
+
+SERIES_COLLECTION = "rfseries"
+
+# (period, seconds kept in Mongo) of each tier
+TIERS = ((5, 24 * 3600),          # a day
+         (60, 7 * 24 * 3600),     # a week
+         (3600, 365 * 24 * 3600)) # a year
+
+POINTS_PER_DOCUMENT = 720
+
+# Fields of the samples: counters keep their last value, rates are averaged
+COUNTER_FIELDS = ("packet_count", "byte_count", "flow_count")
+RATE_FIELDS = ("packet_rate", "byte_rate")
+
+class SeriesTier:
+    def __init__(self, period):
+        self.period = period
+        # Start, number of samples, last counters and rate sums of the point
+        # being built
+        self.start = None
+        self.samples = 0
+        self.counters = None
+        self.rates = None
+
+    # Adds a sample. Returns the point it finished, if any.
+    def add(self, t, values):
+        start = int(t) - int(t) % self.period
+        point = None
+        if self.start is not None and start != self.start:
+            point = self.finish()
+        if self.start is None:
+            self.start = start
+            self.samples = 0
+            self.rates = [0.0] * len(RATE_FIELDS)
+        self.samples += 1
+        self.counters = [values[f] for f in COUNTER_FIELDS]
+        for (i, f) in enumerate(RATE_FIELDS):
+            self.rates[i] += values[f]
+        return point
+
+    def finish(self):
+        point = {"t": self.start}
+        for (f, value) in zip(COUNTER_FIELDS, self.counters):
+            point[f] = value
+        for (f, total) in zip(RATE_FIELDS, self.rates):
+            point[f] = round(total / self.samples, 3)
+        self.start = None
+        return point
+
+class SeriesStore:
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.ensure_index([("switch", 1), ("tier", 1),
+                                      ("start", 1)])
+        # id -> [SeriesTier]
+        self.series = {}
+        # (id, period) -> start of the bucket document last written to
+        self.buckets = {}
+
+    def add(self, id_, t, values):
+        tiers = self.series.get(id_)
+        if tiers is None:
+            tiers = self.series[id_] = [SeriesTier(period)
+                                        for (period, _) in TIERS]
+        for (tier, (_, retention)) in zip(tiers, TIERS):
+            point = tier.add(t, values)
+            if point is not None:
+                self.write(id_, tier.period, retention, point)
+
+    def write(self, id_, period, retention, point):
+        span = period * POINTS_PER_DOCUMENT
+        start = point["t"] - point["t"] % span
+        self.collection.update({"_id": "%s:%d:%d" % (id_, period, start)},
+                               {"$set": {"switch": id_, "tier": period,
+                                         "start": start},
+                                "$push": {"points": point}},
+                               upsert=True)
+        # Expire old buckets when a new one is started
+        if self.buckets.get((id_, period)) != start:
+            self.buckets[(id_, period)] = start
+            self.collection.remove({"switch": id_, "tier": period,
+                                    "start": {"$lt": start - retention}})
+
+    # The points already in Mongo are kept
+    def delete(self, id_):
+        self.series.pop(id_, None)
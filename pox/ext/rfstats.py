@@ -3,6 +3,7 @@ from pox.lib.revent import *
 from pox.lib.recoco import Timer
 from pox.openflow.libopenflow_01 import *
 from pox.openflow import *
+from pox.openflow.of_json import match_to_dict, action_to_dict
 from pox.openflow.discovery import *
 from pox.lib.addresses import *
 from pox.topology.topology import *
@@ -10,41 +11,152 @@ import time
 import json
 import pymongo
 
+from rflib.defs import RFEVENTS_NAME, RFEVENTS_SIZE
+from rflib.ipc.MongoIPC import create_capped_collection
+
+from rfseries import SeriesStore, SERIES_COLLECTION
+
 UPDATE_INTERVAL = 5
+POLL_SLOTS = 10 # Switches are polled in this many groups per UPDATE_INTERVAL
 topology_timer = None
+poll_tick = 0
 
 def rf_id(id):
     return "{:#016x}".format(id)
 
+# Adds to changes the fields that have to be $set to turn old into new. Dicts
+# with the same keys and lists with the same length are compared item by
+# item, so unchanged values are not written again.
+def changed_fields(path, old, new, changes):
+    if type(old) is dict and type(new) is dict and \
+       sorted(old.keys()) == sorted(new.keys()):
+        for key in new:
+            changed_fields(path + "." + str(key), old[key], new[key], changes)
+    elif type(old) is list and type(new) is list and len(old) == len(new):
+        for i in range(len(new)):
+            changed_fields(path + "." + str(i), old[i], new[i], changes)
+    elif old != new:
+        changes[path] = new
+
+def rate(previous, current, elapsed):
+    # Counters go back when a flow is replaced
+    if elapsed <= 0 or current < previous:
+        return 0.0
+    return round((current - previous) / elapsed, 3)
+
+# Counters of a switch from its previous poll, used to compute rates. Flows
+# keep the position they were first seen at, so the flow list of a switch
+# only changes where counters changed.
+class SwitchCounters:
+    def __init__(self):
+        # Flow keys in display order
+        self.order = []
+        # Flow key -> (packet_count, byte_count, time)
+        self.flows = {}
+        # (packet_count, byte_count, time) of the aggregate stats
+        self.aggregate = None
+
+    # Returns (flow, packet_rate, byte_rate) for every flow, in order
+    def update_flows(self, flows, now):
+        current = {}
+        new = []
+        for flow in flows:
+            key = (flow.table_id, flow.priority, flow.match.pack())
+            current[key] = flow
+            if key not in self.flows:
+                new.append(key)
+        self.order = [key for key in self.order if key in current] + new
+        order = self.order
+
+        result = []
+        counters = {}
+        for key in order:
+            flow = current[key]
+            counters[key] = (flow.packet_count, flow.byte_count, now)
+            previous = self.flows.get(key)
+            if previous is None:
+                result.append((flow, 0.0, 0.0))
+            else:
+                elapsed = now - previous[2]
+                result.append((flow,
+                               rate(previous[0], flow.packet_count, elapsed),
+                               rate(previous[1], flow.byte_count, elapsed)))
+        self.flows = counters
+        return result
+
+    # Returns the packet and byte rates of the aggregate stats
+    def update_aggregate(self, aggregate, now):
+        previous = self.aggregate
+        self.aggregate = (aggregate.packet_count, aggregate.byte_count, now)
+        if previous is None:
+            return (0.0, 0.0)
+        elapsed = now - previous[2]
+        return (rate(previous[0], aggregate.packet_count, elapsed),
+                rate(previous[1], aggregate.byte_count, elapsed))
+
 class StatsDB:
     def __init__(self):
         self.db = {}
+        self.counters = {}
+        # Whether db changed since it was last written out
+        self.dirty = False
         self.connection = pymongo.Connection()
         self.collection = self.connection.db.rfstats
+        self.series = SeriesStore(self.connection.db[SERIES_COLLECTION])
+        # Changes are also recorded for rfweb to push them to browsers
+        self.events = create_capped_collection(self.connection.db,
+                                               RFEVENTS_NAME, RFEVENTS_SIZE)
 
+    def record(self, op, id_, **fields):
+        fields.update({"source": "rfstats", "op": op, "id": id_})
+        self.events.insert(fields)
+
+    # Only the fields that changed are written to the database, except for
+    # the first update of a document, which replaces what a previous run
+    # left there
     def update(self, id_, type_, links=None, **data):
-        if id_ not in self.db:
+        changes = {}
+        doc = self.db.get(id_)
+        new = doc is None
+        if new:
             if links is None:
                 links = []
-            self.db[id_] = {
-                "type": type_,
-                "links": links,
-                "data": {},}
-        else:
-            self.db[id_]["type"] = type_
-            if links is not None:
-                self.db[id_]["links"] = links
+            doc = self.db[id_] = {"_id": id_, "type": None, "links": None,
+                                  "data": {}}
 
+        changed_fields("type", doc["type"], type_, changes)
+        doc["type"] = type_
+        if links is not None:
+            changed_fields("links", doc["links"], links, changes)
+            doc["links"] = links
         for k, v in data.items():
-            self.db[id_]["data"][k] = v
+            changed_fields("data." + k, doc["data"].get(k), v, changes)
+            doc["data"][k] = v
+
+        if new:
+            self.dirty = True
+            self.collection.update({"_id": id_}, doc, upsert=True)
+            self.record("save", id_, doc=doc)
+        elif changes:
+            self.dirty = True
+            self.collection.update({"_id": id_}, {"$set": changes})
+            # Field names can't have dots, so the changes are kept as pairs
+            self.record("set", id_, changes=changes.items())
 
-        self.db[id_]["_id"] = id_
-        self.collection.update({"_id": id_}, self.db[id_], upsert=True)
+    def get_counters(self, id_):
+        counters = self.counters.get(id_)
+        if counters is None:
+            counters = self.counters[id_] = SwitchCounters()
+        return counters
 
     def delete(self, id_):
+        self.counters.pop(id_, None)
+        self.series.delete(id_)
         try:
             del self.db[id_]
             self.collection.remove(id_)
+            self.record("remove", id_)
+            self.dirty = True
             return True
         except:
             return False
@@ -61,24 +173,16 @@ class StatsDB:
 
     @staticmethod
     def create_match_dict(match):
-        # TODO: do not depend on POX behavior
-        match = match.show().strip("\n").split("\n")
-        return dict([attr.split(": ") for attr in match])
+        return match_to_dict(match)
 
     @staticmethod
     def create_actions_list(actions):
-        # TODO: do not depend on POX behavior
-        actionlist = []
-        for action in actions:
-            string = action.__class__.__name__ + "["
-            string += action.show().strip("\n").replace("\n", ", ") + "]"
-            actionlist.append(string)
-        return actionlist
+        return [action_to_dict(action) for action in actions]
 
     @staticmethod
     def create_flow_stats_list(flows):
         flowlist = []
-        for flow in flows:
+        for (flow, packet_rate, byte_rate) in flows:
             flowlist.append({
             "length": flow.length,
             "table_id": flow.table_id,
@@ -91,37 +195,55 @@ class StatsDB:
             "cookie": flow.cookie,
             "packet_count": flow.packet_count,
             "byte_count": flow.byte_count,
+            "packet_rate": packet_rate,
+            "byte_rate": byte_rate,
             "actions": StatsDB.create_actions_list(flow.actions),
             })
         return flowlist
 
     @staticmethod
-    def create_aggregate_stats_dict(aggregate):
+    def create_aggregate_stats_dict(aggregate, rates):
         return {
         "packet_count": aggregate.packet_count,
         "byte_count": aggregate.byte_count,
         "flow_count": aggregate.flow_count,
+        "packet_rate": rates[0],
+        "byte_rate": rates[1],
         }
 
 db = StatsDB()
 
-def timer_func():
+# Switches whose description was already requested
+described = set()
+
+# Polls the switches in the current slot, so that every switch is polled
+# once per UPDATE_INTERVAL without all the requests going out at once
+def poll_func():
+    global poll_tick
+    slot = poll_tick % POLL_SLOTS
+    poll_tick += 1
     topology = core.components['topology']
     for switch in topology.getEntitiesOfType(Switch):
-        if switch.connected:
-            # OFPST_DESC
-            req = ofp_stats_request(type=OFPST_DESC)
-            switch.send(req)
+        if switch.connected and hash(switch.dpid) % POLL_SLOTS == slot:
+            # OFPST_DESC does not change while the switch is connected
+            if switch.dpid not in described:
+                described.add(switch.dpid)
+                req = ofp_stats_request(type=OFPST_DESC)
+                switch.send(req)
             # OFPST_FLOW
             req = ofp_stats_request(body=ofp_flow_stats_request())
             switch.send(req)
             # OFPST_AGGREGATE
             req = ofp_stats_request(body=ofp_aggregate_stats_request())
             switch.send(req)
-        
-    # Write out the statistics we currently have
+
+def timer_func():
+    # Write out the statistics we currently have, if they changed
+    if not db.dirty:
+        return
+    db.dirty = False
     f = open("../rfweb/data/routeflow.json", "w")
-    f.write(json.dumps(db.db, sort_keys=True, indent=4))
+    f.write(json.dumps(db.db, sort_keys=True, separators=(",", ":")))
     f.close()
 
 def handle_switch_desc(event):
@@ -130,11 +252,16 @@ def handle_switch_desc(event):
 
 def handle_flow_stats(event):
     dp_id = rf_id(event.connection.dpid)
-    db.update(dp_id, "switch", flows=StatsDB.create_flow_stats_list(event.stats))
+    flows = db.get_counters(dp_id).update_flows(event.stats, time.time())
+    db.update(dp_id, "switch", flows=StatsDB.create_flow_stats_list(flows))
 
 def handle_aggregate_flow_stats(event):
     dp_id = rf_id(event.connection.dpid)
-    db.update(dp_id, "switch", aggregate=StatsDB.create_aggregate_stats_dict(event.stats))
+    now = time.time()
+    rates = db.get_counters(dp_id).update_aggregate(event.stats, now)
+    aggregate = StatsDB.create_aggregate_stats_dict(event.stats, rates)
+    db.update(dp_id, "switch", aggregate=aggregate)
+    db.series.add(dp_id, now, aggregate)
 
 def update_topology():
     topology = core.components['topology']
@@ -169,6 +296,7 @@ def handle_link_event(event):
     topology_timer = Timer(UPDATE_INTERVAL, update_topology, recurring=False)
 
 def handle_connection_up(event):
+    described.discard(event.dpid)
     db.update(rf_id(event.dpid), "switch", links=["rfproxy"])
 
 def launch():
@@ -178,6 +306,7 @@ def launch():
     core.openflow.addListenerByName("AggregateFlowStatsReceived", handle_aggregate_flow_stats)
     core.openflow_discovery.addListenerByName("LinkEvent", handle_link_event)
     
+    Timer(float(UPDATE_INTERVAL) / POLL_SLOTS, poll_func, recurring=True)
     Timer(UPDATE_INTERVAL, timer_func, recurring=True)
 
     db.update("rfserver", "rfserver", links=["rfproxy"])
@@ -219,6 +219,31 @@ class BarrierIn (Event):
     self.dpid = connection.dpid
     self.xid = ofp.xid
 
+class SendQueueHigh (Event):
+  """
+  Fired when the data queued for a connection, because the switch isn't
+  taking it as fast as it is sent, grows past the connection's
+  high_watermark.  Senders should hold off until SendQueueLow.
+  queued (int) - bytes queued
+  """
+  def __init__ (self, connection, queued):
+    Event.__init__(self)
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.queued = queued
+
+class SendQueueLow (Event):
+  """
+  Fired when the data queued for a connection drops back to its
+  low_watermark after a SendQueueHigh.
+  queued (int) - bytes queued
+  """
+  def __init__ (self, connection, queued):
+    Event.__init__(self)
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.queued = queued
+
 class ConnectionIn (Event):
   def __init__ (self, connection):
     super(ConnectionIn,self).__init__()
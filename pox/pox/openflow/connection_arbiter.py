@@ -43,6 +43,8 @@ class OpenFlowNexus (EventMixin):
     FlowRemoved,
     PacketIn,
     BarrierIn,
+    SendQueueHigh,
+    SendQueueLow,
     RawStatsReply,
     SwitchDescReceived,
     FlowStatsReceived,
@@ -47,6 +47,25 @@ _PAD6 = _PAD*6
 
 EMPTY_ETH = EthAddr(None)
 
+def _raw_eth (raw):
+  """
+  EthAddr for 6 raw bytes, without going through the parsing of EthAddr()
+  """
+  addr = EthAddr.__new__(EthAddr)
+  object.__setattr__(addr, '_value', raw)
+  return addr
+
+# Precompiled layouts of the structures packed and unpacked the most
+_HEADER = struct.Struct("!BBHL")
+_MATCH = struct.Struct("!LH6s6sHBxHBBxxLLHH")
+_FLOW_MOD = struct.Struct("!QHHHHLHH")
+_ACTION_HEADER = struct.Struct("!HH")
+_ACTION_OUTPUT = struct.Struct("!HHHH")
+_ACTION_DL_ADDR = struct.Struct("!HH6s6x")
+_PHY_PORT = struct.Struct("!H6s16sLLLLLL")
+_PACKET_OUT = struct.Struct("!LHH")
+_PACKET_IN = struct.Struct("!LHHBB")
+
 MAX_XID = 0x7fFFffFF
 _nextXID = 1
 #USE_MPLS_MATCH = False
@@ -79,6 +98,8 @@ TABLE_EMERGENCY = 0xfe
 
 #1. Openflow Header
 class ofp_header (object):
+  __slots__ = ('version', 'header_type', 'length', 'xid')
+
   def __init__ (self, **kw):
     self.version = OFP_VERSION
     self.header_type = 0
@@ -97,15 +118,12 @@ class ofp_header (object):
     if(assertstruct):
       if(not ofp_header._assert(self)[0]):
         raise RuntimeError("assertstruct failed")
-    packed = ""
-    packed += struct.pack("!BBHL", self.version, self.header_type, self.length,
-                          self.xid)
-    return packed
+    return _HEADER.pack(self.version, self.header_type, self.length, self.xid)
 
   def unpack (self, binaryString):
     if (len(binaryString) < 8):
       return binaryString
-    (self.version, self.header_type, self.length, self.xid) = struct.unpack_from("!BBHL", binaryString, 0)
+    (self.version, self.header_type, self.length, self.xid) = _HEADER.unpack_from(binaryString, 0)
     return binaryString[8:]
 
   def __len__ (self):
@@ -136,6 +154,9 @@ class ofp_header (object):
 #2. Common Structures
 ##2.1 Port Structures
 class ofp_phy_port (object):
+  __slots__ = ('port_no', 'hw_addr', 'name', 'config', 'state', 'curr',
+               'advertised', 'supported', 'peer')
+
   def __init__ (self, **kw):
     self.port_no = 0
     self.hw_addr = EMPTY_ETH
@@ -163,20 +184,18 @@ class ofp_phy_port (object):
     if(assertstruct):
       if(not self._assert()[0]):
         return None
-    packed = ""
-    packed += struct.pack("!H", self.port_no)
-    packed += self.hw_addr if isinstance(self.hw_addr, bytes) else self.hw_addr.toRaw()
-    packed += self.name.ljust(16,'\0')
-    packed += struct.pack("!LLLLLL", self.config, self.state, self.curr, self.advertised, self.supported, self.peer)
-    return packed
+    hw_addr = self.hw_addr if isinstance(self.hw_addr, bytes) else self.hw_addr.toRaw()
+    return _PHY_PORT.pack(self.port_no, hw_addr, self.name, self.config,
+                          self.state, self.curr, self.advertised,
+                          self.supported, self.peer)
 
   def unpack (self, binaryString):
     if (len(binaryString) < 48):
       return binaryString
-    (self.port_no,) = struct.unpack_from("!H", binaryString, 0)
-    self.hw_addr = EthAddr(binaryString[2:8])
-    self.name = binaryString[8:24].replace("\0","")
-    (self.config, self.state, self.curr, self.advertised, self.supported, self.peer) = struct.unpack_from("!LLLLLL", binaryString, 24)
+    (self.port_no, hw_addr, name, self.config, self.state, self.curr,
+     self.advertised, self.supported, self.peer) = _PHY_PORT.unpack_from(binaryString, 0)
+    self.hw_addr = _raw_eth(hw_addr)
+    self.name = name.replace("\0","")
     return binaryString[48:]
 
   def __len__ (self):
@@ -402,7 +421,30 @@ class ofp_queue_prop_min_rate (object):
     return outstr
 
 ##2.3 Flow Match Structures
+_setattr = object.__setattr__
+
+def _wire_wildcards (wildcards, dl_type, nw_proto):
+  """ See ofp_match._wire_wildcards() """
+  if dl_type == 0x0800:
+      # IP
+      if  nw_proto not in (1,6,17):
+        # not TCP/UDP/ICMP -> Clear TP wildcards for the wire
+        return wildcards & ~(OFPFW_TP_SRC | OFPFW_TP_DST)
+      else:
+        return wildcards
+  elif dl_type == 0x0806:
+      # ARP: clear NW_TOS / TP wildcards for the wire
+      return wildcards & ~( OFPFW_NW_TOS | OFPFW_TP_SRC | OFPFW_TP_DST)
+  else:
+      # not even IP. Clear NW/TP wildcards for the wire
+      return wildcards & ~( OFPFW_NW_TOS | OFPFW_NW_PROTO | OFPFW_NW_SRC_MASK | OFPFW_NW_DST_MASK | OFPFW_TP_SRC | OFPFW_TP_DST)
+
 class ofp_match (object):
+  # The packed forms are kept until the match changes
+  __slots__ = ('_in_port', '_dl_src', '_dl_dst', '_dl_vlan', '_dl_vlan_pcp',
+               '_dl_type', '_nw_tos', '_nw_proto', '_nw_src', '_nw_dst',
+               '_tp_src', '_tp_dst', 'wildcards', '_packed', '_packed_wire')
+
   @classmethod
   def from_packet (cls, packet, in_port = None):
     """ get a match that matches this packet, asuming it came in on in_port in_port
@@ -486,21 +528,22 @@ class ofp_match (object):
 
   def clone (self):
     n = ofp_match()
-    for k,v in ofp_match_data.iteritems():
-      setattr(n, '_' + k, getattr(self, '_' + k))
+    for k,v in _match_defaults:
+      _setattr(n, k, getattr(self, k))
     n.wildcards = self.wildcards
     return n
 
   def __init__ (self, **kw):
-    for k,v in ofp_match_data.iteritems():
-      setattr(self, '_' + k, v[0])
-
-    self.wildcards = self._normalize_wildcards(OFPFW_ALL)
+    for k,v in _match_defaults:
+      _setattr(self, k, v)
+    _setattr(self, 'wildcards', self._normalize_wildcards(OFPFW_ALL))
+    _setattr(self, '_packed', None)
+    _setattr(self, '_packed_wire', None)
 
     # This is basically initHelper(), but tweaked slightly since this
     # class does some magic of its own.
     for k,v in kw.iteritems():
-      if not hasattr(self, '_'+k):
+      if k not in ofp_match_data:
         raise TypeError(self.__class__.__name__ + " constructor got "
           + "unexpected keyword argument '" + k + "'")
       setattr(self, k, v)
@@ -570,7 +613,10 @@ class ofp_match (object):
 
   def __setattr__ (self, name, value):
     if name not in ofp_match_data:
-      self.__dict__[name] = value
+      _setattr(self, name, value)
+      if name != '_packed' and name != '_packed_wire':
+        _setattr(self, '_packed', None)
+        _setattr(self, '_packed_wire', None)
       return
 
     if name == 'nw_dst' or name == 'nw_src':
@@ -595,7 +641,7 @@ class ofp_match (object):
       if name == 'nw_dst' or name == 'nw_src':
         # Special handling
         return getattr(self, 'get_' + name)()[0]
-      return self.__dict__['_' + name]
+      return getattr(self, '_' + name)
     raise AttributeError("attribute not found: "+name)
 
   def _assert (self):
@@ -610,45 +656,66 @@ class ofp_match (object):
     return None
 
   def pack (self, assertstruct=True, flow_mod=False):
+    packed = self._packed_wire if flow_mod else self._packed
+    if packed is not None:
+      return packed
+
     if(assertstruct):
       if self._assert() is not None:
         raise RuntimeError(self._assert())
 
-    packed = ""
-    packed += struct.pack("!LH", self._wire_wildcards(self.wildcards) if flow_mod else self.wildcards, self.in_port or 0)
-    if self.dl_src == None:
-      packed += EMPTY_ETH.toRaw()
-    elif type(self.dl_src) is bytes:
-      packed += self.dl_src
-    else:
-      packed += self.dl_src.toRaw()
-    if self.dl_dst == None:
-      packed += EMPTY_ETH.toRaw()
-    elif type(self.dl_dst) is bytes:
-      packed += self.dl_dst
-    else:
-      packed += self.dl_dst.toRaw()
-
-    def check_ip(val):
-      return (val or 0) if self.dl_type == 0x0800 else 0
-    def check_ip_or_arp(val):
-      return (val or 0) if self.dl_type == 0x0800 or self.dl_type == 0x0806 else 0
-    def check_tp(val):
-      return (val or 0) if self.dl_type == 0x0800 and self.nw_proto in (1,6,17) else 0
-
-    packed += struct.pack("!HB", self.dl_vlan or 0, self.dl_vlan_pcp or 0)
-    packed += _PAD # Hardcode padding
-    packed += struct.pack("!HBB", self.dl_type or 0, check_ip(self.nw_tos), check_ip_or_arp(self.nw_proto))
-    packed += _PAD2 # Hardcode padding
+    # Same as going through the wildcarding getters, without their overhead
+    w = self.wildcards
+    dl_src = None if w & OFPFW_DL_SRC else self._dl_src
+    if dl_src is None:
+      dl_src = EMPTY_ETH.toRaw()
+    elif type(dl_src) is not bytes:
+      dl_src = dl_src.toRaw()
+    dl_dst = None if w & OFPFW_DL_DST else self._dl_dst
+    if dl_dst is None:
+      dl_dst = EMPTY_ETH.toRaw()
+    elif type(dl_dst) is not bytes:
+      dl_dst = dl_dst.toRaw()
+    dl_type = None if w & OFPFW_DL_TYPE else self._dl_type
+    nw_proto = None if w & OFPFW_NW_PROTO else self._nw_proto
+
+    is_ip = dl_type == 0x0800
+    is_ip_or_arp = is_ip or dl_type == 0x0806
+    is_tp = is_ip and nw_proto in (1,6,17)
+
     def fix (addr):
       if addr is None: return 0
       if type(addr) is int: return addr & 0xffFFffFF
       if type(addr) is long: return addr & 0xffFFffFF
       return addr.toUnsigned()
-    packed += struct.pack("!LLHH", check_ip_or_arp(fix(self.nw_src)), check_ip_or_arp(fix(self.nw_dst)),
-                          check_tp(self.tp_src), check_tp(self.tp_dst))
+
+    if is_ip_or_arp:
+      if (w & OFPFW_NW_SRC_ALL) == OFPFW_NW_SRC_ALL:
+        nw_src = 0
+      else:
+        nw_src = fix(self._nw_src)
+      if (w & OFPFW_NW_DST_ALL) == OFPFW_NW_DST_ALL:
+        nw_dst = 0
+      else:
+        nw_dst = fix(self._nw_dst)
+    else:
+      nw_src = nw_dst = 0
+
+    packed = _MATCH.pack(
+        _wire_wildcards(w, dl_type, nw_proto) if flow_mod else w,
+        0 if w & OFPFW_IN_PORT else (self._in_port or 0),
+        dl_src, dl_dst,
+        0 if w & OFPFW_DL_VLAN else (self._dl_vlan or 0),
+        0 if w & OFPFW_DL_VLAN_PCP else (self._dl_vlan_pcp or 0),
+        dl_type or 0,
+        0 if not is_ip or w & OFPFW_NW_TOS else (self._nw_tos or 0),
+        (nw_proto or 0) if is_ip_or_arp else 0,
+        nw_src, nw_dst,
+        0 if not is_tp or w & OFPFW_TP_SRC else (self._tp_src or 0),
+        0 if not is_tp or w & OFPFW_TP_DST else (self._tp_dst or 0))
 #    if USE_MPLS_MATCH:
 #        packed += struct.pack("!IBxxx", self.mpls_label or 0, self.mpls_tc or 0)
+    _setattr(self, '_packed_wire' if flow_mod else '_packed', packed)
     return packed
 
   def _normalize_wildcards (self, wildcards):
@@ -675,19 +742,7 @@ class ofp_match (object):
         protocol specified is as TCP, UDP or SCTP. Fields that are ignored
         don't need to be wildcarded and should be set to 0.
     """
-    if self.dl_type == 0x0800:
-        # IP
-        if  self.nw_proto not in (1,6,17):
-          # not TCP/UDP/ICMP -> Clear TP wildcards for the wire
-          return wildcards & ~(OFPFW_TP_SRC | OFPFW_TP_DST)
-        else:
-          return wildcards
-    elif self.dl_type == 0x0806:
-        # ARP: clear NW_TOS / TP wildcards for the wire
-        return wildcards & ~( OFPFW_NW_TOS | OFPFW_TP_SRC | OFPFW_TP_DST)
-    else:
-        # not even IP. Clear NW/TP wildcards for the wire
-        return wildcards & ~( OFPFW_NW_TOS | OFPFW_NW_PROTO | OFPFW_NW_SRC_MASK | OFPFW_NW_DST_MASK | OFPFW_TP_SRC | OFPFW_TP_DST)
+    return _wire_wildcards(wildcards, self.dl_type, self.nw_proto)
 
 
   def _unwire_wildcards(self, wildcards):
@@ -728,14 +783,20 @@ class ofp_match (object):
   def unpack (self, binaryString, flow_mod=False):
     if (len(binaryString) < self.__len__()):
       return binaryString
-    (wildcards, self._in_port) = struct.unpack_from("!LH", binaryString, 0)
-    self._dl_src = EthAddr(struct.unpack_from("!BBBBBB", binaryString, 6))
-    self._dl_dst = EthAddr(struct.unpack_from("!BBBBBB", binaryString, 12))
-    (self._dl_vlan, self._dl_vlan_pcp) = struct.unpack_from("!HB", binaryString, 18)
-    (self._dl_type, self._nw_tos, self._nw_proto) = struct.unpack_from("!HBB", binaryString, 22)
-    (self._nw_src, self._nw_dst, self._tp_src, self._tp_dst) = struct.unpack_from("!LLHH", binaryString, 28)
-    self._nw_src = IPAddr(self._nw_src)
-    self._nw_dst = IPAddr(self._nw_dst)
+    (wildcards, in_port, dl_src, dl_dst, dl_vlan, dl_vlan_pcp, dl_type, nw_tos,
+     nw_proto, nw_src, nw_dst, tp_src, tp_dst) = _MATCH.unpack_from(binaryString, 0)
+    _setattr(self, '_in_port', in_port)
+    _setattr(self, '_dl_src', _raw_eth(dl_src))
+    _setattr(self, '_dl_dst', _raw_eth(dl_dst))
+    _setattr(self, '_dl_vlan', dl_vlan)
+    _setattr(self, '_dl_vlan_pcp', dl_vlan_pcp)
+    _setattr(self, '_dl_type', dl_type)
+    _setattr(self, '_nw_tos', nw_tos)
+    _setattr(self, '_nw_proto', nw_proto)
+    _setattr(self, '_nw_src', IPAddr(nw_src))
+    _setattr(self, '_nw_dst', IPAddr(nw_dst))
+    _setattr(self, '_tp_src', tp_src)
+    _setattr(self, '_tp_dst', tp_dst)
 #    if USE_MPLS_MATCH:
 #      (self.mpls_label, self.mpls_tc) = struct.unpack_from("!IBxxx", binaryString, 40)
     self.wildcards = self._normalize_wildcards(self._unwire_wildcards(wildcards) if flow_mod else wildcards) # Overide
@@ -967,6 +1028,8 @@ class ofp_action_header (object):
     return outstr
 
 class ofp_action_output (object):
+  __slots__ = ('type', 'length', 'port', 'max_len')
+
   def __init__ (self, **kw):
     self.type = OFPAT_OUTPUT
     self.length = 8
@@ -984,14 +1047,12 @@ class ofp_action_output (object):
     if(assertstruct):
       if(not self._assert()[0]):
         return None
-    packed = ""
-    packed += struct.pack("!HHHH", self.type, self.length, self.port, self.max_len)
-    return packed
+    return _ACTION_OUTPUT.pack(self.type, self.length, self.port, self.max_len)
 
   def unpack (self, binaryString):
     if (len(binaryString) < 8):
       return binaryString
-    (self.type, self.length, self.port, self.max_len) = struct.unpack_from("!HHHH", binaryString, 0)
+    (self.type, self.length, self.port, self.max_len) = _ACTION_OUTPUT.unpack_from(binaryString, 0)
     return binaryString[8:]
 
   def __len__ (self):
@@ -1397,6 +1458,8 @@ class ofp_action_vlan_pcp (object):
     return outstr
 
 class ofp_action_dl_addr (object):
+  __slots__ = ('type', 'length', 'dl_addr')
+
   @classmethod
   def set_dst (cls, dl_addr = None):
     return cls(OFPAT_SET_DL_DST, dl_addr)
@@ -1426,20 +1489,17 @@ class ofp_action_dl_addr (object):
     if(assertstruct):
       if(not self._assert()[0]):
         return None
-    packed = ""
-    packed += struct.pack("!HH", self.type, self.length)
     if isinstance(self.dl_addr, EthAddr):
-      packed += self.dl_addr.toRaw()
+      dl_addr = self.dl_addr.toRaw()
     else:
-      packed += self.dl_addr
-    packed += _PAD6
-    return packed
+      dl_addr = self.dl_addr
+    return _ACTION_DL_ADDR.pack(self.type, self.length, dl_addr)
 
   def unpack (self, binaryString):
     if (len(binaryString) < 16):
       return binaryString
-    (self.type, self.length) = struct.unpack_from("!HH", binaryString, 0)
-    self.dl_addr = EthAddr(struct.unpack_from("!BBBBBB", binaryString, 4))
+    (self.type, self.length, dl_addr) = _ACTION_DL_ADDR.unpack_from(binaryString, 0)
+    self.dl_addr = _raw_eth(dl_addr)
     return binaryString[16:]
 
   def __len__ (self):
@@ -1813,6 +1873,9 @@ ofp_config_flags_rev_map = {
 
 ##3.3 Modify State Messages
 class ofp_flow_mod (ofp_header):
+  __slots__ = ('match', 'cookie', 'command', 'idle_timeout', 'hard_timeout',
+               'priority', 'buffer_id', 'out_port', 'flags', 'actions')
+
   def __init__ (self, **kw):
     ofp_header.__init__(self)
     self.header_type = OFPT_FLOW_MOD
@@ -1852,21 +1915,19 @@ class ofp_flow_mod (ofp_header):
     if(assertstruct):
       if(not self._assert()[0]):
         return None
-    packed = ""
     self.length = len(self)
-    packed += ofp_header.pack(self)
-    packed += self.match.pack(flow_mod=True)
-    packed += struct.pack("!QHHHHLHH", self.cookie, self.command, self.idle_timeout, self.hard_timeout, self.priority, self.buffer_id & 0xffffffff, self.out_port, self.flags)
+    packed = [ofp_header.pack(self), self.match.pack(flow_mod=True),
+              _FLOW_MOD.pack(self.cookie, self.command, self.idle_timeout, self.hard_timeout, self.priority, self.buffer_id & 0xffffffff, self.out_port, self.flags)]
     for i in self.actions:
-      packed += i.pack(assertstruct)
-    return packed
+      packed.append(i.pack(assertstruct))
+    return b''.join(packed)
 
   def unpack (self, binaryString):
     if (len(binaryString) < 72):
       return binaryString
-    ofp_header.unpack(self, binaryString[0:])
+    ofp_header.unpack(self, binaryString)
     self.match.unpack(binaryString[8:], flow_mod=True)
-    (self.cookie, self.command, self.idle_timeout, self.hard_timeout, self.priority, self.buffer_id, self.out_port, self.flags) = struct.unpack_from("!QHHHHLHH", binaryString, 8 + len(self.match))
+    (self.cookie, self.command, self.idle_timeout, self.hard_timeout, self.priority, self.buffer_id, self.out_port, self.flags) = _FLOW_MOD.unpack_from(binaryString, 8 + len(self.match))
     if self.buffer_id == 0xffffffff:
       self.buffer_id = -1
     self.actions, offset = _unpack_actions(binaryString, self.length-(32 + len(self.match)), 32 + len(self.match))
@@ -2883,6 +2944,8 @@ ofp_stats_reply_class_to_type_map = {
 
 ##3.6 Send Packet Message
 class ofp_packet_out (ofp_header):
+  __slots__ = ('buffer_id', 'in_port', 'actions', '_data')
+
   def __init__ (self, **kw):
     ofp_header.__init__(self)
     self.header_type = OFPT_PACKET_OUT
@@ -2934,19 +2997,19 @@ class ofp_packet_out (ofp_header):
 
     if self.data is not None:
       return b''.join((ofp_header.pack(self),
-      struct.pack("!LHH", self.buffer_id & 0xffFFffFF, self.in_port, actions_len),
+      _PACKET_OUT.pack(self.buffer_id & 0xffFFffFF, self.in_port, actions_len),
       actions,
       self.data))
     else:
       return b''.join((ofp_header.pack(self),
-      struct.pack("!LHH", self.buffer_id & 0xffFFffFF, self.in_port, actions_len),
+      _PACKET_OUT.pack(self.buffer_id & 0xffFFffFF, self.in_port, actions_len),
       actions))
 
   def unpack (self, binaryString):
     if (len(binaryString) < 16):
       return binaryString
-    ofp_header.unpack(self, binaryString[0:])
-    (self.buffer_id, self.in_port, actions_len) = struct.unpack_from("!LHH", binaryString, 8)
+    ofp_header.unpack(self, binaryString)
+    (self.buffer_id, self.in_port, actions_len) = _PACKET_OUT.unpack_from(binaryString, 8)
     if self.buffer_id == 0xffFFffFF:
       self.buffer_id = -1
     self.actions,offset = _unpack_actions(binaryString, actions_len, 16)
@@ -3063,6 +3126,8 @@ class ofp_barrier_request (ofp_header):
 
 #4 Asynchronous Messages
 class ofp_packet_in (ofp_header):
+  __slots__ = ('in_port', 'buffer_id', 'reason', '_data', '_total_len')
+
   def __init__ (self, **kw):
     ofp_header.__init__(self)
 
@@ -3098,21 +3163,19 @@ class ofp_packet_in (ofp_header):
     if(assertstruct):
       if(not self._assert()[0]):
         raise AssertionError(self._assert()[1])
-    packed = ""
     # need to update the self.length field for ofp_header.pack to put the correct value in the packed
     # array. this sucks.
     self.length = len(self)
-    self._total_len = len(self) # TODO: Is this correct?
-    packed += ofp_header.pack(self)
-    packed += struct.pack("!LHHBB", self.buffer_id & 0xffFFffFF, self._total_len, self.in_port, self.reason, 0)
-    packed += self.data
-    return packed
+    self._total_len = self.length # TODO: Is this correct?
+    return b''.join((ofp_header.pack(self),
+      _PACKET_IN.pack(self.buffer_id & 0xffFFffFF, self._total_len, self.in_port, self.reason, 0),
+      self.data))
 
   def unpack (self, binaryString):
     if (len(binaryString) < 18):
       return binaryString
-    ofp_header.unpack(self, binaryString[0:])
-    (self.buffer_id, self._total_len, self.in_port, self.reason, pad) = struct.unpack_from("!LHHBB", binaryString, 8)
+    ofp_header.unpack(self, binaryString)
+    (self.buffer_id, self._total_len, self.in_port, self.reason, pad) = _PACKET_IN.unpack_from(binaryString, 8)
     if self.buffer_id == 0xFFffFFff:
       self.buffer_id = -1
     if (len(binaryString) < self.length):
@@ -3893,7 +3956,7 @@ def _unpack_actions (b, length, offset=0):
   actions = []
   end = length + offset
   while offset < end:
-    (t,l) = struct.unpack_from("!HH", b, offset)
+    (t,l) = _ACTION_HEADER.unpack_from(b, offset)
     if (len(b) - offset) < l: return ([], offset)
     a = _action_map.get(t)
     if a is None:
@@ -4070,3 +4133,6 @@ ofp_match_data = {
 #  'mpls_label': (0, OFPFW_MPLS_LABEL),
 #  'mpls_tc': (0, OFPFW_MPLS_TC),
 }
+
+# (slot, default) of each ofp_match field
+_match_defaults = tuple(('_' + k, v[0]) for k,v in ofp_match_data.iteritems())
@@ -38,24 +38,15 @@ log = core.getLogger()
 import socket
 import select
 
-try:
-  PIPE_BUF = select.PIPE_BUF
-except:
-  try:
-    # Try to get it from where PyPy (sometimes) has it
-    import IN
-    PIPE_BUF = IN.PIPE_BUF
-  except:
-    # (Hopefully) reasonable default
-    PIPE_BUF = 512
-
 import pox.openflow.libopenflow_01 as of
 
 import threading
 import os
 import sys
+import struct
 import exceptions
 from errno import EAGAIN, ECONNRESET
+from collections import deque
 
 
 import traceback
@@ -253,113 +244,134 @@ statsHandlerMap = {
   of.OFPST_QUEUE : handle_OFPST_QUEUE,
 }
 
-# Deferred sending should be unusual, so don't worry too much about
-# efficiency
-class DeferredSender (threading.Thread):
-  """
-  Class that handles sending when a socket write didn't complete
+class Batch (object):
   """
-  def __init__ (self):
-    # Threads, not recoco?
-    threading.Thread.__init__(self)
-    self._dataForConnection = {}
-    self._lock = threading.RLock()
-    self._waker = pox.lib.util.makePinger()
-    self.daemon = True
-    self.sending = False
-
-    self.start()
-
-  def _sliceup (self, data):
-    """
-    Takes an array of data bytes, and slices into elements of
-    PIPE_BUF bytes each
-    """
-    out = []
-    while len(data) > PIPE_BUF:
-      out.append(data[0:PIPE_BUF])
-      data = data[PIPE_BUF:]
-    if len(data) > 0:
-      out.append(data)
-    return out
+  OpenFlow messages sent to a switch together, in one buffer.
 
-  def send (self, con, data):
-    with self._lock:
-      self.sending = True
+  Batches are made by Connection.batch() and Connection.send_batch().
+  Messages are added with add(), and sent with commit() or at the end of
+  the with block the batch is used in:
 
-      data = self._sliceup(data)
+    with connection.batch(barrier = True) as batch:
+      for msg in flow_mods:
+        batch.add(msg)
+    batch.on_complete(installed)
 
-      if con not in self._dataForConnection:
-        self._dataForConnection[con] = data
-      else:
-        self._dataForConnection[con].extend(data)
-
-      self._waker.ping()
-
-  def kill (self, con):
-    with self._lock:
-      try:
-        del self._dataForConnection[con]
-      except:
-        pass
-
-      self._waker.ping()
-
-  def run (self):
-    while core.running:
-
-      with self._lock:
-        cons = self._dataForConnection.keys()
-
-      rlist, wlist, elist = select.select([self._waker], cons, cons, 1)
-      if not core.running: break
+  With barrier, a barrier request follows the messages, and the batch is
+  complete once its reply comes back, by which time the switch has
+  reported any error for the messages (see errors).  Without barrier, the
+  batch is complete as soon as it is sent.
+  """
+  _xid = struct.Struct("!L")
+
+  def __init__ (self, connection, barrier = False):
+    self.connection = connection
+    self.barrier = of.ofp_barrier_request() if barrier else None
+    # ErrorIn events raised for the messages of the batch, or for its
+    # barrier if the switch failed it
+    self.errors = []
+    self.completed = False
+    # Whether the connection went down before the batch completed
+    self.disconnected = False
+    self._data = []
+    self._xids = set()
+    self._callbacks = []
+    self._listeners = []
 
-      with self._lock:
-        if len(rlist) > 0:
-          self._waker.pongAll()
+  def add (self, msg):
+    """
+    Adds a message (an OpenFlow object, or the bytes of one message)
+    """
+    if self._data is None:
+      raise RuntimeError("Batch already sent")
+    if type(msg) is not bytes:
+      msg = msg.pack()
+    self._data.append(msg)
+    self._xids.add(self._xid.unpack_from(msg, 4)[0])
+
+  def commit (self):
+    """
+    Sends the messages added so far
+    """
+    if self._data is None:
+      return
+    data = self._data
+    self._data = None
+    con = self.connection
+    if self.barrier is None:
+      con.send(b"".join(data))
+      self._complete()
+      return
+    if con.disconnected:
+      self.disconnected = True
+      self._complete()
+      return
+    data.append(self.barrier.pack())
+    self._listeners = [
+      con.addListener(BarrierIn, self._handle_BarrierIn),
+      con.addListener(ErrorIn, self._handle_ErrorIn),
+      con.addListener(ConnectionDown, self._handle_ConnectionDown),
+    ]
+    con.send(b"".join(data))
+
+  def on_complete (self, callback):
+    """
+    Calls callback with this batch once it is complete (right away if it
+    already is)
+    """
+    if self.completed:
+      callback(self)
+    else:
+      self._callbacks.append(callback)
 
-        for con in elist:
-          try:
-            del self._dataForConnection[con]
-          except:
-            pass
+  @property
+  def ok (self):
+    """
+    Whether the batch completed without errors
+    """
+    return self.completed and not self.errors and not self.disconnected
+
+  def __len__ (self):
+    return len(self._xids)
+
+  def __enter__ (self):
+    return self
+
+  def __exit__ (self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.commit()
+    return False
+
+  def _handle_BarrierIn (self, event):
+    if event.xid == self.barrier.xid:
+      self._complete()
+
+  def _handle_ErrorIn (self, event):
+    if event.xid == self.barrier.xid:
+      # A switch that doesn't support barriers (see handle_FEATURES_REPLY)
+      # has still handled the messages.  Any other error means no reply is
+      # coming, so the batch completes with the error.
+      if not (event.ofp.type == of.OFPET_BAD_REQUEST and
+              event.ofp.code == of.OFPBRC_BAD_TYPE):
+        self.errors.append(event)
+      self._complete()
+    elif event.xid in self._xids:
+      self.errors.append(event)
+
+  def _handle_ConnectionDown (self, event):
+    self.disconnected = True
+    self._complete()
 
-        for con in wlist:
-          try:
-            alldata = self._dataForConnection[con]
-            while len(alldata):
-              data = alldata[0]
-              try:
-                l = con.sock.send(data)
-                if l != len(data):
-                  alldata[0] = data[l:]
-                  break
-                del alldata[0]
-              except socket.error as (errno, strerror):
-                if errno != EAGAIN:
-                  con.msg("DeferredSender/Socket error: " + strerror)
-                  con.disconnect()
-                  del self._dataForConnection[con]
-                break
-              except:
-                con.msg("Unknown error doing deferred sending")
-                break
-            if len(alldata) == 0:
-              try:
-                del self._dataForConnection[con]
-                if len(self._dataForConnection) == 0:
-                  self.sending = False
-                  break
-              except:
-                pass
-          except:
-            try:
-              del self._dataForConnection[con]
-            except:
-              pass
+  def _complete (self):
+    if self.completed: return
+    self.completed = True
+    self.connection.removeListeners(self._listeners)
+    self._listeners = []
+    callbacks = self._callbacks
+    self._callbacks = []
+    for callback in callbacks:
+      callback(self)
 
-# Used by the Connection class below
-deferredSender = DeferredSender()
 
 class DummyOFNexus (object):
   def raiseEventNoErrors (self, event, *args, **kw):
@@ -466,11 +478,26 @@ class Connection (EventMixin):
     PortStatsReceived,
     QueueStatsReceived,
     FlowRemoved,
+    SendQueueHigh,
+    SendQueueLow,
   ])
   
   # Globally unique identifier for the Connection instance
   ID = 0
 
+  # Data the switch doesn't take right away is queued, and sent by the
+  # OpenFlow loop once the socket is writable.  SendQueueHigh is raised when
+  # more than high_watermark bytes are queued, and SendQueueLow once it is
+  # back to low_watermark.
+  high_watermark = 1024 * 1024
+  low_watermark = 256 * 1024
+  # Queued messages are joined into sends of up to this many bytes
+  send_chunk = 65536
+
+  # Bytes asked from the socket by each read.  The receive buffer starts at
+  # this size and only grows to hold a message larger than it.
+  recv_size = 16384
+
   def msg (self, m):
     #print str(self), m
     log.debug(str(self) + " " + str(m))
@@ -487,7 +514,23 @@ class Connection (EventMixin):
 
     self.ofnexus = _dummyOFNexus
     self.sock = sock
-    self.buf = ''
+    # Received bytes are kept in _rbuf[_rstart:_rend]
+    self._rbuf = bytearray(self.recv_size)
+    self._rstart = 0
+    self._rend = 0
+    # Whether the last read filled all the room it asked for, in which case
+    # the socket may have more to give
+    self._recv_full = False
+    # Data waiting to be sent, and its total size.  Guarded by _send_lock,
+    # since apps may send from other threads than the OpenFlow loop.
+    self._sendq = deque()
+    self._sendq_bytes = 0
+    self._send_lock = threading.Lock()
+    # Whether SendQueueHigh was raised and SendQueueLow wasn't yet
+    self.blocked = False
+    # Called with this connection when data is queued while none was, so
+    # that the loop sends it
+    self.on_queued = None
     Connection.ID += 1
     self.ID = Connection.ID
     # TODO: dpid and features don't belong here; they should be eventually
@@ -542,11 +585,9 @@ class Connection (EventMixin):
     if self.dpid != None:
       self.ofnexus.raiseEventNoErrors(ConnectionDown(self))
 
-    try:
-      #deferredSender.kill(self)
-      pass
-    except:
-      pass
+    with self._send_lock:
+      self._sendq.clear()
+      self._sendq_bytes = 0
     try:
       self.sock.shutdown(socket.SHUT_RDWR)
     except:
@@ -565,30 +606,128 @@ class Connection (EventMixin):
     method and call it (hoping the result will be a bytes object).  This
     way, you can just pass one of the OpenFlow objects from the OpenFlow
     library to it and get the expected result, for example.
+
+    Data is queued, and the OpenFlow loop sends everything queued for
+    the connection together at the end of its round.  Without a loop
+    (on_queued is None), data is sent right away if nothing is queued, and
+    whatever the socket doesn't take is queued until flush().
     """
     if self.disconnected: return
     if type(data) is not bytes:
       if hasattr(data, 'pack'):
         data = data.pack()
 
-    if deferredSender.sending:
-      log.debug("deferred sender is sending!")
-      deferredSender.send(self, data)
-      return
-    try:
-      l = self.sock.send(data)
-      if l != len(data):
-        self.msg("Didn't send complete buffer.")
+    error = None
+    high = False
+    with self._send_lock:
+      idle = not self._sendq
+      if idle and self.on_queued is None:
+        try:
+          l = self.sock.send(data)
+        except socket.error as e:
+          if e.args[0] != EAGAIN:
+            error = e
+          l = 0
+        if error is None and l == len(data):
+          return
         data = data[l:]
-        deferredSender.send(self, data)
-    except socket.error as (errno, strerror):
-      if errno == EAGAIN:
-        self.msg("Out of send buffer space.  " +
-                 "Consider increasing SO_SNDBUF.")
-        deferredSender.send(self, data)
-      else:
-        self.msg("Socket error: " + strerror)
-        self.disconnect()
+      if error is None:
+        high = self._enqueue(data)
+
+    if error is not None:
+      self.msg("Socket error: " + str(error.args[-1]))
+      self.disconnect()
+      return
+    if idle and self.on_queued is not None:
+      self.on_queued(self)
+    if high:
+      self._raise_send_queue(SendQueueHigh)
+
+  def batch (self, barrier = False):
+    """
+    Returns an empty Batch of messages for this connection, to be sent in
+    one go (see Batch)
+    """
+    return Batch(self, barrier)
+
+  def send_batch (self, messages, barrier = False):
+    """
+    Sends messages (OpenFlow objects or their bytes) to the switch in one
+    buffer.  Returns the Batch, which completes once the switch has
+    handled them if barrier is set.
+    """
+    batch = Batch(self, barrier)
+    for msg in messages:
+      batch.add(msg)
+    batch.commit()
+    return batch
+
+  def _enqueue (self, data):
+    """
+    Queues data.  Returns True if the queue just went past high_watermark.
+    Must be called holding _send_lock.
+    """
+    self._sendq.append(data)
+    self._sendq_bytes += len(data)
+    if not self.blocked and self._sendq_bytes > self.high_watermark:
+      self.blocked = True
+      return True
+    return False
+
+  def _raise_send_queue (self, event):
+    self.ofnexus.raiseEventNoErrors(event, self, self._sendq_bytes)
+    self.raiseEventNoErrors(event, self, self._sendq_bytes)
+
+  def flush (self):
+    """
+    Sends as much queued data as the socket takes without blocking.
+    Queued messages are joined into sends of up to send_chunk bytes.
+    Generally this is just called by the main OpenFlow loop below, when
+    the socket is writable.  Returns False if the connection failed.
+    """
+    error = None
+    low = False
+    with self._send_lock:
+      q = self._sendq
+      while q:
+        data = q[0]
+        if len(q) > 1 and len(data) < self.send_chunk:
+          parts = []
+          size = 0
+          while q and size + len(q[0]) <= self.send_chunk:
+            size += len(q[0])
+            parts.append(q.popleft())
+          data = b"".join(parts)
+          q.appendleft(data)
+        try:
+          l = self.sock.send(data)
+        except socket.error as e:
+          if e.args[0] != EAGAIN:
+            error = e
+          break
+        self._sendq_bytes -= l
+        if l < len(data):
+          q[0] = data[l:]
+          break
+        q.popleft()
+      if self.blocked and self._sendq_bytes <= self.low_watermark:
+        self.blocked = False
+        low = True
+
+    if error is not None:
+      self.msg("Socket error: " + str(error.args[-1]))
+      self.disconnect()
+      return False
+    if low:
+      self._raise_send_queue(SendQueueLow)
+    return True
+
+  @property
+  def sending (self):
+    """
+    Whether there is data queued for this connection
+    """
+    return len(self._sendq) > 0
 
   def read (self):
     """
@@ -597,26 +736,40 @@ class Connection (EventMixin):
 
     Note: This function will block if data is not available.
     """
-    d = self.sock.recv(2048)
-    if len(d) == 0:
+    buf = self._rbuf
+    view = memoryview(buf)
+    end = self._rend
+    size = min(len(buf) - end, self.recv_size)
+    n = self.sock.recv_into(view[end:], size)
+    if n == 0:
       return False
-    self.buf += d
-    l = len(self.buf)
-    while l > 4:
-      if ord(self.buf[0]) != of.OFP_VERSION:
-        log.warning("Bad OpenFlow version (" + str(ord(self.buf[0])) +
+    self._recv_full = n == size
+    end += n
+    self._rend = end
+
+    # Messages are framed by moving an offset through the buffer, and each
+    # one is unpacked from a copy of only its own bytes
+    start = self._rstart
+    needed = 0
+    while end - start >= 8:
+      if buf[start] != of.OFP_VERSION:
+        log.warning("Bad OpenFlow version (" + str(buf[start]) +
                     ") on connection " + str(self))
         return False
       # OpenFlow parsing occurs here:
-      ofp_type = ord(self.buf[1])
-      packet_length = ord(self.buf[2]) << 8 | ord(self.buf[3])
-      if packet_length > l: break
+      ofp_type = buf[start + 1]
+      packet_length = buf[start + 2] << 8 | buf[start + 3]
+      if packet_length < 8:
+        log.warning("Bad OpenFlow message length (" + str(packet_length) +
+                    ") on connection " + str(self))
+        return False
+      if packet_length > end - start:
+        needed = packet_length
+        break
+      data = view[start:start + packet_length].tobytes()
+      start += packet_length
       msg = classes[ofp_type]()
-      # msg.unpack implicitly only examines its own bytes, and not trailing
-      # bytes 
-      msg.unpack(self.buf)
-      self.buf = self.buf[packet_length:]
-      l = len(self.buf)
+      msg.unpack(data)
       try:
         h = handlers[ofp_type]
         h(self, msg)
@@ -625,6 +778,21 @@ class Connection (EventMixin):
                       "%s %s", self,self,
                       ("\n" + str(self) + " ").join(str(msg).split('\n')))
         continue
+    del view
+
+    self._rstart = start
+    if start == end:
+      self._rstart = self._rend = 0
+      if len(buf) > self.recv_size:
+        self._rbuf = bytearray(self.recv_size)
+    elif end == len(buf) or start + needed > len(buf):
+      # Out of room: move the partial message to the front, and grow the
+      # buffer if the message doesn't fit in it
+      buf[0:end - start] = buf[start:end]
+      self._rstart = 0
+      self._rend = end - start
+      if needed > len(buf):
+        buf.extend(bytearray(needed - len(buf)))
     return True
 
   def _incoming_stats_reply (self, ofp):
@@ -688,10 +856,30 @@ class OpenFlow_01_Task (Task):
   """
   The main recoco thread for listening to openflow messages
   """
-  def __init__ (self, port = 6633, address = '0.0.0.0'):
+
+  # Most reads done on one connection before moving on to the others
+  read_batch = 4
+  # Most epoll events handled before yielding to other tasks
+  max_events = 1024
+
+  def __init__ (self, port = 6633, address = '0.0.0.0', epoll = None):
+    """
+    epoll selects the loop used: True for the epoll one, False for the
+    select() one, and None for epoll where the platform has it.
+    """
     Task.__init__(self)
     self.port = int(port)
     self.address = address
+    if epoll is None:
+      epoll = hasattr(select, 'epoll')
+    self.epoll = epoll
+    # Connections that queued data to send.  They are sent to right before
+    # the loop waits again, so whatever queues one while the loop isn't in
+    # its own round (another thread, or another task such as a Timer or a
+    # callLater) wakes it with the pinger.
+    self._queued = deque()
+    self._pinger = pox.lib.util.makePinger()
+    self._in_round = False
 
     core.addListener(pox.core.GoingUpEvent, self._handle_GoingUpEvent)
 
@@ -699,24 +887,81 @@ class OpenFlow_01_Task (Task):
     self.start()
 
   def run (self):
-    # List of open sockets/connections to select on
-    sockets = []
-
     listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     listener.bind((self.address, self.port))
-    listener.listen(16)
-    sockets.append(listener)
+    listener.listen(socket.SOMAXCONN)
 
     log.debug("Listening for connections on %s:%s" %
               (self.address, self.port))
 
+    if self.epoll:
+      loop = self._run_epoll(listener)
+    else:
+      loop = self._run_select(listener)
+    # Pass what we are woken up with on to the loop
+    rv = loop.next()
+    while True:
+      rv = loop.send((yield rv))
+
+  def _accept (self, listener):
+    new_sock = listener.accept()[0]
+    if pox.openflow.debug.pcap_traces:
+      new_sock = wrap_socket(new_sock)
+    new_sock.setblocking(0)
+    # Note that instantiating a Connection object fires a
+    # ConnectionUp event (after negotation has completed)
+    con = Connection(new_sock)
+    con.on_queued = self._on_queued
+    if con.sending:
+      self._on_queued(con)
+    return con
+
+  def _on_queued (self, con):
+    self._queued.append(con)
+    if not self._in_round:
+      self._pinger.ping()
+
+  def _end_round (self, flush):
+    """
+    Sends what was queued during the round, before the loop waits again
+    """
+    self._in_round = False
+    while self._queued:
+      flush(self._queued.popleft())
+
+  def _read (self, con):
+    """
+    Reads from con until it has nothing more to give or read_batch reads
+    are done, so that a busy switch can't hold up the others.  Returns
+    False if the connection should be closed.
+    """
+    for i in xrange(self.read_batch):
+      try:
+        if con.read() is False:
+          return False
+      except socket.error as e:
+        if i > 0 and e.args[0] == EAGAIN:
+          break
+        raise
+      if not con._recv_full:
+        break
+    return True
+
+  def _run_select (self, listener):
+    # List of open sockets/connections to select on
+    sockets = [listener]
+
     con = None
     while core.running:
       try:
         while True:
           con = None
-          rlist, wlist, elist = yield Select(sockets, [], sockets, 5)
+          self._end_round(Connection.flush)
+          writers = [c for c in sockets if c is not listener and c.sending]
+          rlist, wlist, elist = yield Select(sockets + [self._pinger],
+                                             writers, sockets, 5)
+          self._in_round = True
           if len(rlist) == 0 and len(wlist) == 0 and len(elist) == 0:
             """
             try:
@@ -728,6 +973,13 @@ class OpenFlow_01_Task (Task):
             if not core.running: break
             pass
 
+          if self._pinger in rlist:
+            self._pinger.pongAll()
+            rlist.remove(self._pinger)
+
+          for con in wlist:
+            con.flush()
+
           for con in elist:
             if con is listener:
               raise RuntimeError("Error on listener socket")
@@ -743,33 +995,16 @@ class OpenFlow_01_Task (Task):
 
           for con in rlist:
             if con is listener:
-              new_sock = listener.accept()[0]
-              if pox.openflow.debug.pcap_traces:
-                new_sock = wrap_socket(new_sock)
-              new_sock.setblocking(0)
-              # Note that instantiating a Connection object fires a
-              # ConnectionUp event (after negotation has completed)
-              newcon = Connection(new_sock)
-              sockets.append( newcon )
+              sockets.append(self._accept(listener))
               #print str(newcon) + " connected"
             else:
-              if con.read() is False:
+              if self._read(con) is False:
                 con.close()
                 sockets.remove(con)
       except exceptions.KeyboardInterrupt:
         break
       except:
-        doTraceback = True
-        if sys.exc_info()[0] is socket.error:
-          if sys.exc_info()[1][0] == ECONNRESET:
-            con.info("Connection reset")
-            doTraceback = False
-
-        if doTraceback:
-          log.exception("Exception reading connection " + str(con))
-
-        if con is listener:
-          log.error("Exception on OpenFlow listener.  Aborting.")
+        if not self._handle_exception(con, listener):
           break
         try:
           con.close()
@@ -784,6 +1019,133 @@ class OpenFlow_01_Task (Task):
 
     #pox.core.quit()
 
+  def _run_epoll (self, listener):
+    """
+    Like _run_select, but connections are registered once with an epoll
+    object instead of being handed to select() on every round.  Only the
+    epoll object itself is given to the scheduler.
+
+    The listener is edge-triggered, and every pending connection is
+    accepted when it fires.  Connections are level-triggered: with
+    edge-triggering, a connection would have to be read until it runs dry,
+    and one busy switch could starve the rest.  What is sent to them
+    during a round is sent together at its end, and they are watched for
+    being writable only while the socket can't take it all.
+    """
+    poller = select.epoll()
+    listener.setblocking(0)
+    listener_fd = listener.fileno()
+    poller.register(listener_fd, select.EPOLLIN | select.EPOLLET)
+    pinger_fd = self._pinger.fileno()
+    poller.register(pinger_fd, select.EPOLLIN)
+    # fd -> Connection
+    connections = {}
+    # fds of the connections watched for being writable
+    writing = set()
+
+    def flush (con):
+      try:
+        fd = con.fileno()
+      except:
+        return
+      if connections.get(fd) is not con or fd in writing:
+        return
+      con.flush()
+      if con.sending:
+        # What is left is sent once the socket is writable
+        writing.add(fd)
+        poller.modify(fd, select.EPOLLIN | select.EPOLLOUT)
+
+    def drop (fd):
+      con = connections.pop(fd, None)
+      if con is None: return
+      writing.discard(fd)
+      try:
+        poller.unregister(fd)
+      except:
+        pass
+      try:
+        con.close()
+      except:
+        pass
+
+    con = None
+    fd = None
+    while core.running:
+      try:
+        while True:
+          con = None
+          fd = None
+          self._end_round(flush)
+          yield Select([poller], [], [], 5)
+          self._in_round = True
+          if not core.running: break
+
+          for fd, events in poller.poll(0, self.max_events):
+            if fd == listener_fd:
+              con = listener
+              if events & (select.EPOLLERR | select.EPOLLHUP):
+                raise RuntimeError("Error on listener socket")
+              while True:
+                try:
+                  newcon = self._accept(listener)
+                except socket.error as e:
+                  if e.args[0] != EAGAIN:
+                    # We won't hear about the connections left in the
+                    # backlog until another one comes in
+                    log.error("Error accepting connection: %s", e)
+                  break
+                connections[newcon.fileno()] = newcon
+                poller.register(newcon.fileno(), select.EPOLLIN)
+              continue
+
+            if fd == pinger_fd:
+              self._pinger.pongAll()
+              continue
+
+            con = connections.get(fd)
+            if con is None: continue
+            if events & select.EPOLLOUT:
+              con.flush()
+              if not con.sending:
+                writing.discard(fd)
+                poller.modify(fd, select.EPOLLIN)
+            # Errors and hangups show up as a failed or empty read
+            if events & ~select.EPOLLOUT:
+              if self._read(con) is False:
+                drop(fd)
+      except exceptions.KeyboardInterrupt:
+        break
+      except:
+        if not self._handle_exception(con, listener):
+          break
+        if fd is not None:
+          drop(fd)
+
+    for fd in connections.keys():
+      drop(fd)
+    poller.close()
+    log.debug("No longer listening for connections")
+
+  def _handle_exception (self, con, listener):
+    """
+    Logs the exception being handled while reading con.  Returns False if
+    the loop should stop.
+    """
+    doTraceback = True
+    if sys.exc_info()[0] is socket.error:
+      if sys.exc_info()[1][0] == ECONNRESET:
+        con.info("Connection reset")
+        doTraceback = False
+
+    if doTraceback:
+      log.exception("Exception reading connection " + str(con))
+
+    if con is listener:
+      log.error("Exception on OpenFlow listener.  Aborting.")
+      return False
+    return True
+
 classes.extend( make_type_to_class_table())
 
 handlers.extend([None] * (1 + sorted(handlerMap.keys(), reverse=True)[0]))
@@ -792,10 +1154,15 @@ for h in handlerMap:
   #print handlerMap[h]
 
 
-def launch (port = 6633, address = "0.0.0.0"):
+def launch (port = 6633, address = "0.0.0.0", recv_size = None,
+            epoll = None):
   if core.hasComponent('of_01'):
     return None
-  l = OpenFlow_01_Task(port = int(port), address = address)
+  if recv_size is not None:
+    Connection.recv_size = int(recv_size)
+  if epoll is not None:
+    epoll = pox.lib.util.str_to_bool(epoll)
+  l = OpenFlow_01_Task(port = int(port), address = address, epoll = epoll)
   core.register("of_01", l)
   return l
 
@@ -0,0 +1,115 @@
+# Copyright 2011 James McCauley
+#
+# This file is part of POX.
+#
+# POX is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# POX is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Converts OpenFlow matches and actions to JSON-friendly dicts.
+
+The fields are read directly, instead of formatting the objects with show()
+and parsing the text back.
+"""
+
+import struct
+
+from pox.openflow.libopenflow_01 import *
+
+_unpack_eth = struct.Struct("!6B").unpack
+
+# Flow tables hold few distinct Ethernet addresses, so their strings are kept
+_eth_strs = {}
+_ETH_STRS_MAX = 4096
+
+def _eth_str (addr):
+  # Same as str(addr)
+  raw = addr.toRaw()
+  s = _eth_strs.get(raw)
+  if s is None:
+    if len(_eth_strs) >= _ETH_STRS_MAX:
+      _eth_strs.clear()
+    s = "%02x:%02x:%02x:%02x:%02x:%02x" % _unpack_eth(raw)
+    _eth_strs[raw] = s
+  return s
+
+# (name, wildcard bits, formatter) of the match fields, in show() order.
+# nw_src and nw_dst are handled apart, since they can be partly wildcarded.
+_match_fields = [
+  ('in_port', OFPFW_IN_PORT, None),
+  ('dl_src', OFPFW_DL_SRC, _eth_str),
+  ('dl_dst', OFPFW_DL_DST, _eth_str),
+  ('dl_vlan', OFPFW_DL_VLAN, None),
+  ('dl_vlan_pcp', OFPFW_DL_VLAN_PCP, None),
+  ('dl_type', OFPFW_DL_TYPE, None),
+  ('nw_tos', OFPFW_NW_TOS, None),
+  ('nw_proto', OFPFW_NW_PROTO, None),
+  ('tp_src', OFPFW_TP_SRC, None),
+  ('tp_dst', OFPFW_TP_DST, None),
+]
+
+def _nw_addr (addr, wildcard_bits):
+  if wildcard_bits == 0:
+    return str(addr)
+  return "%s/%i" % (addr, 32 - wildcard_bits)
+
+def match_to_dict (m):
+  """
+  Returns a dict with the fields of an ofp_match that are not wildcarded.
+
+  IP addresses are "a.b.c.d" or "a.b.c.d/prefix", Ethernet addresses are
+  "xx:xx:xx:xx:xx:xx" and the other fields are ints.
+  """
+  d = {}
+  w = m.wildcards
+  for (name, bits, formatter) in _match_fields:
+    if w & bits != bits:
+      value = getattr(m, '_' + name)
+      d[name] = value if formatter is None else formatter(value)
+
+  bits = (w & OFPFW_NW_SRC_MASK) >> OFPFW_NW_SRC_SHIFT
+  if bits < 32:
+    d['nw_src'] = _nw_addr(m._nw_src, bits)
+  bits = (w & OFPFW_NW_DST_MASK) >> OFPFW_NW_DST_SHIFT
+  if bits < 32:
+    d['nw_dst'] = _nw_addr(m._nw_dst, bits)
+  return d
+
+# Fields of each action class, besides its type
+_action_fields = {
+  ofp_action_output : (('port', None), ('max_len', None)),
+  ofp_action_enqueue : (('port', None), ('queue_id', None)),
+  ofp_action_vlan_vid : (('vlan_vid', None),),
+  ofp_action_vlan_pcp : (('vlan_pcp', None),),
+  ofp_action_dl_addr : (('dl_addr', _eth_str),),
+  ofp_action_nw_addr : (('nw_addr', str),),
+  ofp_action_nw_tos : (('nw_tos', None),),
+  ofp_action_tp_port : (('tp_port', None),),
+  ofp_action_mpls_label : (('mpls_label', None),),
+  ofp_action_mpls_tc : (('mpls_tc', None),),
+  ofp_action_mpls_ttl : (('mpls_ttl', None),),
+  ofp_action_push_mpls : (('ethertype', None),),
+  ofp_action_pop_mpls : (('ethertype', None),),
+  ofp_action_vendor_header : (('vendor', None),),
+}
+
+def action_to_dict (a):
+  """
+  Returns a dict with the type of an action (e.g., "OFPAT_OUTPUT") and its
+  fields.
+  """
+  d = {'type' : ofp_action_type_map.get(a.type, a.type)}
+  for (name, formatter) in _action_fields.get(type(a), ()):
+    value = getattr(a, name)
+    d[name] = value if formatter is None else formatter(value)
+  return d
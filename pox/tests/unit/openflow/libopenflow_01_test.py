@@ -36,6 +36,34 @@ class ofp_match_test(unittest.TestCase):
       setattr(m, change[0], None)
       self.assertEquals(m.wildcards & change[2], change[2], "with %s reset from %s, wildcard bit %x should be set again" % change)
 
+  def test_packed_cache(self):
+    """ ofp_match: packed forms follow changes to the match """
+    m = ofp_match(dl_type=0x0800, nw_proto=6)
+    packed = m.pack()
+    wire = m.pack(flow_mod=True)
+    self.assertEquals(m.pack(), packed)
+    self.assertEquals(m.pack(flow_mod=True), wire)
+    for change in (("tp_dst", 22), ("nw_dst", "10.0.0.0/8"),
+                   ("dl_src", EthAddr("02:00:00:00:00:01")), ("tp_dst", None)):
+      setattr(m, change[0], change[1])
+      n = ofp_match()
+      n.unpack(m.pack())
+      self.assertEquals(n, m, "pack after setting %s to %s" % change)
+      n.unpack(m.pack(flow_mod=True), flow_mod=True)
+      self.assertEquals(n, m, "wire pack after setting %s to %s" % change)
+    m.wildcards = OFPFW_ALL
+    self.assertEquals(extract_num(m.pack(), 0, 4), OFPFW_ALL)
+
+  def test_unpack_raw_addresses(self):
+    """ ofp_match: Ethernet addresses are unpacked as they are on the wire """
+    m = ofp_match(dl_src=EthAddr("3a:3a:3a:3a:3a:01"),
+                  dl_dst=EthAddr("ff:ff:ff:ff:ff:ff"))
+    n = ofp_match()
+    n.unpack(m.pack())
+    self.assertEquals(n.dl_src, EthAddr("3a:3a:3a:3a:3a:01"))
+    self.assertEquals(n.dl_dst, EthAddr("ff:ff:ff:ff:ff:ff"))
+    self.assertRaises(TypeError, ofp_match, packed="")
+
   def test_ip_wildcard_magic(self):
     """ ofp_match: check IP wildcard magic"""
 
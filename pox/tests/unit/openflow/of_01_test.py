@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import socket
+import select
+import threading
+import time
+from errno import EAGAIN, ECONNRESET
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.libopenflow_01 import *
+from pox.openflow import SendQueueHigh, SendQueueLow, BarrierIn, ErrorIn
+from pox.openflow import ConnectionDown
+from pox.openflow.of_01 import Connection, OpenFlow_01_Task
+
+class MockSocket(object):
+  """ Hands out the given chunks of data, one per recv_into call """
+  def __init__(self, chunks, blocking = False):
+    self.chunks = list(chunks)
+    self.sent = []
+    # Whether running out of chunks looks like EAGAIN rather than EOF
+    self.blocking = blocking
+    self.reads = 0
+    # Bytes send takes before raising EAGAIN, None for no limit
+    self.capacity = None
+
+  def recv_into(self, buffer, nbytes = 0):
+    self.reads += 1
+    if not self.chunks:
+      if self.blocking:
+        raise socket.error(EAGAIN, "Resource temporarily unavailable")
+      return 0
+    chunk = self.chunks[0]
+    n = min(len(chunk), nbytes or len(buffer))
+    buffer[0:n] = chunk[:n]
+    if n == len(chunk):
+      del self.chunks[0]
+    else:
+      self.chunks[0] = chunk[n:]
+    return n
+
+  def send(self, data):
+    if self.capacity is not None:
+      if self.capacity == 0:
+        raise socket.error(EAGAIN, "Resource temporarily unavailable")
+      data = data[:self.capacity]
+      self.capacity -= len(data)
+    self.sent.append(data)
+    return len(data)
+
+def echo_request(xid, body = ""):
+  r = ofp_echo_request(xid=xid, body=body)
+  r.length = len(r)
+  return r
+
+def split(data, size):
+  return [data[i:i+size] for i in range(0, len(data), size)]
+
+class ConnectionReadTest(unittest.TestCase):
+  def read_all(self, chunks, recv_size = None):
+    sock = MockSocket(chunks)
+    con = Connection.__new__(Connection)
+    if recv_size is not None:
+      con.recv_size = recv_size
+    Connection.__init__(con, sock)
+    while sock.chunks:
+      self.assertTrue(con.read())
+    # The first message sent is our hello, the others are echo replies
+    replies = []
+    for data in sock.sent[1:]:
+      reply = ofp_echo_reply()
+      reply.unpack(data)
+      replies.append(reply)
+    return (con, replies)
+
+  def test_split_messages(self):
+    requests = [echo_request(i, "x" * (i % 13))
+                for i in range(100)]
+    data = "".join(r.pack() for r in requests)
+    for size in (1, 3, 8, 50, len(data)):
+      (con, replies) = self.read_all(split(data, size), recv_size=64)
+      self.assertEquals([r.xid for r in replies], range(100))
+      self.assertEquals([r.body for r in replies],
+                        [r.body for r in requests])
+      self.assertEquals(con._rstart, con._rend)
+
+  def test_large_message(self):
+    big = echo_request(1, "y" * 5000)
+    data = echo_request(0).pack() + big.pack()
+    (con, replies) = self.read_all(split(data, 100), recv_size=256)
+    self.assertEquals([r.xid for r in replies], [0, 1])
+    self.assertEquals(replies[1].body, big.body)
+    # The buffer goes back to its size once the message is handled
+    self.assertEquals(len(con._rbuf), 256)
+
+  def test_bad_length(self):
+    data = echo_request(0).pack()
+    data = data[:2] + "\x00\x04" + data[4:]
+    con = Connection(MockSocket([data]))
+    self.assertFalse(con.read())
+
+  def test_closed(self):
+    con = Connection(MockSocket([]))
+    self.assertFalse(con.read())
+
+class ReadBatchTest(unittest.TestCase):
+  def setUp(self):
+    self.task = OpenFlow_01_Task.__new__(OpenFlow_01_Task)
+
+  def message(self, size):
+    return echo_request(0, "x" * (size - 8)).pack()
+
+  def connection(self, chunks):
+    con = Connection.__new__(Connection)
+    con.recv_size = 16
+    Connection.__init__(con, MockSocket(chunks, blocking=True))
+    return con
+
+  def test_stops_when_short(self):
+    con = self.connection([self.message(16), self.message(8), self.message(16)])
+    self.assertTrue(self.task._read(con))
+    # The short read means there is nothing left for now
+    self.assertEquals(con.sock.reads, 2)
+
+  def test_batch_limit(self):
+    con = self.connection([self.message(16)] * 10)
+    self.assertTrue(self.task._read(con))
+    self.assertEquals(con.sock.reads, self.task.read_batch)
+
+  def test_ran_dry(self):
+    con = self.connection([self.message(16)])
+    self.assertTrue(self.task._read(con))
+    self.assertEquals(con.sock.reads, 2)
+
+  def test_closed(self):
+    con = self.connection([])
+    con.sock.blocking = False
+    self.assertFalse(self.task._read(con))
+
+class ConnectionSendTest(unittest.TestCase):
+  def setUp(self):
+    self.sock = MockSocket([])
+    self.con = Connection(self.sock)
+    self.con.high_watermark = 100
+    self.con.low_watermark = 40
+    self.events = []
+    self.con.addListener(SendQueueHigh, self.events.append)
+    self.con.addListener(SendQueueLow, self.events.append)
+    # The hello is out of the way
+    del self.sock.sent[:]
+
+  def test_queue_for_loop(self):
+    queued = []
+    self.con.on_queued = queued.append
+    self.con.send("a" * 30)
+    self.con.send("b" * 30)
+    # The loop is told once, and sends it all together
+    self.assertEquals(queued, [self.con])
+    self.assertEquals(self.sock.sent, [])
+    self.assertTrue(self.con.flush())
+    self.assertFalse(self.con.sending)
+    self.assertEquals(self.sock.sent, ["a" * 30 + "b" * 30])
+
+  def test_queue_when_blocked(self):
+    self.sock.capacity = 10
+    self.con.send("a" * 30)
+    self.con.send("b" * 30)
+    self.assertTrue(self.con.sending)
+    self.sock.capacity = None
+    self.assertTrue(self.con.flush())
+    self.assertFalse(self.con.sending)
+    # What was queued goes out in order, in one send
+    self.assertEquals(self.sock.sent, ["a" * 10, "a" * 20 + "b" * 30])
+
+  def test_send_chunk(self):
+    self.con.send_chunk = 25
+    self.sock.capacity = 0
+    for c in "abcde":
+      self.con.send(c * 10)
+    self.sock.capacity = None
+    self.con.flush()
+    self.assertEquals(self.sock.sent, ["aaaaaaaaaabbbbbbbbbb",
+                                       "ccccccccccdddddddddd", "eeeeeeeeee"])
+
+  def test_watermarks(self):
+    self.sock.capacity = 0
+    for i in range(12):
+      self.con.send("x" * 10)
+    self.assertEquals([type(e) for e in self.events], [SendQueueHigh])
+    self.assertEquals(self.events[0].queued, 110)
+    self.assertTrue(self.con.blocked)
+    self.sock.capacity = 50
+    self.con.flush()
+    self.assertEquals(len(self.events), 1)
+    self.sock.capacity = 30
+    self.con.flush()
+    self.assertEquals([type(e) for e in self.events],
+                      [SendQueueHigh, SendQueueLow])
+    self.assertEquals(self.events[1].queued, 40)
+    self.assertFalse(self.con.blocked)
+
+  def test_error(self):
+    def fail(data):
+      raise socket.error(ECONNRESET, "Connection reset by peer")
+    self.sock.send = fail
+    self.sock.shutdown = lambda how: None
+    self.con.send("x" * 10)
+    self.assertTrue(self.con.disconnected)
+    self.assertFalse(self.con.sending)
+
+class BatchTest(unittest.TestCase):
+  def setUp(self):
+    self.sock = MockSocket([])
+    self.con = Connection(self.sock)
+    del self.sock.sent[:]
+    self.done = []
+
+  def flow_mods(self, n):
+    return [ofp_flow_mod(xid=i + 1, match=ofp_match(in_port=i))
+            for i in range(n)]
+
+  def reply(self, event, ofp):
+    self.con.raiseEvent(event, self.con, ofp)
+
+  def test_one_send(self):
+    msgs = self.flow_mods(3)
+    batch = self.con.send_batch(msgs)
+    self.assertEquals(self.sock.sent, ["".join(m.pack() for m in msgs)])
+    self.assertEquals(len(batch), 3)
+    self.assertTrue(batch.ok)
+
+  def test_barrier(self):
+    batch = self.con.send_batch(self.flow_mods(3), barrier=True)
+    batch.on_complete(self.done.append)
+    self.assertEquals(len(self.sock.sent), 1)
+    barrier = ofp_barrier_request()
+    barrier.unpack(self.sock.sent[0][-8:])
+    self.assertEquals(barrier.header_type, OFPT_BARRIER_REQUEST)
+    self.assertEquals(barrier.xid, batch.barrier.xid)
+    self.assertFalse(batch.completed)
+
+    self.reply(ErrorIn, ofp_error(xid=2, type=OFPET_FLOW_MOD_FAILED))
+    self.reply(ErrorIn, ofp_error(xid=99, type=OFPET_FLOW_MOD_FAILED))
+    self.reply(BarrierIn, ofp_barrier_reply(xid=barrier.xid + 1))
+    self.assertEquals(self.done, [])
+    self.reply(BarrierIn, ofp_barrier_reply(xid=barrier.xid))
+    self.assertEquals(self.done, [batch])
+    self.assertEquals([e.xid for e in batch.errors], [2])
+    self.assertFalse(batch.ok)
+    # The batch no longer listens
+    self.reply(ErrorIn, ofp_error(xid=1, type=OFPET_FLOW_MOD_FAILED))
+    self.assertEquals(len(batch.errors), 1)
+
+  def test_barrier_unsupported(self):
+    batch = self.con.send_batch(self.flow_mods(2), barrier=True)
+    batch.on_complete(self.done.append)
+    self.reply(ErrorIn, ofp_error(xid=batch.barrier.xid,
+                                  type=OFPET_BAD_REQUEST,
+                                  code=OFPBRC_BAD_TYPE))
+    self.assertEquals(self.done, [batch])
+    self.assertTrue(batch.ok)
+
+  def test_barrier_failed(self):
+    batch = self.con.send_batch(self.flow_mods(2), barrier=True)
+    batch.on_complete(self.done.append)
+    self.reply(ErrorIn, ofp_error(xid=batch.barrier.xid,
+                                  type=OFPET_BAD_REQUEST,
+                                  code=OFPBRC_EPERM))
+    self.assertEquals(self.done, [batch])
+    self.assertEquals([e.xid for e in batch.errors], [batch.barrier.xid])
+    self.assertFalse(batch.ok)
+
+  def test_connection_down(self):
+    batch = self.con.send_batch(self.flow_mods(1), barrier=True)
+    batch.on_complete(self.done.append)
+    self.con.dpid = 1
+    self.con.raiseEvent(ConnectionDown, self.con)
+    self.assertEquals(self.done, [batch])
+    self.assertTrue(batch.disconnected)
+    self.assertFalse(batch.ok)
+
+  def test_context_manager(self):
+    with self.con.batch() as batch:
+      for msg in self.flow_mods(2):
+        batch.add(msg)
+      self.assertEquals(self.sock.sent, [])
+    self.assertEquals(len(self.sock.sent), 1)
+    self.assertRaises(RuntimeError, batch.add, self.flow_mods(1)[0])
+
+    try:
+      with self.con.batch() as batch:
+        batch.add(self.flow_mods(1)[0])
+        raise ValueError()
+    except ValueError:
+      pass
+    self.assertEquals(len(self.sock.sent), 1)
+
+class LoopWakeupTest(unittest.TestCase):
+  """
+  Data sent from other tasks of the scheduler than the OpenFlow loop (a
+  callLater, a callDelayed or a Timer) has to wake the loop up
+  """
+  def free_port(self):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+  def start_loop(self, epoll):
+    from pox.core import core
+    port = self.free_port()
+    task = OpenFlow_01_Task(port=port, address="127.0.0.1", epoll=epoll)
+    accepted = []
+    ready = threading.Event()
+    def accept(listener):
+      con = OpenFlow_01_Task._accept(task, listener)
+      accepted.append(con)
+      ready.set()
+      return con
+    task._accept = accept
+    task.start(scheduler=core.scheduler)
+
+    switch = None
+    deadline = time.time() + 5
+    while switch is None and time.time() < deadline:
+      try:
+        switch = socket.create_connection(("127.0.0.1", port))
+      except socket.error:
+        time.sleep(0.01)
+    self.assertTrue(switch is not None)
+    self.assertTrue(ready.wait(5))
+    hello = self.recv(switch, len(ofp_hello()), 5)
+    self.assertEquals(len(hello), len(ofp_hello()))
+    return (core, accepted[0], switch)
+
+  def recv(self, sock, size, timeout):
+    data = ""
+    deadline = time.time() + timeout
+    while len(data) < size:
+      left = deadline - time.time()
+      if left <= 0 or not select.select([sock], [], [], left)[0]:
+        break
+      chunk = sock.recv(size - len(data))
+      if not chunk:
+        break
+      data += chunk
+    return data
+
+  def check_call_later(self, epoll):
+    (core, con, switch) = self.start_loop(epoll)
+    try:
+      # Let the loop go back to waiting for its sockets
+      time.sleep(0.2)
+      request = echo_request(7)
+      start = time.time()
+      core.callLater(con.send, request)
+      data = self.recv(switch, len(request), 2)
+      self.assertEquals(data, request.pack())
+      self.assertTrue(time.time() - start < 1)
+    finally:
+      switch.close()
+
+  def test_call_later_select(self):
+    self.check_call_later(False)
+
+  def test_call_later_epoll(self):
+    if not hasattr(select, "epoll"):
+      return
+    self.check_call_later(True)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.libopenflow_01 import *
+from pox.openflow.of_json import *
+
+class match_to_dict_test(unittest.TestCase):
+  def test_wildcarded(self):
+    self.assertEquals(match_to_dict(ofp_match()), {})
+
+  def test_fields(self):
+    m = ofp_match(in_port=3, dl_src=EthAddr("00:11:22:33:44:55"),
+                  dl_type=0x800, nw_proto=6, tp_dst=179)
+    self.assertEquals(match_to_dict(m), {
+      'in_port' : 3,
+      'dl_src' : "00:11:22:33:44:55",
+      'dl_type' : 0x800,
+      'nw_proto' : 6,
+      'tp_dst' : 179,
+    })
+
+  def test_nw_prefixes(self):
+    m = ofp_match(dl_type=0x800, nw_src="10.1.2.3", nw_dst="172.16.0.0/12")
+    d = match_to_dict(m)
+    self.assertEquals(d['nw_src'], "10.1.2.3")
+    self.assertEquals(d['nw_dst'], "172.16.0.0/12")
+
+  def test_unpacked(self):
+    m = ofp_match(dl_type=0x800, nw_dst="10.0.0.0/8", dl_vlan=7)
+    u = ofp_match()
+    u.unpack(m.pack())
+    self.assertEquals(match_to_dict(u), match_to_dict(m))
+
+class action_to_dict_test(unittest.TestCase):
+  def test_output(self):
+    self.assertEquals(action_to_dict(ofp_action_output(port=2)),
+                      {'type' : 'OFPAT_OUTPUT', 'port' : 2,
+                       'max_len' : 65535})
+
+  def test_addresses(self):
+    a = ofp_action_dl_addr.set_dst(EthAddr("00:11:22:33:44:55"))
+    self.assertEquals(action_to_dict(a), {'type' : 'OFPAT_SET_DL_DST',
+                                          'dl_addr' : "00:11:22:33:44:55"})
+    a = ofp_action_nw_addr.set_src(IPAddr("1.2.3.4"))
+    self.assertEquals(action_to_dict(a), {'type' : 'OFPAT_SET_NW_SRC',
+                                          'nw_addr' : "1.2.3.4"})
+
+  def test_enqueue(self):
+    a = ofp_action_enqueue(port=1, queue_id=4)
+    self.assertEquals(action_to_dict(a), {'type' : 'OFPAT_ENQUEUE',
+                                          'port' : 1, 'queue_id' : 4})
+
+if __name__ == '__main__':
+  unittest.main()
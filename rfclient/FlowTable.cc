@@ -27,6 +27,10 @@ int FlowTable::laddr = 0;
 int FlowTable::lroute = 0;
 boost::thread FlowTable::HTPolling;
 boost::thread FlowTable::RTPolling;
+boost::thread FlowTable::BatchFlushing;
+boost::mutex FlowTable::batchMutex;
+RouteModBatch FlowTable::batch;
+boost::system_time FlowTable::batchDeadline;
 map<string, Interface> FlowTable::interfaces;
 vector<uint32_t>* FlowTable::down_ports;
 IPCMessageService* FlowTable::ipc;
@@ -45,6 +49,17 @@ void FlowTable::RTPollingCb() {
 	rtnl_listen(&rth, FlowTable::updateRouteTable, NULL);
 }
 
+// Sends the pending batch once it is ROUTE_BATCH_DELAY milliseconds old
+void FlowTable::BatchFlushingCb() {
+    while (true) {
+        boost::this_thread::sleep(boost::posix_time::milliseconds(ROUTE_BATCH_DELAY));
+        boost::lock_guard<boost::mutex> lock(batchMutex);
+        if (not batch.get_routes().empty() and
+            boost::get_system_time() >= batchDeadline)
+            flushBatch();
+    }
+}
+
 void FlowTable::clear() {
     FlowTable::routeTable.clear();
     FlowTable::hostTable.clear();
@@ -61,8 +76,10 @@ void FlowTable::start(uint64_t vm_id, map<string, Interface> interfaces, IPCMess
 
 	HTPolling = boost::thread(&FlowTable::HTPollingCb);
 	RTPolling = boost::thread(&FlowTable::RTPollingCb);
+	BatchFlushing = boost::thread(&FlowTable::BatchFlushingCb);
 	HTPolling.detach();
 	RTPolling.detach();
+	BatchFlushing.detach();
 }
 
 int FlowTable::updateHostTable(const struct sockaddr_nl *who, struct nlmsghdr *n, void *arg) {
@@ -397,7 +414,7 @@ void FlowTable::addFlowToHw(const RouteEntry& rentry) {
 	msg.add_option(priority);
 
 	// Send
-	FlowTable::ipc->send(RFCLIENT_RFSERVER_CHANNEL, RFSERVER_ID, msg);
+	FlowTable::sendRouteMod(msg);
 }
 
 void FlowTable::addFlowToHw(const HostEntry& hentry) {
@@ -450,7 +467,7 @@ void FlowTable::addFlowToHw(const HostEntry& hentry) {
 	msg.add_option(priority);
 
     // Send
-    FlowTable::ipc->send(RFCLIENT_RFSERVER_CHANNEL, RFSERVER_ID, msg);
+    FlowTable::sendRouteMod(msg);
 }
 
 void FlowTable::delFlowFromHw(const RouteEntry& rentry) {
@@ -491,7 +508,7 @@ void FlowTable::delFlowFromHw(const RouteEntry& rentry) {
 	msg.add_option(priority);
 
     // Send
-    FlowTable::ipc->send(RFCLIENT_RFSERVER_CHANNEL, RFSERVER_ID, msg);
+    FlowTable::sendRouteMod(msg);
 }
 
 void FlowTable::delFlowFromHw(const HostEntry& hentry) {
@@ -530,5 +547,30 @@ void FlowTable::delFlowFromHw(const HostEntry& hentry) {
 	msg.add_option(priority);
 
     // Send
-    FlowTable::ipc->send(RFCLIENT_RFSERVER_CHANNEL, RFSERVER_ID, msg);
+    FlowTable::sendRouteMod(msg);
+}
+
+// Queues the route of a RouteMod in the pending batch. A batch only carries
+// routes of one type, so a route of the other type sends the batch first to
+// keep the routes in order.
+void FlowTable::sendRouteMod(RouteMod& msg) {
+    boost::lock_guard<boost::mutex> lock(batchMutex);
+    if (not batch.get_routes().empty() and batch.get_mod() != msg.get_mod())
+        flushBatch();
+    if (batch.get_routes().empty()) {
+        batch.set_mod(msg.get_mod());
+        batch.set_id(msg.get_id());
+        batchDeadline = boost::get_system_time() +
+                        boost::posix_time::milliseconds(ROUTE_BATCH_DELAY);
+    }
+    Route route(msg.get_matches(), msg.get_actions(), msg.get_options());
+    batch.add_route(route);
+    if (batch.get_routes().size() >= ROUTE_BATCH_SIZE)
+        flushBatch();
+}
+
+// Sends the pending batch. Called with batchMutex held.
+void FlowTable::flushBatch() {
+    FlowTable::ipc->send(RFCLIENT_RFSERVER_CHANNEL, RFSERVER_ID, batch);
+    batch.set_routes(std::vector<Route>());
 }
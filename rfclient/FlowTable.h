@@ -8,6 +8,7 @@
 #include "libnetlink.hh"
 
 #include "ipc/IPC.h"
+#include "ipc/RFProtocol.h"
 #include "types/IPAddress.h"
 #include "types/MACAddress.h"
 
@@ -85,6 +86,7 @@ class FlowTable {
     public:
         static void RTPollingCb();
         static void HTPollingCb();
+        static void BatchFlushingCb();
         static void fakeReq(const char *hostAddr, const char *intf);
         static void clear();
         
@@ -110,6 +112,12 @@ class FlowTable {
         
         static boost::thread HTPolling;
         static boost::thread RTPolling;
+        static boost::thread BatchFlushing;
+
+        // Routes waiting to be sent to rfserver, all of the same type
+        static boost::mutex batchMutex;
+        static RouteModBatch batch;
+        static boost::system_time batchDeadline;
 
         static list<RouteEntry> routeTable;
         static list<HostEntry> hostTable;
@@ -119,6 +127,8 @@ class FlowTable {
         static void addFlowToHw(const HostEntry& host);
         static void delFlowFromHw(const RouteEntry& route);
         static void delFlowFromHw(const HostEntry& host);
+        static void sendRouteMod(RouteMod& msg);
+        static void flushBatch();
 };
 
 #endif /* FLOWTABLE_HH_ */
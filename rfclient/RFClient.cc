@@ -66,7 +66,7 @@ uint64_t get_interface_id(const char *ifname) {
 RFClient::RFClient(uint64_t id, const string &address) {
     this->id = id;
     syslog(LOG_INFO, "Starting RFClient (vm_id=%s)", to_string<uint64_t>(this->id).c_str());
-    ipc = (IPCMessageService*) new MongoIPCMessageService(address, MONGO_DB_NAME, to_string<uint64_t>(this->id));
+    ipc = createIPCService(address, to_string<uint64_t>(this->id));
 
     this->init_ports = 0;
     this->load_interfaces();
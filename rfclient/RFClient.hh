@@ -4,6 +4,7 @@
 
 #include "ipc/IPC.h"
 #include "ipc/MongoIPC.h"
+#include "ipc/IPCService.h"
 #include "ipc/RFProtocol.h"
 #include "ipc/RFProtocolFactory.h"
 #include "FlowTable.h"
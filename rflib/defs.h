@@ -4,6 +4,14 @@
 #define MONGO_ADDRESS "192.169.1.1:27017"
 #define MONGO_DB_NAME "db"
 
+/* IPC transport: MongoIPC or SocketIPC (rfserver is the hub, the other
+   services connect to it) */
+#define IPC_BACKEND_MONGO "mongo"
+#define IPC_BACKEND_SOCKET "socket"
+#define IPC_BACKEND IPC_BACKEND_MONGO
+/* "address:port" for TCP or "unix:<path>" for a Unix domain socket */
+#define IPC_SOCKET_ADDRESS "192.169.1.1:27018"
+
 #define RFCLIENT_RFSERVER_CHANNEL "rfclient<->rfserver"
 #define RFSERVER_RFPROXY_CHANNEL "rfserver<->rfproxy"
 
@@ -12,6 +20,12 @@
 
 #define DEFAULT_RFCLIENT_INTERFACE "eth0"
 
+/* rfclient sends its routes to rfserver in RouteModBatch messages of up to
+   ROUTE_BATCH_SIZE routes, waiting at most ROUTE_BATCH_DELAY milliseconds
+   for more routes of the same type */
+#define ROUTE_BATCH_SIZE 100
+#define ROUTE_BATCH_DELAY 20
+
 #define SYSLOGFACILITY LOG_LOCAL7
 
 #define RFVS_PREFIX 0x72667673
@@ -1,6 +1,16 @@
 MONGO_ADDRESS = "192.169.1.1:27017"
 MONGO_DB_NAME = "db"
 
+# IPC transport: MongoIPC or SocketIPC (rfserver is the hub, the other
+# services connect to it)
+IPC_BACKEND_MONGO = "mongo"
+IPC_BACKEND_SOCKET = "socket"
+IPC_BACKEND = IPC_BACKEND_MONGO
+# "address:port" for TCP or "unix:<path>" for a Unix domain socket
+IPC_SOCKET_ADDRESS = "192.169.1.1:27018"
+# Also record the messages in Mongo when using sockets, for rfweb
+IPC_MONGO_MIRROR = True
+
 RFCLIENT_RFSERVER_CHANNEL = "rfclient<->rfserver"
 RFSERVER_RFPROXY_CHANNEL = "rfserver<->rfproxy"
 
@@ -9,9 +19,25 @@ RFCONFIG_NAME = "rfconfig"
 RFISL_NAME = "rfisl"
 RFISLCONF_NAME = "rfislconfi"
 
+# Capped collection where rfserver and rfstats record the changes they make to
+# rftable and rfstats, so that rfweb can push them to browsers
+RFEVENTS_NAME = "rfevents"
+RFEVENTS_SIZE = 1048576
+
 RFSERVER_ID = "rfserver"
 RFPROXY_ID = "rfproxy"
 
+# Threads handling RouteMods in rfserver. They share the GIL, so this overlaps
+# sending with translation rather than translating in parallel.
+RFSERVER_WORKERS = 4
+# Seconds between checks of the rfserver configuration files for changes
+CONFIG_RELOAD_INTERVAL = 5
+
+# rfproxy brings the flow table of a reconnecting switch to the desired state
+# instead of RFServer clearing it. Only the POX rfproxy reconciles, so this
+# must stay off when any datapath is controlled by the NOX rfproxy.
+RECONCILE_FLOW_TABLES = False
+
 DEFAULT_RFCLIENT_INTERFACE = "eth0"
 
 RFVS_PREFIX = 0x72667673
@@ -51,6 +77,17 @@ PC_RESET = 1
 # Format 12-digit hex ID
 format_id = lambda dp_id: hex(dp_id).rstrip("L")
 
+# The RF tables store ids (vm_id, dp_id, vs_id, rem_id) as "0x" and 16 hex
+# digits, as they don't always fit in a signed 64-bit BSON integer
+format_table_id = lambda id_: "0x%016x" % id_
+
+# Reads an id as stored in the RF tables, including the decimal strings and
+# integers of older versions
+def parse_table_id(value):
+    if isinstance(value, basestring) and value.startswith("0x"):
+        return int(value, 16)
+    return int(value)
+
 ETHERTYPE_IP = 0x0800
 ETHERTYPE_ARP = 0x0806
 IPPROTO_ICMP = 0x01
@@ -34,3 +34,9 @@ class IPCMessageService:
         
     def send(channel_id, to, msg):
         raise NotImplementedError
+
+    def send_many(self, channel_id, to, msgs):
+        for msg in msgs:
+            if not self.send(channel_id, to, msg):
+                return False
+        return True
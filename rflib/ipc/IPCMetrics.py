@@ -0,0 +1,94 @@
+import bisect
+import threading
+import time
+
+import pymongo as mongo
+
+# Collection where every process publishes its metrics (read by rfweb)
+METRICS_COLLECTION = "ipcmetrics"
+# Seconds between publications
+METRICS_INTERVAL = 5.0
+
+# Upper bounds of the histogram buckets, in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Metric names
+QUEUE_DELAY = "ipc_queue_delay_seconds"          # Sent until received
+PROCESSING_TIME = "ipc_processing_seconds"       # Time in process()
+DISPATCH_DELAY = "rfserver_dispatch_delay_seconds"  # Received until handled
+ROUTE_INSTALL_LATENCY = "route_install_latency_seconds"  # Origin to barrier
+# Origin to the RouteModResult reaching rfserver
+ROUTE_COMPLETION_LATENCY = "route_completion_latency_seconds"
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One count per bound, plus one for values above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return { "bounds" : list(self.bounds), "counts" : list(self.counts),
+                 "sum" : self.sum, "count" : self.count }
+
+# Latency histograms of a process, by metric, channel and message type.
+class IPCMetrics:
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric, channel_id, type_, value):
+        key = (metric, channel_id, type_)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(max(value, 0.0))
+
+    def to_list(self):
+        with self._lock:
+            result = []
+            for ((metric, channel_id, type_), histogram) in \
+                    sorted(self._histograms.items()):
+                doc = histogram.to_dict()
+                doc["name"] = metric
+                doc["channel"] = channel_id
+                doc["type"] = type_
+                result.append(doc)
+            return result
+
+# Periodically stores the metrics of a process in METRICS_COLLECTION, in a
+# document whose _id is the process name.
+class IPCMetricsPublisher:
+    def __init__(self, address, db, name, metrics,
+                 interval=METRICS_INTERVAL):
+        self.address = address
+        self.db = db
+        self.name = name
+        self.metrics = metrics
+        self.interval = interval
+        worker = threading.Thread(target=self._publish_worker)
+        worker.daemon = True
+        worker.start()
+
+    def _publish_worker(self):
+        collection = None
+        while True:
+            time.sleep(self.interval)
+            try:
+                if collection is None:
+                    connection = mongo.Connection(*self.address)
+                    collection = connection[self.db][METRICS_COLLECTION]
+                collection.update({"_id": self.name},
+                                  {"_id": self.name, "updated": time.time(),
+                                   "histograms": self.metrics.to_list()},
+                                  upsert=True)
+            except mongo.errors.PyMongoError:
+                collection = None
@@ -0,0 +1,10 @@
+#include "IPCService.h"
+#include "MongoIPC.h"
+#include "SocketIPC.h"
+#include "defs.h"
+
+IPCMessageService* createIPCService(const string &mongoAddress, const string &id) {
+    if (string(IPC_BACKEND) == IPC_BACKEND_SOCKET)
+        return new SocketIPCMessageService(IPC_SOCKET_ADDRESS, id);
+    return new MongoIPCMessageService(mongoAddress, MONGO_DB_NAME, id);
+}
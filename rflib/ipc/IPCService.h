@@ -0,0 +1,13 @@
+#ifndef __IPCSERVICE_H__
+#define __IPCSERVICE_H__
+
+#include "IPC.h"
+
+/** Creates the IPC service selected by IPC_BACKEND in defs.h. With the
+socket backend, the service connects to the hub at IPC_SOCKET_ADDRESS.
+@param mongoAddress the address of the mongo server, used by MongoIPC
+@param id the ID of this IPC service user
+@return the new IPC service */
+IPCMessageService* createIPCService(const string &mongoAddress, const string &id);
+
+#endif /* __IPCSERVICE_H__ */
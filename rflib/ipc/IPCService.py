@@ -0,0 +1,24 @@
+from rflib.defs import *
+
+import MongoIPC
+import SocketIPC
+from IPCMetrics import IPCMetricsPublisher
+
+# Creates the IPC service selected by IPC_BACKEND for the user `id_`. With
+# the socket backend, the hub listens on IPC_SOCKET_ADDRESS and mirrors the
+# messages to Mongo if IPC_MONGO_MIRROR is set. The latency metrics of the
+# service are published to Mongo under `name` (defaults to `id_`).
+def create_ipc_service(id_, hub=False, mongo_address=MONGO_ADDRESS,
+                       name=None):
+    if IPC_BACKEND == IPC_BACKEND_SOCKET:
+        mirror = None
+        if hub and IPC_MONGO_MIRROR:
+            mirror = MongoIPC.MongoIPCMirror(mongo_address, MONGO_DB_NAME)
+        service = SocketIPC.SocketIPCMessageService(IPC_SOCKET_ADDRESS, id_,
+                                                    hub, mirror)
+    else:
+        service = MongoIPC.MongoIPCMessageService(mongo_address,
+                                                  MONGO_DB_NAME, id_)
+    IPCMetricsPublisher(MongoIPC.format_address(mongo_address),
+                        MONGO_DB_NAME, name or id_, service.metrics)
+    return service
@@ -1,5 +1,6 @@
 #include "MongoIPC.h"
 #include <boost/thread.hpp>
+#include <sys/time.h>
 
 MongoIPCMessageService::MongoIPCMessageService(const string &address, const string db, const string id) {
     this->set_id(id);
@@ -76,6 +77,12 @@ mongo::BSONObj putInEnvelope(const string &from, const string &to, IPCMessage &m
     envelope.append(TO_FIELD, to);
     envelope.append(TYPE_FIELD, msg.get_type());
     envelope.append(READ_FIELD, false);
+
+    struct timeval now;
+    gettimeofday(&now, NULL);
+    double sent = now.tv_sec + now.tv_usec / 1e6;
+    envelope.append(SENT_FIELD, sent);
+    envelope.append(ORIGIN_FIELD, sent);
         
     const char* data = msg.to_BSON();
     envelope.append(CONTENT_FIELD, mongo::BSONObj(data));
@@ -9,6 +9,10 @@
 #define TYPE_FIELD "type"
 #define READ_FIELD "read"
 #define CONTENT_FIELD "content"
+// Time the envelope was sent, and time the message that caused it was first
+// sent, in seconds since the epoch
+#define SENT_FIELD "sent"
+#define ORIGIN_FIELD "origin"
 
 // 1 MB for the capped collection
 #define CC_SIZE 1048576
@@ -1,3 +1,4 @@
+import Queue
 import threading
 import time
 
@@ -5,16 +6,36 @@ import pymongo as mongo
 import bson
 
 import IPC
+from IPCMetrics import IPCMetrics, QUEUE_DELAY, PROCESSING_TIME
 
 FROM_FIELD = "from"
 TO_FIELD = "to"
 TYPE_FIELD = "type"
 READ_FIELD = "read"
 CONTENT_FIELD = "content"
+# Time the envelope was sent, and time the message that caused it was first
+# sent (e.g. the rfclient RouteMod behind an rfserver RouteMod), in seconds
+SENT_FIELD = "sent"
+ORIGIN_FIELD = "origin"
 
 # 1 MB for the capped collection
 CC_SIZE = 1048576
 
+# Collection holding the high-water mark of each (channel, consumer) pair
+MARKS_COLLECTION = "ipcmarks"
+MARK_FIELD = "mark"
+# Back-off used when the tailable cursor dies (e.g. empty channel)
+TAIL_RETRY_INTERVAL = 0.05
+
+# Read acknowledgements are written in batches of up to this many envelopes,
+# or after this many seconds, whichever comes first
+ACK_BATCH_SIZE = 256
+ACK_INTERVAL = 0.5
+
+# Defaults for MongoIPCMessageBuffer
+SEND_BATCH_SIZE = 128
+SEND_INTERVAL = 0.005
+
 def put_in_envelope(from_, to, msg):
     envelope = {}
 
@@ -22,9 +43,16 @@ def put_in_envelope(from_, to, msg):
     envelope[TO_FIELD] = to
     envelope[READ_FIELD] = False
     envelope[TYPE_FIELD] = msg.get_type()
+    envelope[SENT_FIELD] = time.time()
+    envelope[ORIGIN_FIELD] = getattr(msg, "origin", None) or \
+                             envelope[SENT_FIELD]
 
     envelope[CONTENT_FIELD] = {}
     for (k, v) in msg.to_dict().items():
+        # Copy lists so that envelopes waiting in a buffer are not affected by
+        # later changes to the message
+        if isinstance(v, list):
+            v = list(v)
         envelope[CONTENT_FIELD][k] = v
 
     return envelope
@@ -32,8 +60,25 @@ def put_in_envelope(from_, to, msg):
 def take_from_envelope(envelope, factory):
     msg = factory.build_for_type(envelope[TYPE_FIELD]);
     msg.from_dict(envelope[CONTENT_FIELD]);
+    # Messages sent in response keep the origin (see put_in_envelope)
+    msg.origin = envelope.get(ORIGIN_FIELD, envelope.get(SENT_FIELD))
     return msg;
 
+# Records how long an envelope waited before being received and how long its
+# processing took, then returns the result of processing it
+def process_envelope(metrics, envelope, factory, processor, channel_id):
+    received = time.time()
+    if SENT_FIELD in envelope:
+        metrics.observe(QUEUE_DELAY, channel_id, envelope[TYPE_FIELD],
+                        received - envelope[SENT_FIELD])
+    msg = take_from_envelope(envelope, factory)
+    msg.received = received
+    result = processor.process(envelope[FROM_FIELD], envelope[TO_FIELD],
+                               channel_id, msg)
+    metrics.observe(PROCESSING_TIME, channel_id, envelope[TYPE_FIELD],
+                    time.time() - received)
+    return result
+
 def format_address(address):
     try:
         tmp = address.split(":")
@@ -43,6 +88,14 @@ def format_address(address):
             return (tmp[0],)
     except:
         raise ValueError, "Invalid address: " + str(address)
+
+# Creates a capped collection, unless it already exists, and returns it
+def create_capped_collection(db, name, size):
+    try:
+        db.create_collection(name, capped=True, size=size)
+    except mongo.errors.CollectionInvalid:
+        pass
+    return db[name]
             
 class MongoIPCMessageService(IPC.IPCMessageService):
     def __init__(self, address, db, id_):
@@ -50,6 +103,8 @@ class MongoIPCMessageService(IPC.IPCMessageService):
         self.address = format_address(address)
         self._id = id_
         self._producer_connection = mongo.Connection(*self.address)
+        self._channels = set()
+        self.metrics = IPCMetrics()
         
     def listen(self, channel_id, factory, processor, block=True):
         worker = threading.Thread(target=self._listen_worker, args=(channel_id, factory, processor))
@@ -58,26 +113,104 @@ class MongoIPCMessageService(IPC.IPCMessageService):
             worker.join()
         
     def send(self, channel_id, to, msg):
-        self._create_channel(self._producer_connection, channel_id)
-        collection = self._producer_connection[self._db][channel_id]
+        collection = self._get_channel(channel_id)
         collection.insert(put_in_envelope(self.get_id(), to, msg))
         return True
 
+    def send_many(self, channel_id, to, msgs):
+        envelopes = [put_in_envelope(self.get_id(), to, msg) for msg in msgs]
+        return self.send_envelopes(channel_id, envelopes)
+
+    def send_envelopes(self, channel_id, envelopes):
+        if not envelopes:
+            return True
+        collection = self._get_channel(channel_id)
+        # A single insert carries the whole batch
+        collection.insert(envelopes)
+        return True
+
+    def _get_channel(self, channel_id):
+        if channel_id not in self._channels:
+            self._create_channel(self._producer_connection, channel_id)
+            self._channels.add(channel_id)
+        return self._producer_connection[self._db][channel_id]
+
     def _listen_worker(self, channel_id, factory, processor):
         connection = mongo.Connection(*self.address)
         self._create_channel(connection, channel_id)
-        
+
         collection = connection[self._db][channel_id]
-        cursor = collection.find({TO_FIELD: self.get_id(), READ_FIELD: False}, sort=[("_id", mongo.ASCENDING)])
+        marks = connection[self._db][MARKS_COLLECTION]
+        mark_id = channel_id + ":" + self.get_id()
+
+        # The high-water mark is the _id of the last envelope processed by
+        # this consumer. It is only persisted when the channel goes idle, so a
+        # burst of messages costs no writes on the consumer side.
+        mark = self._load_mark(marks, mark_id)
+        stored_mark = mark
+        # Envelopes processed but not yet flagged as read
+        unacked = []
+        ack_deadline = None
 
         while True:
-            for envelope in cursor:
-                msg = take_from_envelope(envelope, factory)
-                processor.process(envelope[FROM_FIELD], envelope[TO_FIELD], channel_id, msg);
-                collection.update({"_id": envelope["_id"]}, {"$set": {READ_FIELD: True}})
-            time.sleep(0.05)
-            cursor = collection.find({TO_FIELD: self.get_id(), READ_FIELD: False}, sort=[("_id", mongo.ASCENDING)])
-                
+            cursor = collection.find({TO_FIELD: self.get_id()},
+                                     tailable=True, await_data=True)
+            # Capped collections keep insertion order, so everything up to and
+            # including the mark has already been delivered. If the mark was
+            # rotated out of the collection, every envelope in it is newer.
+            skipping = mark is not None and \
+                       collection.find_one({"_id": mark}) is not None
+            while cursor.alive:
+                try:
+                    envelope = cursor.next()
+                except StopIteration:
+                    # awaitData timed out: the channel is idle
+                    self._ack(collection, unacked)
+                    unacked = []
+                    if mark != stored_mark:
+                        self._store_mark(marks, mark_id, mark)
+                        stored_mark = mark
+                    continue
+
+                if skipping:
+                    skipping = envelope["_id"] != mark
+                    continue
+                # Without a mark (first run), fall back to the read flag
+                if mark is None and envelope.get(READ_FIELD, False):
+                    continue
+
+                process_envelope(self.metrics, envelope, factory, processor,
+                                 channel_id)
+                mark = envelope["_id"]
+
+                if not unacked:
+                    ack_deadline = time.time() + ACK_INTERVAL
+                unacked.append(mark)
+                if len(unacked) >= ACK_BATCH_SIZE or \
+                   time.time() >= ack_deadline:
+                    self._ack(collection, unacked)
+                    unacked = []
+            # Tailable cursors die on empty collections or when they fall
+            # behind the capped collection; reopen them after a short wait.
+            time.sleep(TAIL_RETRY_INTERVAL)
+
+    def _ack(self, collection, ids):
+        # Flag a batch of envelopes as read in a single round trip. This only
+        # feeds the message view in rfweb; delivery relies on the mark.
+        if ids:
+            collection.update({"_id": {"$in": ids}},
+                              {"$set": {READ_FIELD: True}}, multi=True)
+
+    def _load_mark(self, marks, mark_id):
+        doc = marks.find_one({"_id": mark_id})
+        if doc is None:
+            return None
+        return doc[MARK_FIELD]
+
+    def _store_mark(self, marks, mark_id, mark):
+        marks.update({"_id": mark_id}, {"$set": {MARK_FIELD: mark}},
+                     upsert=True)
+
     def _create_channel(self, connection, name):
         db = connection[self._db]
         try:
@@ -89,6 +222,86 @@ class MongoIPCMessageService(IPC.IPCMessageService):
         except:
             pass
 
+# Collects messages for a channel and sends them with a single insert.
+# The buffer is flushed when it holds `size` envelopes or `interval` seconds
+# after the first envelope was added, whichever comes first. Messages are put
+# in their envelopes when they are added, so they can be modified afterwards.
+# Any service implementing send_envelopes (e.g. SocketIPC) can be used.
+class MongoIPCMessageBuffer:
+    def __init__(self, ipc, channel_id, size=SEND_BATCH_SIZE,
+                 interval=SEND_INTERVAL):
+        self.ipc = ipc
+        self.channel_id = channel_id
+        self.size = size
+        self.interval = interval
+        self._envelopes = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def send(self, to, msg):
+        envelope = put_in_envelope(self.ipc.get_id(), to, msg)
+        with self._lock:
+            self._envelopes.append(envelope)
+            if len(self._envelopes) >= self.size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def send_many(self, to, msgs):
+        for msg in msgs:
+            self.send(to, msg)
+        return True
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        envelopes, self._envelopes = self._envelopes, []
+        self.ipc.send_envelopes(self.channel_id, envelopes)
+
+# Records the envelopes delivered by another transport (see SocketIPC) in
+# the channel collections, flagged as read, so that the message view in
+# rfweb keeps working. Inserts are batched by a background thread and stay
+# off the message path.
+class MongoIPCMirror:
+    def __init__(self, address, db, size=ACK_BATCH_SIZE):
+        self.size = size
+        self._service = MongoIPCMessageService(address, db, None)
+        self._queue = Queue.Queue()
+        worker = threading.Thread(target=self._mirror_worker)
+        worker.daemon = True
+        worker.start()
+
+    def record(self, channel_id, envelope):
+        envelope = dict(envelope)
+        envelope[READ_FIELD] = True
+        self._queue.put((channel_id, envelope))
+
+    def _mirror_worker(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Queue.Empty:
+                    break
+            channels = {}
+            for (channel_id, envelope) in batch:
+                channels.setdefault(channel_id, []).append(envelope)
+            for (channel_id, envelopes) in channels.items():
+                try:
+                    self._service.send_envelopes(channel_id, envelopes)
+                except mongo.errors.PyMongoError:
+                    # The mirror is best effort
+                    pass
+
 class MongoIPCMessage(dict, IPC.IPCMessage):
     def __init__(self, type_, **kwargs):
         dict.__init__(self)
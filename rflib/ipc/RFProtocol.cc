@@ -601,3 +601,214 @@ string RouteMod::str() {
     ss << "  options: " << OptionList::to_BSON(get_options()) << endl;
     return ss.str();
 }
+
+RouteModBatch::RouteModBatch() {
+    set_mod(0);
+    set_id(0);
+    set_routes(std::vector<Route>());
+    set_options(std::vector<Option>());
+}
+
+RouteModBatch::RouteModBatch(uint8_t mod, uint64_t id, std::vector<Route> routes, std::vector<Option> options) {
+    set_mod(mod);
+    set_id(id);
+    set_routes(routes);
+    set_options(options);
+}
+
+int RouteModBatch::get_type() {
+    return ROUTE_MOD_BATCH;
+}
+
+uint8_t RouteModBatch::get_mod() {
+    return this->mod;
+}
+
+void RouteModBatch::set_mod(uint8_t mod) {
+    this->mod = mod;
+}
+
+uint64_t RouteModBatch::get_id() {
+    return this->id;
+}
+
+void RouteModBatch::set_id(uint64_t id) {
+    this->id = id;
+}
+
+std::vector<Route> RouteModBatch::get_routes() {
+    return this->routes;
+}
+
+void RouteModBatch::set_routes(std::vector<Route> routes) {
+    this->routes = routes;
+}
+
+void RouteModBatch::add_route(Route& route) {
+    this->routes.push_back(route);
+}
+
+std::vector<Option> RouteModBatch::get_options() {
+    return this->options;
+}
+
+void RouteModBatch::set_options(std::vector<Option> options) {
+    this->options = options;
+}
+
+void RouteModBatch::add_option(Option& option) {
+    this->options.push_back(option);
+}
+
+void RouteModBatch::from_BSON(const char* data) {
+    mongo::BSONObj obj(data);
+    set_mod(obj["mod"].Int());
+    set_id(string_to<uint64_t>(obj["id"].String()));
+    set_routes(RouteList::to_vector(obj["routes"].Array()));
+    set_options(OptionList::to_vector(obj["options"].Array()));
+}
+
+const char* RouteModBatch::to_BSON() {
+    mongo::BSONObjBuilder _b;
+    _b.append("mod", get_mod());
+    _b.append("id", to_string<uint64_t>(get_id()));
+    _b.appendArray("routes", RouteList::to_BSON(get_routes()));
+    _b.appendArray("options", OptionList::to_BSON(get_options()));
+    mongo::BSONObj o = _b.obj();
+    char* data = new char[o.objsize()];
+    memcpy(data, o.objdata(), o.objsize());
+    return data;
+}
+
+string RouteModBatch::str() {
+    stringstream ss;
+    ss << "RouteModBatch" << endl;
+    ss << "  mod: " << get_mod() << endl;
+    ss << "  id: " << to_string<uint64_t>(get_id()) << endl;
+    ss << "  routes: " << RouteList::to_BSON(get_routes()) << endl;
+    ss << "  options: " << OptionList::to_BSON(get_options()) << endl;
+    return ss.str();
+}
+
+RouteModResult::RouteModResult() {
+    set_ct_id(0);
+    set_id(0);
+    set_mod(0);
+    set_installed(0);
+    set_failed(std::vector<Route>());
+    set_error_type(0);
+    set_error_code(0);
+}
+
+RouteModResult::RouteModResult(uint64_t ct_id, uint64_t id, uint8_t mod, uint32_t installed, std::vector<Route> failed, uint32_t error_type, uint32_t error_code) {
+    set_ct_id(ct_id);
+    set_id(id);
+    set_mod(mod);
+    set_installed(installed);
+    set_failed(failed);
+    set_error_type(error_type);
+    set_error_code(error_code);
+}
+
+int RouteModResult::get_type() {
+    return ROUTE_MOD_RESULT;
+}
+
+uint64_t RouteModResult::get_ct_id() {
+    return this->ct_id;
+}
+
+void RouteModResult::set_ct_id(uint64_t ct_id) {
+    this->ct_id = ct_id;
+}
+
+uint64_t RouteModResult::get_id() {
+    return this->id;
+}
+
+void RouteModResult::set_id(uint64_t id) {
+    this->id = id;
+}
+
+uint8_t RouteModResult::get_mod() {
+    return this->mod;
+}
+
+void RouteModResult::set_mod(uint8_t mod) {
+    this->mod = mod;
+}
+
+uint32_t RouteModResult::get_installed() {
+    return this->installed;
+}
+
+void RouteModResult::set_installed(uint32_t installed) {
+    this->installed = installed;
+}
+
+std::vector<Route> RouteModResult::get_failed() {
+    return this->failed;
+}
+
+void RouteModResult::set_failed(std::vector<Route> failed) {
+    this->failed = failed;
+}
+
+void RouteModResult::add_route(Route& route) {
+    this->failed.push_back(route);
+}
+
+uint32_t RouteModResult::get_error_type() {
+    return this->error_type;
+}
+
+void RouteModResult::set_error_type(uint32_t error_type) {
+    this->error_type = error_type;
+}
+
+uint32_t RouteModResult::get_error_code() {
+    return this->error_code;
+}
+
+void RouteModResult::set_error_code(uint32_t error_code) {
+    this->error_code = error_code;
+}
+
+void RouteModResult::from_BSON(const char* data) {
+    mongo::BSONObj obj(data);
+    set_ct_id(string_to<uint64_t>(obj["ct_id"].String()));
+    set_id(string_to<uint64_t>(obj["id"].String()));
+    set_mod(obj["mod"].Int());
+    set_installed(string_to<uint32_t>(obj["installed"].String()));
+    set_failed(RouteList::to_vector(obj["failed"].Array()));
+    set_error_type(string_to<uint32_t>(obj["error_type"].String()));
+    set_error_code(string_to<uint32_t>(obj["error_code"].String()));
+}
+
+const char* RouteModResult::to_BSON() {
+    mongo::BSONObjBuilder _b;
+    _b.append("ct_id", to_string<uint64_t>(get_ct_id()));
+    _b.append("id", to_string<uint64_t>(get_id()));
+    _b.append("mod", get_mod());
+    _b.append("installed", to_string<uint32_t>(get_installed()));
+    _b.appendArray("failed", RouteList::to_BSON(get_failed()));
+    _b.append("error_type", to_string<uint32_t>(get_error_type()));
+    _b.append("error_code", to_string<uint32_t>(get_error_code()));
+    mongo::BSONObj o = _b.obj();
+    char* data = new char[o.objsize()];
+    memcpy(data, o.objdata(), o.objsize());
+    return data;
+}
+
+string RouteModResult::str() {
+    stringstream ss;
+    ss << "RouteModResult" << endl;
+    ss << "  ct_id: " << to_string<uint64_t>(get_ct_id()) << endl;
+    ss << "  id: " << to_string<uint64_t>(get_id()) << endl;
+    ss << "  mod: " << get_mod() << endl;
+    ss << "  installed: " << to_string<uint32_t>(get_installed()) << endl;
+    ss << "  failed: " << RouteList::to_BSON(get_failed()) << endl;
+    ss << "  error_type: " << to_string<uint32_t>(get_error_type()) << endl;
+    ss << "  error_code: " << to_string<uint32_t>(get_error_code()) << endl;
+    return ss.str();
+}
@@ -10,6 +10,7 @@
 #include "Action.hh"
 #include "Match.hh"
 #include "Option.hh"
+#include "Route.hh"
 
 enum {
 	PORT_REGISTER,
@@ -19,7 +20,9 @@ enum {
 	DATAPATH_DOWN,
 	VIRTUAL_PLANE_MAP,
 	DATA_PLANE_MAP,
-	ROUTE_MOD
+	ROUTE_MOD,
+	ROUTE_MOD_BATCH,
+	ROUTE_MOD_RESULT
 };
 
 class PortRegister : public IPCMessage {
@@ -241,4 +244,77 @@ class RouteMod : public IPCMessage {
         std::vector<Option> options;
 };
 
+class RouteModBatch : public IPCMessage {
+    public:
+        RouteModBatch();
+        RouteModBatch(uint8_t mod, uint64_t id, std::vector<Route> routes, std::vector<Option> options);
+
+        uint8_t get_mod();
+        void set_mod(uint8_t mod);
+
+        uint64_t get_id();
+        void set_id(uint64_t id);
+
+        std::vector<Route> get_routes();
+        void set_routes(std::vector<Route> routes);
+        void add_route(Route& route);
+
+        std::vector<Option> get_options();
+        void set_options(std::vector<Option> options);
+        void add_option(Option& option);
+
+        virtual int get_type();
+        virtual void from_BSON(const char* data);
+        virtual const char* to_BSON();
+        virtual string str();
+
+    private:
+        uint8_t mod;
+        uint64_t id;
+        std::vector<Route> routes;
+        std::vector<Option> options;
+};
+
+class RouteModResult : public IPCMessage {
+    public:
+        RouteModResult();
+        RouteModResult(uint64_t ct_id, uint64_t id, uint8_t mod, uint32_t installed, std::vector<Route> failed, uint32_t error_type, uint32_t error_code);
+
+        uint64_t get_ct_id();
+        void set_ct_id(uint64_t ct_id);
+
+        uint64_t get_id();
+        void set_id(uint64_t id);
+
+        uint8_t get_mod();
+        void set_mod(uint8_t mod);
+
+        uint32_t get_installed();
+        void set_installed(uint32_t installed);
+
+        std::vector<Route> get_failed();
+        void set_failed(std::vector<Route> failed);
+        void add_route(Route& route);
+
+        uint32_t get_error_type();
+        void set_error_type(uint32_t error_type);
+
+        uint32_t get_error_code();
+        void set_error_code(uint32_t error_code);
+
+        virtual int get_type();
+        virtual void from_BSON(const char* data);
+        virtual const char* to_BSON();
+        virtual string str();
+
+    private:
+        uint64_t ct_id;
+        uint64_t id;
+        uint8_t mod;
+        uint32_t installed;
+        std::vector<Route> failed;
+        uint32_t error_type;
+        uint32_t error_code;
+};
+
 #endif /* __RFPROTOCOL_H__ */
@@ -11,6 +11,8 @@ DATAPATH_DOWN = 4
 VIRTUAL_PLANE_MAP = 5
 DATA_PLANE_MAP = 6
 ROUTE_MOD = 7
+ROUTE_MOD_BATCH = 8
+ROUTE_MOD_RESULT = 9
 
 class PortRegister(MongoIPCMessage):
     def __init__(self, vm_id=None, vm_port=None, hwaddress=None):
@@ -45,7 +47,11 @@ class PortRegister(MongoIPCMessage):
         return self.hwaddress
 
     def set_hwaddress(self, hwaddress):
-        self.hwaddress=hwaddress
+        hwaddress = "" if hwaddress is None else hwaddress
+        try:
+            self.hwaddress = str(hwaddress)
+        except:
+            self.hwaddress = ""
 
     def from_dict(self, data):
         self.set_vm_id(data["vm_id"])
@@ -70,7 +76,7 @@ class PortRegister(MongoIPCMessage):
         s = "PortRegister\n"
         s += "  vm_id: " + str(self.get_vm_id()) + "\n"
         s += "  vm_port: " + str(self.get_vm_port()) + "\n"
-        s += " hwaddress: " + self.get_hwaddress() + "\n"
+        s += "  hwaddress: " + str(self.get_hwaddress()) + "\n"
         return s
 
 class PortConfig(MongoIPCMessage):
@@ -592,3 +598,212 @@ class RouteMod(MongoIPCMessage):
         s += "  actions: " + str(self.get_actions()) + "\n"
         s += "  options: " + str(self.get_options()) + "\n"
         return s
+
+class RouteModBatch(MongoIPCMessage):
+    def __init__(self, mod=None, id=None, routes=None, options=None):
+        self.set_mod(mod)
+        self.set_id(id)
+        self.set_routes(routes)
+        self.set_options(options)
+
+    def get_type(self):
+        return ROUTE_MOD_BATCH
+
+    def get_mod(self):
+        return self.mod
+
+    def set_mod(self, mod):
+        mod = 0 if mod is None else mod
+        try:
+            self.mod = int(mod)
+        except:
+            self.mod = 0
+
+    def get_id(self):
+        return self.id
+
+    def set_id(self, id):
+        id = 0 if id is None else id
+        try:
+            self.id = int(id)
+        except:
+            self.id = 0
+
+    def get_routes(self):
+        return self.routes
+
+    def set_routes(self, routes):
+        routes = list() if routes is None else routes
+        try:
+            self.routes = list(routes)
+        except:
+            self.routes = list()
+
+    def add_route(self, route):
+        self.routes.append(route.to_dict())
+
+    def get_options(self):
+        return self.options
+
+    def set_options(self, options):
+        options = list() if options is None else options
+        try:
+            self.options = list(options)
+        except:
+            self.options = list()
+
+    def add_option(self, option):
+        self.options.append(option.to_dict())
+
+    def from_dict(self, data):
+        self.set_mod(data["mod"])
+        self.set_id(data["id"])
+        self.set_routes(data["routes"])
+        self.set_options(data["options"])
+
+    def to_dict(self):
+        data = {}
+        data["mod"] = self.get_mod()
+        data["id"] = str(self.get_id())
+        data["routes"] = self.get_routes()
+        data["options"] = self.get_options()
+        return data
+
+    def from_bson(self, data):
+        data = bson.BSON.decode(data)
+        self.from_dict(data)
+
+    def to_bson(self):
+        return bson.BSON.encode(self.get_dict())
+
+    def __str__(self):
+        s = "RouteModBatch\n"
+        s += "  mod: " + str(self.get_mod()) + "\n"
+        s += "  id: " + str(self.get_id()) + "\n"
+        s += "  routes: " + str(self.get_routes()) + "\n"
+        s += "  options: " + str(self.get_options()) + "\n"
+        return s
+
+class RouteModResult(MongoIPCMessage):
+    def __init__(self, ct_id=None, id=None, mod=None, installed=None, failed=None, error_type=None, error_code=None):
+        self.set_ct_id(ct_id)
+        self.set_id(id)
+        self.set_mod(mod)
+        self.set_installed(installed)
+        self.set_failed(failed)
+        self.set_error_type(error_type)
+        self.set_error_code(error_code)
+
+    def get_type(self):
+        return ROUTE_MOD_RESULT
+
+    def get_ct_id(self):
+        return self.ct_id
+
+    def set_ct_id(self, ct_id):
+        ct_id = 0 if ct_id is None else ct_id
+        try:
+            self.ct_id = int(ct_id)
+        except:
+            self.ct_id = 0
+
+    def get_id(self):
+        return self.id
+
+    def set_id(self, id):
+        id = 0 if id is None else id
+        try:
+            self.id = int(id)
+        except:
+            self.id = 0
+
+    def get_mod(self):
+        return self.mod
+
+    def set_mod(self, mod):
+        mod = 0 if mod is None else mod
+        try:
+            self.mod = int(mod)
+        except:
+            self.mod = 0
+
+    def get_installed(self):
+        return self.installed
+
+    def set_installed(self, installed):
+        installed = 0 if installed is None else installed
+        try:
+            self.installed = int(installed)
+        except:
+            self.installed = 0
+
+    def get_failed(self):
+        return self.failed
+
+    def set_failed(self, failed):
+        failed = list() if failed is None else failed
+        try:
+            self.failed = list(failed)
+        except:
+            self.failed = list()
+
+    def add_route(self, route):
+        self.failed.append(route.to_dict())
+
+    def get_error_type(self):
+        return self.error_type
+
+    def set_error_type(self, error_type):
+        error_type = 0 if error_type is None else error_type
+        try:
+            self.error_type = int(error_type)
+        except:
+            self.error_type = 0
+
+    def get_error_code(self):
+        return self.error_code
+
+    def set_error_code(self, error_code):
+        error_code = 0 if error_code is None else error_code
+        try:
+            self.error_code = int(error_code)
+        except:
+            self.error_code = 0
+
+    def from_dict(self, data):
+        self.set_ct_id(data["ct_id"])
+        self.set_id(data["id"])
+        self.set_mod(data["mod"])
+        self.set_installed(data["installed"])
+        self.set_failed(data["failed"])
+        self.set_error_type(data["error_type"])
+        self.set_error_code(data["error_code"])
+
+    def to_dict(self):
+        data = {}
+        data["ct_id"] = str(self.get_ct_id())
+        data["id"] = str(self.get_id())
+        data["mod"] = self.get_mod()
+        data["installed"] = str(self.get_installed())
+        data["failed"] = self.get_failed()
+        data["error_type"] = str(self.get_error_type())
+        data["error_code"] = str(self.get_error_code())
+        return data
+
+    def from_bson(self, data):
+        data = bson.BSON.decode(data)
+        self.from_dict(data)
+
+    def to_bson(self):
+        return bson.BSON.encode(self.get_dict())
+
+    def __str__(self):
+        s = "RouteModResult\n"
+        s += "  ct_id: " + str(self.get_ct_id()) + "\n"
+        s += "  id: " + str(self.get_id()) + "\n"
+        s += "  mod: " + str(self.get_mod()) + "\n"
+        s += "  installed: " + str(self.get_installed()) + "\n"
+        s += "  failed: " + str(self.get_failed()) + "\n"
+        s += "  error_type: " + str(self.get_error_type()) + "\n"
+        s += "  error_code: " + str(self.get_error_code()) + "\n"
+        return s
@@ -18,6 +18,10 @@ IPCMessage* RFProtocolFactory::buildForType(int type) {
             return new DataPlaneMap();
         case ROUTE_MOD:
             return new RouteMod();
+        case ROUTE_MOD_BATCH:
+            return new RouteModBatch();
+        case ROUTE_MOD_RESULT:
+            return new RouteModResult();
         default:
             return NULL;
     }
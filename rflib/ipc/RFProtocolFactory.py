@@ -19,3 +19,7 @@ class RFProtocolFactory(IPC.IPCMessageFactory):
             return DataPlaneMap()
         if type_ == ROUTE_MOD:
             return RouteMod()
+        if type_ == ROUTE_MOD_BATCH:
+            return RouteModBatch()
+        if type_ == ROUTE_MOD_RESULT:
+            return RouteModResult()
@@ -0,0 +1,211 @@
+#include "SocketIPC.h"
+#include "MongoIPC.h"
+
+#include <endian.h>
+#include <netdb.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <netinet/in.h>
+#include <netinet/tcp.h>
+
+SocketIPCMessageService::SocketIPCMessageService(const string &address, const string id) {
+    this->set_id(id);
+    this->address = address;
+    this->sock = -1;
+    this->worker = boost::thread(&SocketIPCMessageService::connectWorker, this);
+}
+
+/* Opens a connection to the hub. Returns the socket, or -1 on failure. */
+int SocketIPCMessageService::connect() {
+    if (this->address.compare(0, 5, "unix:") == 0) {
+        struct sockaddr_un addr;
+        string path = this->address.substr(5);
+        if (path.size() >= sizeof(addr.sun_path))
+            return -1;
+
+        memset(&addr, 0, sizeof(addr));
+        addr.sun_family = AF_UNIX;
+        strcpy(addr.sun_path, path.c_str());
+
+        int fd = socket(AF_UNIX, SOCK_STREAM, 0);
+        if (fd < 0)
+            return -1;
+        if (::connect(fd, (struct sockaddr*) &addr, sizeof(addr)) < 0) {
+            close(fd);
+            return -1;
+        }
+        return fd;
+    }
+
+    size_t colon = this->address.rfind(':');
+    if (colon == string::npos)
+        return -1;
+    string host = this->address.substr(0, colon);
+    string port = this->address.substr(colon + 1);
+
+    struct addrinfo hints, *res;
+    memset(&hints, 0, sizeof(hints));
+    hints.ai_family = AF_UNSPEC;
+    hints.ai_socktype = SOCK_STREAM;
+    if (getaddrinfo(host.c_str(), port.c_str(), &hints, &res) != 0)
+        return -1;
+
+    int fd = -1;
+    for (struct addrinfo *ai = res; ai != NULL; ai = ai->ai_next) {
+        fd = socket(ai->ai_family, ai->ai_socktype, ai->ai_protocol);
+        if (fd < 0)
+            continue;
+        if (::connect(fd, ai->ai_addr, ai->ai_addrlen) == 0) {
+            int flag = 1;
+            setsockopt(fd, IPPROTO_TCP, TCP_NODELAY, &flag, sizeof(flag));
+            break;
+        }
+        close(fd);
+        fd = -1;
+    }
+    freeaddrinfo(res);
+    return fd;
+}
+
+static bool writeAll(int fd, const char *data, size_t size) {
+    while (size > 0) {
+        ssize_t n = ::send(fd, data, size, MSG_NOSIGNAL);
+        if (n <= 0)
+            return false;
+        data += n;
+        size -= n;
+    }
+    return true;
+}
+
+static bool writeFrames(int fd, const std::vector<mongo::BSONObj> &frames) {
+    std::vector<mongo::BSONObj>::const_iterator iter;
+    for (iter = frames.begin(); iter != frames.end(); ++iter) {
+        if (!writeAll(fd, iter->objdata(), iter->objsize()))
+            return false;
+    }
+    return true;
+}
+
+static bool readAll(int fd, char *buffer, size_t size) {
+    while (size > 0) {
+        ssize_t n = recv(fd, buffer, size, 0);
+        if (n <= 0)
+            return false;
+        buffer += n;
+        size -= n;
+    }
+    return true;
+}
+
+/* Reads the next frame. Returns false if the connection failed. */
+static bool readFrame(int fd, mongo::BSONObj &frame) {
+    int32_t header;
+    if (!readAll(fd, (char*) &header, sizeof(header)))
+        return false;
+    int32_t length = le32toh(header);
+    if (length <= (int32_t) sizeof(length) || length > MAX_FRAME_SIZE)
+        return false;
+
+    char *buffer = new char[length];
+    memcpy(buffer, &header, sizeof(header));
+    bool ok = readAll(fd, buffer + sizeof(length), length - sizeof(length));
+    if (ok)
+        frame = mongo::BSONObj(buffer).getOwned();
+    delete[] buffer;
+    return ok;
+}
+
+void SocketIPCMessageService::connectWorker() {
+    while (true) {
+        int fd = this->connect();
+        if (fd < 0) {
+            sleep(RECONNECT_INTERVAL);
+            continue;
+        }
+
+        mongo::BSONObjBuilder hello;
+        hello.append(FROM_FIELD, this->get_id());
+        hello.appendNull(TO_FIELD);
+        hello.append(CHANNEL_FIELD, HELLO_CHANNEL);
+
+        {
+            boost::lock_guard<boost::mutex> lock(this->sendMutex);
+            std::vector<mongo::BSONObj> frames;
+            frames.push_back(hello.obj());
+            frames.insert(frames.end(), this->pending.begin(),
+                          this->pending.end());
+            if (!writeFrames(fd, frames)) {
+                close(fd);
+                sleep(RECONNECT_INTERVAL);
+                continue;
+            }
+            this->pending.clear();
+            this->sock = fd;
+        }
+
+        mongo::BSONObj envelope;
+        while (readFrame(fd, envelope)) {
+            this->deliver(envelope);
+        }
+
+        {
+            boost::lock_guard<boost::mutex> lock(this->sendMutex);
+            this->sock = -1;
+        }
+        close(fd);
+        sleep(RECONNECT_INTERVAL);
+    }
+}
+
+void SocketIPCMessageService::deliver(const mongo::BSONObj &envelope) {
+    string channelId = envelope[CHANNEL_FIELD].String();
+
+    boost::lock_guard<boost::recursive_mutex> lock(this->deliverMutex);
+    std::map<string, Handler>::iterator handler = this->handlers.find(channelId);
+    if (handler == this->handlers.end()) {
+        this->backlog[channelId].push_back(envelope);
+        return;
+    }
+    this->process(envelope, handler->second);
+}
+
+void SocketIPCMessageService::process(const mongo::BSONObj &envelope, Handler &handler) {
+    IPCMessage *msg = takeFromEnvelope(envelope, handler.first);
+    handler.second->process(envelope[FROM_FIELD].String(), this->get_id(),
+                            envelope[CHANNEL_FIELD].String(), *msg);
+    delete msg;
+}
+
+void SocketIPCMessageService::listen(const string &channelId, IPCMessageFactory *factory, IPCMessageProcessor *processor, bool block) {
+    {
+        boost::lock_guard<boost::recursive_mutex> lock(this->deliverMutex);
+        Handler handler(factory, processor);
+        this->handlers[channelId] = handler;
+
+        std::vector<mongo::BSONObj> envelopes = this->backlog[channelId];
+        this->backlog.erase(channelId);
+        std::vector<mongo::BSONObj>::iterator iter;
+        for (iter = envelopes.begin(); iter != envelopes.end(); ++iter) {
+            this->process(*iter, handler);
+        }
+    }
+    if (block)
+        this->worker.join();
+}
+
+bool SocketIPCMessageService::send(const string &channelId, const string &to, IPCMessage& msg) {
+    mongo::BSONObjBuilder frame;
+    frame.appendElements(putInEnvelope(this->get_id(), to, msg));
+    frame.append(CHANNEL_FIELD, channelId);
+    mongo::BSONObj obj = frame.obj();
+
+    boost::lock_guard<boost::mutex> lock(this->sendMutex);
+    if (this->sock < 0 or !writeAll(this->sock, obj.objdata(), obj.objsize())) {
+        // Sent when the connection to the hub is (re)established
+        this->pending.push_back(obj);
+    }
+    return true;
+}
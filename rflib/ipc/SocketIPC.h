@@ -0,0 +1,51 @@
+#ifndef __SOCKETIPC_H__
+#define __SOCKETIPC_H__
+
+#include <map>
+#include <vector>
+#include <mongo/client/dbclient.h>
+#include <boost/thread.hpp>
+#include "IPC.h"
+
+#define CHANNEL_FIELD "channel"
+#define HELLO_CHANNEL ""
+
+// Frames larger than this are considered corrupt
+#define MAX_FRAME_SIZE (16 * 1024 * 1024)
+// Seconds between attempts to (re)connect to the hub
+#define RECONNECT_INTERVAL 1
+
+/** An IPC message service that talks to the rfserver hub over a stream
+socket (Unix domain or TCP). Each frame is a BSON envelope, whose leading
+int32 is the frame length. The service introduces itself to the hub with its
+ID; messages sent while disconnected, or received on a channel nobody listens
+to yet, are kept until they can be delivered. */
+class SocketIPCMessageService : public IPCMessageService {
+    public:
+        /** Creates and starts an IPC message service using sockets.
+        @param address the address of the hub: "unix:<path>" for a Unix
+                       domain socket or address:port for TCP
+        @param id the ID of this IPC service user */
+        SocketIPCMessageService(const string &address, const string id);
+        virtual void listen(const string &channelId, IPCMessageFactory *factory, IPCMessageProcessor *processor, bool block=true);
+        virtual bool send(const string &channelId, const string &to, IPCMessage& msg);
+
+    private:
+        typedef std::pair<IPCMessageFactory*, IPCMessageProcessor*> Handler;
+
+        string address;
+        int sock;
+        boost::mutex sendMutex;
+        boost::recursive_mutex deliverMutex;
+        std::vector<mongo::BSONObj> pending;
+        std::map<string, Handler> handlers;
+        std::map<string, std::vector<mongo::BSONObj> > backlog;
+        boost::thread worker;
+
+        int connect();
+        void connectWorker();
+        void deliver(const mongo::BSONObj &envelope);
+        void process(const mongo::BSONObj &envelope, Handler &handler);
+};
+
+#endif /* __SOCKETIPC_H__ */
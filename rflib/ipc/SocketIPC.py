@@ -0,0 +1,337 @@
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+
+import bson
+
+import IPC
+from IPCMetrics import IPCMetrics
+from MongoIPC import put_in_envelope, process_envelope, format_address, \
+                     FROM_FIELD, TO_FIELD
+
+# Name of the channel an envelope was sent on. The socket carries every
+# channel, so it travels with the envelope.
+CHANNEL_FIELD = "channel"
+# An envelope on this channel introduces the peer that sent it
+HELLO_CHANNEL = ""
+
+# Frames are BSON envelopes; BSON documents start with their total length as
+# a little-endian int32, which is used as the frame length.
+FRAME_LENGTH = struct.Struct("<i")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# Wait between attempts to (re)connect to the hub
+RECONNECT_INTERVAL = 1.0
+
+# Frames queued for a connection that is not keeping up, and frames kept for
+# a peer that is not connected, beyond which the oldest ones are dropped
+MAX_QUEUED_FRAMES = 100000
+MAX_PENDING_FRAMES = 100000
+
+log = logging.getLogger("socketipc")
+
+def make_socket(address):
+    # "unix:<path>" for a Unix domain socket, "address:port" for TCP
+    if address.startswith("unix:"):
+        return (socket.socket(socket.AF_UNIX, socket.SOCK_STREAM),
+                address[len("unix:"):])
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return (sock, format_address(address))
+
+def encode_frame(channel_id, envelope):
+    envelope = dict(envelope)
+    envelope[CHANNEL_FIELD] = channel_id
+    return bson.BSON.encode(envelope)
+
+# A connection to another service. Frames are written by a thread of the
+# connection, so a slow or stuck peer only delays its own frames. When the
+# connection is closed, on_close(connection, frames) is called with the frames
+# that were not written.
+class SocketIPCConnection:
+    def __init__(self, sock, on_close=None):
+        self.sock = sock
+        self.peer_id = None
+        self.on_close = on_close
+        self._cond = threading.Condition()
+        self._frames = []
+        self._closed = False
+        writer = threading.Thread(target=self._write_worker)
+        writer.daemon = True
+        writer.start()
+
+    # Queues frames to be written. Returns False if the connection is closed.
+    def send_frames(self, frames):
+        with self._cond:
+            if self._closed:
+                return False
+            self._frames.extend(frames)
+            dropped = len(self._frames) - MAX_QUEUED_FRAMES
+            if dropped > 0:
+                del self._frames[:dropped]
+                log.warning("Dropping %d frame(s) queued for %s",
+                            dropped, self.peer_id)
+            self._cond.notify()
+        return True
+
+    def _write_worker(self):
+        while True:
+            with self._cond:
+                while not self._frames and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                frames, self._frames = self._frames, []
+            try:
+                self.sock.sendall("".join(frames))
+            except socket.error, e:
+                log.warning("Failed to write to %s: %s", self.peer_id, e)
+                # The receiving worker notices the socket is closed
+                self._close(frames)
+                return
+
+    # Returns the next envelope, or None if the connection was closed
+    def recv_envelope(self):
+        header = self._recv_exactly(FRAME_LENGTH.size)
+        if header is None:
+            return None
+        (length,) = FRAME_LENGTH.unpack(header)
+        if length <= FRAME_LENGTH.size or length > MAX_FRAME_SIZE:
+            raise ValueError, "Invalid frame length: " + str(length)
+        body = self._recv_exactly(length - FRAME_LENGTH.size)
+        if body is None:
+            return None
+        return bson.BSON(header + body).decode()
+
+    def _recv_exactly(self, size):
+        chunks = []
+        while size > 0:
+            chunk = self.sock.recv(size)
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            size -= len(chunk)
+        return "".join(chunks)
+
+    def close(self):
+        self._close([])
+
+    def _close(self, unsent):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            unsent = unsent + self._frames
+            self._frames = []
+            self._cond.notify()
+        try:
+            # Wakes up a thread blocked receiving from the socket
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+        if unsent and self.on_close is not None:
+            self.on_close(self, unsent)
+
+# An IPC message service over a stream socket (Unix domain or TCP).
+#
+# One service is the hub (rfserver): it listens on the address, and every
+# other service connects to it and introduces itself with its ID. Envelopes
+# go through the hub, which processes the ones addressed to it and forwards
+# the others. Envelopes for a peer that is not connected (up to
+# MAX_PENDING_FRAMES of them), and envelopes on a channel nobody listens to
+# yet, are kept until they can be delivered.
+#
+# If a mirror is given (see MongoIPCMirror), the hub records every envelope
+# it routes in Mongo so rfweb can still show the messages.
+class SocketIPCMessageService(IPC.IPCMessageService):
+    def __init__(self, address, id_, hub=False, mirror=None):
+        self.address = address
+        self._id = id_
+        self._hub = hub
+        self._mirror = mirror
+        self.metrics = IPCMetrics()
+
+        # channel -> (factory, processor), and envelopes awaiting a listener
+        self._handlers = {}
+        self._backlog = {}
+        self._deliver_lock = threading.RLock()
+
+        # Reentrant: closing a connection puts its unsent frames back
+        self._lock = threading.RLock()
+        # Hub: connected peers and frames waiting for a peer to connect
+        self._peers = {}
+        # Peer: the connection to the hub and frames waiting for it
+        self._connection = None
+        self._pending = {}
+
+        if hub:
+            target = self._accept_worker
+        else:
+            target = self._connect_worker
+        self._worker = threading.Thread(target=target)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def listen(self, channel_id, factory, processor, block=True):
+        with self._deliver_lock:
+            self._handlers[channel_id] = (factory, processor)
+            for envelope in self._backlog.pop(channel_id, []):
+                self._process(channel_id, envelope, factory, processor)
+        if block:
+            while self._worker.is_alive():
+                self._worker.join(1)
+
+    def send(self, channel_id, to, msg):
+        return self.send_envelopes(channel_id,
+                                   [put_in_envelope(self.get_id(), to, msg)])
+
+    def send_many(self, channel_id, to, msgs):
+        envelopes = [put_in_envelope(self.get_id(), to, msg) for msg in msgs]
+        return self.send_envelopes(channel_id, envelopes)
+
+    def send_envelopes(self, channel_id, envelopes):
+        # Consecutive envelopes for the same peer are written at once
+        to = None
+        frames = []
+        for envelope in envelopes:
+            if self._mirror is not None:
+                self._mirror.record(channel_id, envelope)
+            if frames and envelope[TO_FIELD] != to:
+                self._send_frames(to, frames)
+                frames = []
+            to = envelope[TO_FIELD]
+            frames.append(encode_frame(channel_id, envelope))
+        if frames:
+            self._send_frames(to, frames)
+        return True
+
+    def _send_frames(self, to, frames):
+        with self._lock:
+            if self._hub:
+                connection = self._peers.get(to)
+            else:
+                connection = self._connection
+            if connection is None or not connection.send_frames(frames):
+                self._add_pending(to if self._hub else None, frames)
+
+    # Keeps frames until their peer (None for the hub) is connected. Frames
+    # that were queued on a connection that closed go before the newer ones.
+    def _add_pending(self, key, frames, first=False):
+        with self._lock:
+            pending = self._pending.setdefault(key, [])
+            if first:
+                pending[:0] = frames
+            else:
+                pending.extend(frames)
+            dropped = len(pending) - MAX_PENDING_FRAMES
+            if dropped > 0:
+                del pending[:dropped]
+                log.warning("Dropping %d frame(s) for %s, which is not "
+                            "connected", dropped, key)
+
+    def _on_close(self, connection, frames):
+        key = connection.peer_id if self._hub else None
+        self._add_pending(key, frames, first=True)
+
+    # Hub
+    def _accept_worker(self):
+        (server, address) = make_socket(self.address)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if server.family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        server.bind(address)
+        server.listen(socket.SOMAXCONN)
+        while True:
+            (sock, _) = server.accept()
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = SocketIPCConnection(sock, self._on_close)
+            worker = threading.Thread(target=self._peer_worker,
+                                      args=(connection,))
+            worker.daemon = True
+            worker.start()
+
+    def _peer_worker(self, connection):
+        try:
+            while True:
+                envelope = connection.recv_envelope()
+                if envelope is None:
+                    break
+                channel_id = envelope.get(CHANNEL_FIELD)
+                if channel_id == HELLO_CHANNEL:
+                    self._register_peer(envelope[FROM_FIELD], connection)
+                elif envelope[TO_FIELD] == self.get_id():
+                    if self._mirror is not None:
+                        self._mirror.record(channel_id, envelope)
+                    self._deliver(channel_id, envelope)
+                else:
+                    self.send_envelopes(channel_id, [envelope])
+        except (socket.error, ValueError), e:
+            log.warning("Dropping connection to %s: %s", connection.peer_id, e)
+        finally:
+            with self._lock:
+                if self._peers.get(connection.peer_id) is connection:
+                    del self._peers[connection.peer_id]
+            connection.close()
+
+    def _register_peer(self, peer_id, connection):
+        with self._lock:
+            old = self._peers.get(peer_id)
+            if old is not None and old is not connection:
+                old.close()
+            connection.peer_id = peer_id
+            self._peers[peer_id] = connection
+            frames = self._pending.pop(peer_id, [])
+            if frames:
+                connection.send_frames(frames)
+
+    # Peer
+    def _connect_worker(self):
+        while True:
+            (sock, address) = make_socket(self.address)
+            try:
+                sock.connect(address)
+            except socket.error:
+                sock.close()
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+
+            connection = SocketIPCConnection(sock, self._on_close)
+            hello = {FROM_FIELD: self.get_id(), TO_FIELD: None}
+            try:
+                with self._lock:
+                    pending = self._pending.pop(None, [])
+                    connection.send_frames(
+                        [encode_frame(HELLO_CHANNEL, hello)] + pending)
+                    self._connection = connection
+                while True:
+                    envelope = connection.recv_envelope()
+                    if envelope is None:
+                        break
+                    self._deliver(envelope.get(CHANNEL_FIELD), envelope)
+            except (socket.error, ValueError), e:
+                log.warning("Lost connection to the IPC hub: %s", e)
+            with self._lock:
+                self._connection = None
+            connection.close()
+            time.sleep(RECONNECT_INTERVAL)
+
+    def _deliver(self, channel_id, envelope):
+        with self._deliver_lock:
+            handler = self._handlers.get(channel_id)
+            if handler is None:
+                self._backlog.setdefault(channel_id, []).append(envelope)
+                return
+            (factory, processor) = handler
+            self._process(channel_id, envelope, factory, processor)
+
+    def _process(self, channel_id, envelope, factory, processor):
+        process_envelope(self.metrics, envelope, factory, processor,
+                         channel_id)
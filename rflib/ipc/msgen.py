@@ -17,6 +17,8 @@ typesMap = {
 "action[]": "std::vector<Action>",
 "option": "Option&",
 "option[]": "std::vector<Option>",
+"route": "Route&",
+"route[]": "std::vector<Route>",
 }
 
 defaultValues = {
@@ -30,6 +32,7 @@ defaultValues = {
 "match[]": "std::vector<Match>()",
 "action[]": "std::vector<Action>()",
 "option[]": "std::vector<Option>()",
+"route[]": "std::vector<Route>()",
 }
 
 exportType = {
@@ -43,6 +46,7 @@ exportType = {
 "match[]": "MatchList::to_BSON({0})",
 "action[]": "ActionList::to_BSON({0})",
 "option[]": "OptionList::to_BSON({0})",
+"route[]": "RouteList::to_BSON({0})",
 }
 
 importType = {
@@ -56,6 +60,7 @@ importType = {
 "match[]": "MatchList::to_vector({0}.Array())",
 "action[]": "ActionList::to_vector({0}.Array())",
 "option[]": "OptionList::to_vector({0}.Array())",
+"route[]": "RouteList::to_vector({0}.Array())",
 }
 
 # Python
@@ -70,6 +75,7 @@ pyDefaultValues = {
 "match[]": "list()",
 "action[]": "list()",
 "option[]": "list()",
+"route[]": "list()",
 }
 
 pyExportType = {
@@ -83,6 +89,7 @@ pyExportType = {
 "match[]": "{0}",
 "action[]": "{0}",
 "option[]": "{0}",
+"route[]": "{0}",
 }
 
 pyImportType = {
@@ -96,6 +103,7 @@ pyImportType = {
 "match[]": "list({0})",
 "action[]": "list({0})",
 "option[]": "list({0})",
+"route[]": "list({0})",
 }
 
 def convmsgtype(string):
@@ -154,6 +162,7 @@ def genH(messages, fname):
     g.addLine("#include \"Action.hh\"")
     g.addLine("#include \"Match.hh\"")
     g.addLine("#include \"Option.hh\"")
+    g.addLine("#include \"Route.hh\"")
     g.blankLine();
     enum = "enum {\n\t"
     enum += ",\n\t".join([convmsgtype(name) for name, msg in messages]) 
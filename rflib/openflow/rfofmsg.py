@@ -2,6 +2,11 @@ from pox.openflow.libopenflow_01 import *
 from pox.lib.addresses import *
 
 from rflib.defs import *
+from rflib.types.Match import *
+from rflib.types.Action import *
+from rflib.types.Option import *
+
+netmask_prefix = lambda a: sum([bin(int(x)).count("1") for x in a.split(".", 4)])
 
 def ofm_match_dl(ofm, match, value):
     ofm.match.wildcards &= ~match;
@@ -137,3 +142,75 @@ def create_temporary_flow_msg(ip, mask, srcMac):
     ofm.actions.append(ofp_action_output(port=0))
     
     return ofm
+
+
+# Convert a RouteFlow Match to an OpenFlow match. Returns False on failure.
+def ofm_add_match(ofm, match):
+    type_ = match._type
+    if type_ == RFMT_IPV4:
+        address, netmask = match.get_value()
+        ofm.match.dl_type = ETHERTYPE_IP
+        ofm.match.set_nw_dst(IPAddr(address), netmask_prefix(netmask))
+    elif type_ == RFMT_ETHERNET:
+        ofm.match.dl_dst = EthAddr(match.get_value())
+    elif type_ == RFMT_IN_PORT:
+        ofm.match.in_port = match.get_value()
+    else:
+        # RFMT_IPV6 and RFMT_MPLS are not implemented in OpenFlow 1.0
+        return False
+    return True
+
+# Convert a RouteFlow Action to an OpenFlow action. Returns False on failure.
+def ofm_add_action(ofm, action):
+    type_ = action._type
+    if type_ == RFAT_OUTPUT:
+        ofm.actions.append(ofp_action_output(port=action.get_value()))
+    elif type_ == RFAT_SET_ETH_SRC:
+        ofm.actions.append(ofp_action_dl_addr(type=OFPAT_SET_DL_SRC,
+                                              dl_addr=EthAddr(action.get_value())))
+    elif type_ == RFAT_SET_ETH_DST:
+        ofm.actions.append(ofp_action_dl_addr(type=OFPAT_SET_DL_DST,
+                                              dl_addr=EthAddr(action.get_value())))
+    else:
+        # MPLS actions are not implemented in OpenFlow 1.0
+        return False
+    return True
+
+# Convert a RouteFlow Option to an OpenFlow field. Returns False on failure.
+def ofm_add_option(ofm, option):
+    type_ = option._type
+    if type_ == RFOT_PRIORITY:
+        ofm.priority = option.get_value()
+    elif type_ == RFOT_IDLE_TIMEOUT:
+        ofm.idle_timeout = option.get_value()
+    elif type_ == RFOT_HARD_TIMEOUT:
+        ofm.hard_timeout = option.get_value()
+    else:
+        return False
+    return True
+
+# Create an OpenFlow flow_mod from the matches, actions and options (in dict
+# form) of a RouteMod. Unsupported optional TLVs are dropped; returns None if
+# a mandatory one can't be translated.
+def create_flow_mod(mod, matches, actions, options):
+    ofm = ofp_flow_mod()
+
+    if mod == RMT_ADD:
+        ofm.command = OFPFC_ADD
+    elif mod == RMT_DELETE:
+        ofm.command = OFPFC_DELETE_STRICT
+    else:
+        return None
+    ofm.idle_timeout = OFP_FLOW_PERMANENT
+    ofm.hard_timeout = OFP_FLOW_PERMANENT
+    ofm.out_port = OFPP_NONE
+
+    for (tlvs, cls, add) in ((matches, Match, ofm_add_match),
+                             (actions, Action, ofm_add_action),
+                             (options, Option, ofm_add_option)):
+        for tlv in tlvs:
+            tlv = cls.from_dict(tlv)
+            if not add(ofm, tlv) and not tlv.optional(tlv._type):
+                return None
+
+    return ofm
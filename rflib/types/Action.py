@@ -13,9 +13,6 @@ RFAT_DROP = 254         # Drop packet (Unimplemented)
 RFAT_SFLOW = 255        # Generate SFlow messages (Unimplemented)
 
 class Action(TLV):
-    def __init__(self, actionType=None, value=None):
-        super(Action, self).__init__(actionType, self.type_to_bin(actionType, value))
-
     @classmethod
     def OUTPUT(cls, port):
         return cls(RFAT_OUTPUT, port)
@@ -48,39 +45,19 @@ class Action(TLV):
     def POP_SFLOW(cls):
         return cls(RFAT_POP_SFLOW, None)
 
-    @classmethod
-    def from_dict(cls, dic):
-        ac = cls()
-        ac._type = dic['type']
-        ac._value = dic['value']
-        return ac
-
     @staticmethod
     def optional(optionType):
         if optionType in (RFAT_DROP, RFAT_SFLOW):
-            return true
-        return false
-
-    @staticmethod
-    def type_to_bin(actionType, value):
-        if actionType in (RFAT_OUTPUT, RFAT_PUSH_MPLS, RFAT_SWAP_MPLS):
-            return int_to_bin(value, 32)
-        elif actionType in (RFAT_SET_ETH_SRC, RFAT_SET_ETH_DST):
-            return ether_to_bin(value)
-        elif actionType in (RFAT_POP_MPLS, RFAT_DROP, RFAT_SFLOW):
-            return ''
-        else:
-            return None
-
-    def get_value(self):
-        if self._type in (RFAT_OUTPUT, RFAT_PUSH_MPLS, RFAT_SWAP_MPLS):
-            return bin_to_int(self._value)
-        elif self._type in (RFAT_SET_ETH_SRC, RFAT_SET_ETH_DST):
-            return bin_to_ether(self._value)
-        elif self._type in (RFAT_POP_MPLS, RFAT_DROP, RFAT_SFLOW):
-            return None
-        else:
-            return None
-
-    def set_value(self, value):
-        self._value = Binary(self.type_to_bin(self._type, value), 0)
+            return True
+        return False
+
+    _codecs = {
+        RFAT_OUTPUT: int_codec(32),
+        RFAT_SET_ETH_SRC: ETHER_CODEC,
+        RFAT_SET_ETH_DST: ETHER_CODEC,
+        RFAT_PUSH_MPLS: int_codec(32),
+        RFAT_POP_MPLS: EMPTY_CODEC,
+        RFAT_SWAP_MPLS: int_codec(32),
+        RFAT_DROP: EMPTY_CODEC,
+        RFAT_SFLOW: EMPTY_CODEC,
+    }
@@ -8,9 +8,6 @@ RFOT_HARD_TIMEOUT = 3 # Drop route after specified time has passed
 RFOT_CT_ID = 255      # Specify destination controller
 
 class Option(TLV):
-    def __init__(self, optionType=None, value=None):
-        super(Option, self).__init__(optionType, self.type_to_bin(optionType, value))
-
     @classmethod
     def PRIORITY(cls, priority):
         return cls(RFOT_PRIORITY, priority)
@@ -27,34 +24,15 @@ class Option(TLV):
     def CT_ID(cls, controller):
         return cls(RFOT_CT_ID, controller)
 
-    @classmethod
-    def from_dict(cls, dic):
-        ma = cls()
-        ma._type = dic['type']
-        ma._value = dic['value']
-        return ma
-
     @staticmethod
     def optional(optionType):
-        if optionType in (RFOT_CT_ID):
-            return true
-        return false
-
-    @staticmethod
-    def type_to_bin(optionType, value):
-        if optionType in (RFOT_PRIORITY, RFOT_IDLE_TIMEOUT, RFOT_HARD_TIMEOUT):
-            return int_to_bin(value, 16)
-        elif optionType == RFOT_CT_ID:
-            return int_to_bin(value, 64)
-        else:
-            return None
-
-    def get_value(self):
-        if self._type in (RFOT_PRIORITY, RFOT_IDLE_TIMEOUT, RFOT_HARD_TIMEOUT,
-                          RFOT_CT_ID):
-            return bin_to_int(self._value)
-        else:
-            return None
-
-    def set_value(value):
-        _value = Binary(self.type_to_bin(self._type, value), 0)
+        if optionType in (RFOT_CT_ID,):
+            return True
+        return False
+
+    _codecs = {
+        RFOT_PRIORITY: int_codec(16),
+        RFOT_IDLE_TIMEOUT: int_codec(16),
+        RFOT_HARD_TIMEOUT: int_codec(16),
+        RFOT_CT_ID: int_codec(64),
+    }
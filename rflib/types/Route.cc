@@ -0,0 +1,83 @@
+#include "Route.hh"
+
+Route::Route() { }
+
+Route::Route(std::vector<Match> matches, std::vector<Action> actions,
+             std::vector<Option> options)
+    : matches(matches), actions(actions), options(options) { }
+
+std::vector<Match> Route::get_matches() const {
+    return this->matches;
+}
+
+void Route::add_match(const Match& match) {
+    this->matches.push_back(match);
+}
+
+std::vector<Action> Route::get_actions() const {
+    return this->actions;
+}
+
+void Route::add_action(const Action& action) {
+    this->actions.push_back(action);
+}
+
+std::vector<Option> Route::get_options() const {
+    return this->options;
+}
+
+void Route::add_option(const Option& option) {
+    this->options.push_back(option);
+}
+
+mongo::BSONObj Route::to_BSON() const {
+    mongo::BSONObjBuilder builder;
+    builder.appendArray("matches", MatchList::to_BSON(this->matches));
+    builder.appendArray("actions", ActionList::to_BSON(this->actions));
+    builder.appendArray("options", OptionList::to_BSON(this->options));
+    return builder.obj();
+}
+
+/**
+ * Constructs a Route from a BSONObj formatted as follows:
+ * {
+ *   "matches": [(Match), ...],
+ *   "actions": [(Action), ...],
+ *   "options": [(Option), ...]
+ * }
+ *
+ * Invalid TLVs are left out, as in MatchList/ActionList/OptionList.
+ */
+Route Route::from_BSON(const mongo::BSONObj bson) {
+    return Route(MatchList::to_vector(bson["matches"].Array()),
+                 ActionList::to_vector(bson["actions"].Array()),
+                 OptionList::to_vector(bson["options"].Array()));
+}
+
+namespace RouteList {
+    mongo::BSONArray to_BSON(const std::vector<Route> list) {
+        std::vector<Route>::const_iterator iter;
+        mongo::BSONArrayBuilder builder;
+
+        for (iter = list.begin(); iter != list.end(); ++iter) {
+            builder.append(iter->to_BSON());
+        }
+
+        return builder.arr();
+    }
+
+    /**
+     * Returns a vector of Routes extracted from 'array', an array of
+     * bson-encoded Route objects.
+     */
+    std::vector<Route> to_vector(std::vector<mongo::BSONElement> array) {
+        std::vector<mongo::BSONElement>::iterator iter;
+        std::vector<Route> list;
+
+        for (iter = array.begin(); iter != array.end(); ++iter) {
+            list.push_back(Route::from_BSON(iter->Obj()));
+        }
+
+        return list;
+    }
+}
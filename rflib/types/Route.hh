@@ -0,0 +1,40 @@
+#ifndef __ROUTE_HH__
+#define __ROUTE_HH__
+
+#include <vector>
+#include <mongo/client/dbclient.h>
+
+#include "Match.hh"
+#include "Action.hh"
+#include "Option.hh"
+
+/** A single flow carried by a RouteModBatch: the matches, actions and
+options of what would otherwise be sent as its own RouteMod. */
+class Route {
+    public:
+        Route();
+        Route(std::vector<Match> matches, std::vector<Action> actions,
+              std::vector<Option> options);
+
+        std::vector<Match> get_matches() const;
+        void add_match(const Match& match);
+        std::vector<Action> get_actions() const;
+        void add_action(const Action& action);
+        std::vector<Option> get_options() const;
+        void add_option(const Option& option);
+
+        mongo::BSONObj to_BSON() const;
+        static Route from_BSON(mongo::BSONObj);
+
+    private:
+        std::vector<Match> matches;
+        std::vector<Action> actions;
+        std::vector<Option> options;
+};
+
+namespace RouteList {
+    mongo::BSONArray to_BSON(const std::vector<Route> list);
+    std::vector<Route> to_vector(std::vector<mongo::BSONElement> array);
+}
+
+#endif /* __ROUTE_HH__ */
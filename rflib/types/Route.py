@@ -0,0 +1,34 @@
+# A single flow carried by a RouteModBatch: the matches, actions and options
+# of what would otherwise be sent as its own RouteMod. Like RouteMod, the
+# lists hold the dict form of Match, Action and Option objects.
+class Route(object):
+    def __init__(self, matches=None, actions=None, options=None):
+        self.matches = list() if matches is None else list(matches)
+        self.actions = list() if actions is None else list(actions)
+        self.options = list() if options is None else list(options)
+
+    def get_matches(self):
+        return self.matches
+
+    def add_match(self, match):
+        self.matches.append(match.to_dict())
+
+    def get_actions(self):
+        return self.actions
+
+    def add_action(self, action):
+        self.actions.append(action.to_dict())
+
+    def get_options(self):
+        return self.options
+
+    def add_option(self, option):
+        self.options.append(option.to_dict())
+
+    @classmethod
+    def from_dict(cls, dic):
+        return cls(dic['matches'], dic['actions'], dic['options'])
+
+    def to_dict(self):
+        return { 'matches' : self.matches, 'actions' : self.actions,
+                 'options' : self.options }
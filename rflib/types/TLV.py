@@ -1,14 +1,49 @@
+import struct
 from socket import *
 from binascii import *
 from bson.binary import Binary
 
 class TLV(object):
-    def __init__(self, _type=None, _value=None):
+    # Each subclass maps its types to a (pack, unpack) pair of functions in
+    # _codecs. Packing is done once when the TLV is built; unpacking only
+    # happens when get_value() is called, and the result is kept.
+    _codecs = {}
+
+    def __init__(self, _type=None, value=None):
         self._type = _type
         if(_type != None):
-            self._value = Binary(_value, 0)
+            self._value = Binary(self.type_to_bin(_type, value), 0)
         else:
-            self._value = _value
+            self._value = None
+        self._decoded = None
+
+    @classmethod
+    def type_to_bin(cls, _type, value):
+        codec = cls._codecs.get(_type)
+        if codec is None:
+            return None
+        return codec[0](value)
+
+    @classmethod
+    def from_dict(cls, dic):
+        # Skip __init__: the value is already in binary form
+        tlv = cls.__new__(cls)
+        tlv._type = dic['type']
+        tlv._value = dic['value']
+        tlv._decoded = None
+        return tlv
+
+    def get_value(self):
+        if self._decoded is None:
+            codec = self._codecs.get(self._type)
+            if codec is None:
+                return None
+            self._decoded = codec[1](self._value)
+        return self._decoded
+
+    def set_value(self, value):
+        self._value = Binary(self.type_to_bin(self._type, value), 0)
+        self._decoded = None
 
     def get_value_raw(self):
         return self._value
@@ -16,21 +51,66 @@ class TLV(object):
     def to_dict(self):
         return { 'type' : self._type, 'value' : self._value }
 
+# Precompiled packers for the fixed-width integer values
+UINT16 = struct.Struct('!H')
+UINT32 = struct.Struct('!I')
+UINT64 = struct.Struct('!Q')
+ETHER = struct.Struct('!6B')
+
+int_structs = { 16: UINT16, 32: UINT32, 64: UINT64 }
+
 def hex_int_extend(num, length):
     return ((length/4 - len(num)) * '0') + num
 
 def int_to_bin(num, length):
-    hexnum = hex(num)[2:]
-    hexnum = hexnum if len(hexnum) % 2 == 0 else '0' + hexnum
-    return a2b_hex(hex_int_extend(hexnum, length))
+    try:
+        return int_structs[length].pack(num)
+    except (KeyError, struct.error):
+        # Values wider than the field keep their old, longer encoding
+        hexnum = hex(num)[2:].rstrip('L')
+        hexnum = hexnum if len(hexnum) % 2 == 0 else '0' + hexnum
+        return a2b_hex(hex_int_extend(hexnum, length))
 
 def bin_to_int(value):
+    length = len(value)
+    if length == 4:
+        return UINT32.unpack(value)[0]
+    elif length == 2:
+        return UINT16.unpack(value)[0]
+    elif length == 8:
+        return UINT64.unpack(value)[0]
     return int(b2a_hex(value), 16)
 
 def ether_to_bin(ethaddr):
     return a2b_hex(ethaddr.replace(':', ''))
 
 def bin_to_ether(value):
+    if len(value) == 6:
+        return '%02x:%02x:%02x:%02x:%02x:%02x' % ETHER.unpack(value)
     hexval = b2a_hex(value)
     ethers = '%2s:%2s:%2s:%2s:%2s:%2s' % (hexval[:2], hexval[2:4], hexval[4:6], hexval[6:8], hexval[8:10], hexval[10:])
     return ethers
+
+def int_codec(length):
+    packer = int_structs[length]
+    def pack(value):
+        try:
+            return packer.pack(value)
+        except struct.error:
+            return int_to_bin(value, length)
+    def unpack(value):
+        if len(value) == packer.size:
+            return packer.unpack(value)[0]
+        return bin_to_int(value)
+    return (pack, unpack)
+
+ETHER_CODEC = (ether_to_bin, bin_to_ether)
+EMPTY_CODEC = (lambda value: '', lambda value: None)
+
+def ip_codec(family, length):
+    def pack(value):
+        return inet_pton(family, value[0]) + inet_pton(family, value[1])
+    def unpack(value):
+        return (inet_ntop(family, value[:length]),
+                inet_ntop(family, value[length:]))
+    return (pack, unpack)
@@ -0,0 +1,96 @@
+import Queue
+import logging
+import threading
+
+from rflib.defs import *
+
+# Dispatches the messages received by RFServer.
+#
+# RouteMods only read the tables, so they are handled by a pool of shard
+# threads. Translation is pure Python and holds the GIL, so the shards do not
+# translate in parallel. What they overlap is the translation of one VM's
+# routes with the I/O of another's (a send that fills the rfproxy buffer
+# inserts it, releasing the GIL). The tables live in this process, so the
+# shards can't be moved to processes without copying them.
+#
+# Each shard has its own queue, and the shard is picked from the VM the
+# RouteMod comes from: the routes of a VM are always translated and sent in
+# the order they arrived, whichever datapaths (local or over an ISL) they end
+# up on, so the add and the withdrawal of a route can't be reordered.
+#
+# Control events (port register, datapath down, port map) change the tables
+# and go through a single ordered lane instead. Before a control event is
+# applied every shard is drained, and no RouteMod is handed out until it is
+# done, so the tables are never written while a shard is reading them.
+#
+# key(msg) returns the key a RouteMod is sharded by; route(msg) and
+# control(msg) handle a RouteMod and a control event.
+class RFDispatcher:
+    def __init__(self, key, route, control, workers=RFSERVER_WORKERS):
+        self.key = key
+        self.route = route
+        self.control = control
+        self.log = logging.getLogger("rfserver")
+
+        self._inbox = Queue.Queue()
+        self._shards = [Queue.Queue() for i in range(max(1, workers))]
+
+        self._start(self._dispatch_worker)
+        for shard in self._shards:
+            self._start(self._shard_worker, shard)
+
+    def _start(self, target, *args):
+        worker = threading.Thread(target=target, args=args)
+        worker.daemon = True
+        worker.start()
+
+    # Called from the IPC listener threads
+    def dispatch_route(self, msg):
+        self._inbox.put((False, msg))
+
+    def dispatch_control(self, msg):
+        self._inbox.put((True, msg))
+
+    # Wait until every RouteMod handed out so far has been handled
+    def fence(self):
+        for shard in self._shards:
+            shard.join()
+
+    # Wait until every message dispatched so far has been handled
+    def join(self):
+        self._inbox.join()
+        self.fence()
+
+    def _dispatch_worker(self):
+        while True:
+            (is_control, msg) = self._inbox.get()
+            try:
+                self._dispatch(is_control, msg)
+            finally:
+                self._inbox.task_done()
+
+    def _dispatch(self, is_control, msg):
+        if is_control:
+            self.fence()
+            self._handle(self.control, msg)
+            return
+        try:
+            key = self.key(msg)
+        except Exception:
+            self.log.exception("Error dispatching message")
+            return
+        self._shards[hash(key) % len(self._shards)].put(msg)
+
+    def _shard_worker(self, shard):
+        while True:
+            msg = shard.get()
+            try:
+                self._handle(self.route, msg)
+            finally:
+                shard.task_done()
+
+    def _handle(self, handler, msg):
+        try:
+            handler(msg)
+        except Exception:
+            self.log.exception("Error processing message")
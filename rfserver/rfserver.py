@@ -2,34 +2,63 @@
 #-*- coding:utf-8 -*-
 
 import sys
+import time
 import logging
 import binascii
+import threading
 
 from bson.binary import Binary
 
 import rflib.ipc.IPC as IPC
 import rflib.ipc.MongoIPC as MongoIPC
+import rflib.ipc.IPCService as IPCService
 from rflib.ipc.RFProtocol import *
 from rflib.ipc.RFProtocolFactory import RFProtocolFactory
+from rflib.ipc.IPCMetrics import DISPATCH_DELAY, PROCESSING_TIME, \
+                                 ROUTE_COMPLETION_LATENCY
 from rflib.defs import *
 from rflib.types.Action import *
 from rflib.types.Match import *
 from rflib.types.Option import *
+from rflib.types.Route import *
 
 from rftable import *
+from rfdispatch import RFDispatcher
 
 # Register actions
 REGISTER_IDLE = 0
 REGISTER_ASSOCIATED = 1
 REGISTER_ISL = 2
 
+# Control event carrying the new contents of a configuration file
+CONFIG_RELOAD = "config_reload"
+
+class ConfigReload:
+    def __init__(self, table, entries):
+        self.table = table
+        self.entries = entries
+
+    def get_type(self):
+        return CONFIG_RELOAD
+
+# Where a RouteMod for a datapath has to be sent
+class FanOutPlan:
+    def __init__(self):
+        # (dp_port, matches) for each active port of the datapath
+        self.ports = []
+        # (dp_port, matches) for each active ISL port of the datapath
+        self.isl_ports = []
+        # (ct_id, dp_id, dp_port, actions) for each active ISL whose remote
+        # end is the datapath
+        self.remotes = []
+
+# Matches selecting traffic that enters the datapath through a port
+def port_matches(entry):
+    return [Match.ETHERNET(entry.eth_addr).to_dict(),
+            Match.IN_PORT(entry.dp_port).to_dict()]
+
 class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
     def __init__(self, configfile, islconffile):
-        self.rftable = RFTable()
-        self.isltable = RFISLTable()
-        self.config = RFConfig(configfile)
-        self.islconf = RFISLConf(islconffile)
-        self.configured_rfvs = False
         # Logging
         self.log = logging.getLogger("rfserver")
         self.log.setLevel(logging.INFO)
@@ -38,18 +67,77 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
         ch.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
         self.log.addHandler(ch)
 
-        self.ipc = MongoIPC.MongoIPCMessageService(MONGO_ADDRESS, 
-                                                   MONGO_DB_NAME, RFSERVER_ID)
+        self.rftable = RFTable()
+        self.isltable = RFISLTable()
+        self.config = RFConfig(configfile)
+        self.islconf = RFISLConf(islconffile)
+        self.configured_rfvs = False
+        self.fanout_plans = {}
+        self.fanout_generation = 0
+
+        self.ipc = IPCService.create_ipc_service(RFSERVER_ID, hub=True)
+        # Everything sent to rfproxy goes through the same buffer, so the
+        # order of DatapathConfig, RouteMod and DataPlaneMap is preserved
+        self.rfproxy_buffer = MongoIPC.MongoIPCMessageBuffer(
+                                  self.ipc, RFSERVER_RFPROXY_CHANNEL)
+        self.dispatcher = RFDispatcher(self.route_key,
+                                       self.process_route_mod,
+                                       self.process_control)
+        watcher = threading.Thread(target=self.watch_config)
+        watcher.daemon = True
+        watcher.start()
         self.ipc.listen(RFCLIENT_RFSERVER_CHANNEL, self, self, False)
         self.ipc.listen(RFSERVER_RFPROXY_CHANNEL, self, self, True)
 
+    # Reads the configuration files again when they change. They are parsed
+    # here, and only applying the difference goes through the control lane.
+    def watch_config(self):
+        while True:
+            time.sleep(CONFIG_RELOAD_INTERVAL)
+            for table in (self.config, self.islconf):
+                if not table.changed():
+                    continue
+                try:
+                    entries = table.read()
+                except (IOError, OSError) as e:
+                    self.log.warning("Error reading %s: %s" % (table.ifile, e))
+                    continue
+                self.dispatcher.dispatch_control(ConfigReload(table, entries))
+
     def process(self, from_, to, channel, msg):
+        type_ = msg.get_type()
+        if type_ in (ROUTE_MOD, ROUTE_MOD_BATCH):
+            self.dispatcher.dispatch_route(msg)
+        elif type_ in (PORT_REGISTER, DATAPATH_PORT_REGISTER, DATAPATH_DOWN,
+                       VIRTUAL_PLANE_MAP):
+            self.dispatcher.dispatch_control(msg)
+        elif type_ == ROUTE_MOD_RESULT:
+            self.route_mod_result(msg)
+        else:
+            return False
+        return True
+
+    # Runs on a shard worker
+    def process_route_mod(self, msg):
+        start = time.time()
+        type_ = msg.get_type()
+        if type_ == ROUTE_MOD:
+            self.register_route_mod(msg)
+        else:
+            self.register_route_mod_batch(msg)
+        # Time spent waiting in the dispatcher and in translation
+        metrics = self.ipc.metrics
+        metrics.observe(DISPATCH_DELAY, RFCLIENT_RFSERVER_CHANNEL, type_,
+                        start - (getattr(msg, "received", None) or start))
+        metrics.observe(PROCESSING_TIME, RFSERVER_ID, type_,
+                        time.time() - start)
+
+    # Runs on the control lane, while no RouteMod is being handled
+    def process_control(self, msg):
         type_ = msg.get_type()
         if type_ == PORT_REGISTER:
             self.register_vm_port(msg.get_vm_id(), msg.get_vm_port(),
                                   msg.get_hwaddress())
-        elif type_ == ROUTE_MOD:
-            self.register_route_mod(msg)
         elif type_ == DATAPATH_PORT_REGISTER:
             self.register_dp_port(msg.get_ct_id(),
                                   msg.get_dp_id(),
@@ -59,9 +147,14 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
         elif type_ == VIRTUAL_PLANE_MAP:
             self.map_port(msg.get_vm_id(), msg.get_vm_port(),
                           msg.get_vs_id(), msg.get_vs_port())
-        else:
-            return False
-        return True
+        elif type_ == CONFIG_RELOAD:
+            self.reload_config(msg.table, msg.entries)
+        # Control events may change where routes are sent
+        self.invalidate_fanout_plans()
+
+    # RouteMods and RouteModBatches are sharded by the VM they come from
+    def route_key(self, msg):
+        return msg.get_id()
 
     # Port register methods
     def register_vm_port(self, vm_id, vm_port, eth_addr):
@@ -97,6 +190,58 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
                           "dp_port=%s)" % (format_id(vm_id), vm_port, 
                                            format(entry.dp_id), entry.dp_port))
 
+    # Configuration reload methods
+    def reload_config(self, table, entries):
+        (added, removed) = table.apply(entries)
+        # Changes to the ISL configuration apply to the ports registered from
+        # now on
+        if table is not self.config:
+            return
+        for config_entry in removed:
+            self.unconfigure_port(config_entry)
+        for config_entry in added:
+            self.configure_port(config_entry)
+
+    def unconfigure_port(self, config_entry):
+        entry = self.rftable.get_entry_by_vm_port(config_entry.vm_id,
+                                                  config_entry.vm_port)
+        if entry is None or entry.dp_id is None or \
+           (entry.ct_id, entry.dp_id, entry.dp_port) != \
+           (config_entry.ct_id, config_entry.dp_id, config_entry.dp_port):
+            return
+        # Split the association into idle ports, and reset the VM port so it
+        # can be reused
+        self.rftable.set_entry(RFEntry(ct_id=entry.ct_id, dp_id=entry.dp_id,
+                                       dp_port=entry.dp_port))
+        entry.make_idle(RFENTRY_IDLE_VM_PORT)
+        self.rftable.set_entry(entry)
+        self.reset_vm_port(entry.vm_id, entry.vm_port)
+        self.log.info("Dissociating client port from datapath port "
+                      "(vm_id=%s, vm_port=%i, dp_id=%s, dp_port=%i)" %
+                      (format_id(config_entry.vm_id), config_entry.vm_port,
+                       format_id(config_entry.dp_id), config_entry.dp_port))
+
+    def configure_port(self, config_entry):
+        vm_entry = self.rftable.get_entry_by_vm_port(config_entry.vm_id,
+                                                     config_entry.vm_port)
+        dp_entry = self.rftable.get_entry_by_dp_port(config_entry.ct_id,
+                                                     config_entry.dp_id,
+                                                     config_entry.dp_port)
+        # Associate the ports if both were registered and waiting
+        if vm_entry is None or dp_entry is None or \
+           vm_entry.get_status() != RFENTRY_IDLE_VM_PORT or \
+           dp_entry.get_status() != RFENTRY_IDLE_DP_PORT:
+            return
+        self.rftable.remove_entry(vm_entry)
+        dp_entry.associate(vm_entry.vm_id, vm_entry.vm_port,
+                           eth_addr=vm_entry.eth_addr)
+        self.rftable.set_entry(dp_entry)
+        self.config_vm_port(vm_entry.vm_id, vm_entry.vm_port)
+        self.log.info("Associating client port to datapath port "
+                      "(vm_id=%s, vm_port=%i, dp_id=%s, dp_port=%i)" %
+                      (format_id(config_entry.vm_id), config_entry.vm_port,
+                       format_id(config_entry.dp_id), config_entry.dp_port))
+
     def config_vm_port(self, vm_id, vm_port):
         self.ipc.send(RFCLIENT_RFSERVER_CHANNEL, str(vm_id),
                       PortConfig(vm_id=vm_id, vm_port=vm_port, operation_id=0))
@@ -106,9 +251,50 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
     # Handle RouteMod messages (type ROUTE_MOD)
     #
     # Takes a RouteMod, replaces its VM id,port with the associated DP id,port
-    # and sends to the corresponding controller
+    # and sends the resulting routes to the corresponding controllers
     def register_route_mod(self, rm):
+        self.send_route_mods(rm.get_mod(), self.translate_route_mod(rm),
+                             getattr(rm, "origin", None))
+
+    # Handle RouteModBatch messages (type ROUTE_MOD_BATCH)
+    #
+    # Translates every route in the batch, and sends them like the routes of
+    # a single RouteMod
+    def register_route_mod_batch(self, batch):
+        translated = []
+        for route in batch.get_routes():
+            route = Route.from_dict(route)
+            rm = RouteMod(mod=batch.get_mod(), id=batch.get_id(),
+                          matches=route.get_matches(),
+                          actions=route.get_actions(),
+                          options=batch.get_options() + route.get_options())
+            translated.extend(self.translate_route_mod(rm))
+        self.send_route_mods(batch.get_mod(), translated,
+                             getattr(batch, "origin", None))
+
+    # Sends translated RouteMods (see translate_route_mod) as one
+    # RouteModBatch per destination datapath, in the order of their first
+    # route
+    def send_route_mods(self, mod, translated, origin):
+        batches = {}
+        order = []
+        for (ct_id, out) in translated:
+            key = (ct_id, out.get_id())
+            if key not in batches:
+                batches[key] = RouteModBatch(mod=mod, id=out.get_id())
+                batches[key].origin = origin
+                order.append(key)
+            batches[key].add_route(Route(out.get_matches(),
+                                         out.get_actions(),
+                                         out.get_options()))
+        for key in order:
+            self.rfproxy_buffer.send(str(key[0]), batches[key])
+
+    # Returns a list of (ct_id, RouteMod) with the RouteMods to send to each
+    # controller for the given client RouteMod
+    def translate_route_mod(self, rm):
         vm_id = rm.get_id()
+        result = []
 
         # Find the output action
         for i, action in enumerate(rm.actions):
@@ -126,56 +312,99 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
                     self.log.info("Received RouteMod destined for unknown "
                                   "datapath - Dropping (vm_id=%s, vm_port=%s)" 
                                   % (format_id(vm_id), vm_port))
-                    return
+                    return result
 
                 # Replace the VM id,port with the Datapath id.port
                 action_output.set_value(entry.dp_port)
-                rm.set_id(int(entry.dp_id))
-                rm.actions[i] = action_output.to_dict()
-                entries = self.rftable.get_entries(dp_id=entry.dp_id,
-                                                   ct_id=entry.ct_id)
-                entries.extend(self.isltable.get_entries(dp_id=entry.dp_id,
-                                                         ct_id=entry.ct_id))
-                ct_option = Option.CT_ID(entry.ct_id)
-                rm.add_option(ct_option)
-
-                self._send_rm_with_matches(rm, entry.dp_port, entries)
-                
-                remote_dps = self.isltable.get_entries(rem_ct=entry.ct_id, 
-                                                       rem_id=entry.dp_id)
-                for r in remote_dps:
-                    if r.get_status() == RFISL_ACTIVE:
-                        rm.set_options(rm.get_options()[:-1])
-                        rm.add_option(Option.CT_ID(r.ct_id))
-                        rm.set_id(int(r.dp_id))
-                        rm.set_actions(None)
-                        rm.add_action(Action.SET_ETH_SRC(r.eth_addr))
-                        rm.add_action(Action.SET_ETH_DST(r.rem_eth_addr))
-                        rm.add_action(Action.OUTPUT(r.dp_port))
-                        entries = self.rftable.get_entries(dp_id=r.dp_id,
-                                                           ct_id=r.ct_id)
-                        self._send_rm_with_matches(rm, r.dp_port, entries)
-
-                return
+                actions = list(rm.get_actions())
+                actions[i] = action_output.to_dict()
+                options = rm.get_options() + \
+                          [Option.CT_ID(entry.ct_id).to_dict()]
+
+                plan = self.get_fanout_plan(entry.ct_id, entry.dp_id)
+                self._add_rm_with_matches(result, rm, entry.ct_id,
+                                          entry.dp_id, entry.dp_port,
+                                          actions, options,
+                                          plan.ports + plan.isl_ports)
+
+                # Forward the route to datapaths linked to this one
+                for (ct_id, dp_id, dp_port, actions) in plan.remotes:
+                    options = rm.get_options() + \
+                              [Option.CT_ID(ct_id).to_dict()]
+                    remote_plan = self.get_fanout_plan(ct_id, dp_id)
+                    self._add_rm_with_matches(result, rm, ct_id, dp_id,
+                                              dp_port, actions, options,
+                                              remote_plan.ports)
+
+                return result
 
         # If no output action is found, don't forward the routemod.
         self.log.info("Received RouteMod with no Output Port - Dropping "
-                          "(vm_id=%s, vm_port=%s)" % (format_id(vm_id), 
-                                                      vm_port))
+                      "(vm_id=%s)" % format_id(vm_id))
+        return result
         
-    def _send_rm_with_matches(self, rm, out_port, entries):
-        #send entries matching external ports
-        for entry in entries:
-            if out_port != entry.dp_port:
-                if entry.get_status() == RFENTRY_ACTIVE or \
-                   entry.get_status() == RFISL_ACTIVE: 
-                    match_eth = Match.ETHERNET(entry.eth_addr)
-                    rm.add_match(match_eth)
-                    match_in_port = Match.IN_PORT(entry.dp_port)
-                    rm.add_match(match_in_port)
-                    self.ipc.send(RFSERVER_RFPROXY_CHANNEL, 
-                                  str(entry.ct_id), rm)
-                    rm.set_matches(rm.get_matches()[:-2])
+    def _add_rm_with_matches(self, result, rm, ct_id, dp_id, out_port,
+                             actions, options, ports):
+        # Add entries matching external ports
+        for (dp_port, port_matches) in ports:
+            if out_port != dp_port:
+                result.append((ct_id, RouteMod(
+                    mod=rm.get_mod(), id=dp_id,
+                    matches=rm.get_matches() + port_matches,
+                    actions=actions, options=options)))
+
+    # Handle RouteModResult messages (type ROUTE_MOD_RESULT)
+    #
+    # rfproxy reports the outcome of the flow_mods of a RouteMod once the
+    # datapath acknowledged all of them
+    def route_mod_result(self, result):
+        received = getattr(result, "received", None) or time.time()
+        origin = getattr(result, "origin", None) or received
+        self.ipc.metrics.observe(ROUTE_COMPLETION_LATENCY,
+                                 RFSERVER_RFPROXY_CHANNEL, ROUTE_MOD_RESULT,
+                                 received - origin)
+        for route in result.get_failed():
+            self.log.warning("Route failed to install on datapath "
+                             "(ct_id=%s, dp_id=%s, error_type=%i, "
+                             "error_code=%i, matches=%s)" %
+                             (result.get_ct_id(), format_id(result.get_id()),
+                              result.get_error_type(),
+                              result.get_error_code(), route['matches']))
+
+    # Fan-out plans
+    #
+    # The ports a RouteMod is replicated to only change on port events, so
+    # they are computed once per datapath and cached until the next one.
+    def get_fanout_plan(self, ct_id, dp_id):
+        key = (ct_id, dp_id)
+        plan = self.fanout_plans.get(key)
+        if plan is None:
+            generation = self.fanout_generation
+            plan = self._build_fanout_plan(ct_id, dp_id)
+            # Don't cache a plan built while the tables were changing
+            if generation == self.fanout_generation:
+                self.fanout_plans[key] = plan
+        return plan
+
+    def invalidate_fanout_plans(self):
+        self.fanout_generation += 1
+        self.fanout_plans = {}
+
+    def _build_fanout_plan(self, ct_id, dp_id):
+        plan = FanOutPlan()
+        for entry in self.rftable.get_dp_entries(ct_id, dp_id):
+            if entry.get_status() == RFENTRY_ACTIVE:
+                plan.ports.append((entry.dp_port, port_matches(entry)))
+        for entry in self.isltable.get_dp_entries(ct_id, dp_id):
+            if entry.get_status() == RFISL_ACTIVE:
+                plan.isl_ports.append((entry.dp_port, port_matches(entry)))
+        for r in self.isltable.get_entries(rem_ct=ct_id, rem_id=dp_id):
+            if r.get_status() == RFISL_ACTIVE:
+                actions = [Action.SET_ETH_SRC(r.eth_addr).to_dict(),
+                           Action.SET_ETH_DST(r.rem_eth_addr).to_dict(),
+                           Action.OUTPUT(r.dp_port).to_dict()]
+                plan.remotes.append((r.ct_id, r.dp_id, r.dp_port, actions))
+        return plan
 
     # DatapathPortRegister methods
     def register_dp_port(self, ct_id, dp_id, dp_port):
@@ -275,10 +504,10 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
                                                 entry.dp_port))
 
     def send_datapath_config_message(self, ct_id, dp_id, operation_id):
-        self.ipc.send(RFSERVER_RFPROXY_CHANNEL, str(ct_id),
-                      DatapathConfig(ct_id=ct_id,
-                                     dp_id=dp_id,
-                                     operation_id=operation_id))
+        self.rfproxy_buffer.send(str(ct_id),
+                                 DatapathConfig(ct_id=ct_id,
+                                                dp_id=dp_id,
+                                                operation_id=operation_id))
 
     def config_dp(self, ct_id, dp_id):
         if is_rfvs(dp_id) and not self.configured_rfvs:
@@ -289,10 +518,11 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
             self.log.info("Configuring RFVS (dp_id=%s)" % format_id(dp_id))
         elif self.rftable.is_dp_registered(ct_id, dp_id) or \
              self.isltable.is_dp_registered(ct_id, dp_id):
-            # Configure a normal switch. Clear the tables and install default
-            # flows.
-            self.send_datapath_config_message(ct_id, dp_id, 
-                                              DC_CLEAR_FLOW_TABLE);
+            # Configure a normal switch. Clear the tables (unless rfproxy
+            # reconciles them) and install default flows.
+            if not RECONCILE_FLOW_TABLES:
+                self.send_datapath_config_message(ct_id, dp_id,
+                                                  DC_CLEAR_FLOW_TABLE);
             # TODO: enforce order: clear should always be executed first
             self.send_datapath_config_message(ct_id, dp_id, DC_DROP_ALL);
             self.send_datapath_config_message(ct_id, dp_id, DC_OSPF);
@@ -347,7 +577,7 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
             msg = DataPlaneMap(ct_id=entry.ct_id,
                                dp_id=entry.dp_id, dp_port=entry.dp_port,
                                vs_id=vs_id, vs_port=vs_port)
-            self.ipc.send(RFSERVER_RFPROXY_CHANNEL, str(entry.ct_id), msg)
+            self.rfproxy_buffer.send(str(entry.ct_id), msg)
             self.log.info("Mapping client-datapath association "
                           "(vm_id=%s, vm_port=%i, dp_id=%s, "
                           "dp_port=%i, vs_id=%s, vs_port=%i)" %
@@ -356,15 +586,16 @@ class RFServer(RFProtocolFactory, IPC.IPCMessageProcessor):
                            format_id(entry.vs_id), entry.vs_port))
 
 
-if len(sys.argv) == 3:
-    configfile = sys.argv[1]
-    islconffile = sys.argv[2]
-    try:
-        RFServer(configfile, islconffile)
-    except IOError:
-        sys.exit("Error opening file: {}".format(configfile))
-else:
-    sys.exit("Invalid parameters.\n"\
-             "Usage:\n"\
-             "  ./server.py [configfile]\n"\
-             "    configfile: path to CSV configuration file")
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        configfile = sys.argv[1]
+        islconffile = sys.argv[2]
+        try:
+            RFServer(configfile, islconffile)
+        except IOError:
+            sys.exit("Error opening file: {}".format(configfile))
+    else:
+        sys.exit("Invalid parameters.\n"\
+                 "Usage:\n"\
+                 "  ./server.py [configfile]\n"\
+                 "    configfile: path to CSV configuration file")
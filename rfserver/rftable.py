@@ -1,8 +1,16 @@
+import copy
+import csv
+import logging
+import os
+import re
+import threading
+import time
+
 import pymongo as mongo
 import bson
 
 from rflib.defs import *
-from rflib.ipc.MongoIPC import format_address
+from rflib.ipc.MongoIPC import format_address, create_capped_collection
 
 RFENTRY_IDLE_VM_PORT = 1
 RFENTRY_IDLE_DP_PORT = 2
@@ -29,33 +37,247 @@ class MongoTableEntryFactory:
         elif type_ == RFISLCONFENTRY:
             return RFISLConfEntry()
 
+# Applies changes to a collection in a background thread. Pending changes to
+# the same document are coalesced, so only the latest version is written.
+# If an events collection is given, the changes written are recorded there too
+# (see RFEVENTS_NAME). Changes that fail to be written are queued again and
+# retried, waiting twice as long after each failure.
+WRITE_RETRY_MIN = 0.1 # Seconds
+WRITE_RETRY_MAX = 30
+
+class MongoWriteBehind:
+    def __init__(self, collection, events=None):
+        self.collection = collection
+        self.events = events
+        self.log = logging.getLogger("rfserver")
+        self._pending = {}
+        self._clear = False
+        self._cond = threading.Condition()
+        self._idle = True
+        worker = threading.Thread(target=self._worker)
+        worker.daemon = True
+        worker.start()
+
+    def save(self, data):
+        with self._cond:
+            self._pending[data["_id"]] = data
+            self._cond.notify()
+
+    def remove(self, id_):
+        with self._cond:
+            self._pending[id_] = None
+            self._cond.notify()
+
+    # Queues many changes at once, so that they are written together
+    def save_many(self, saves, removes):
+        with self._cond:
+            for data in saves:
+                self._pending[data["_id"]] = data
+            for id_ in removes:
+                self._pending[id_] = None
+            self._cond.notify()
+
+    def clear(self):
+        with self._cond:
+            self._pending = {}
+            self._clear = True
+            self._cond.notify()
+
+    def flush(self):
+        # Wait until every pending change has been written
+        with self._cond:
+            while self._pending or self._clear or not self._idle:
+                self._cond.wait()
+
+    def _worker(self):
+        delay = WRITE_RETRY_MIN
+        while True:
+            with self._cond:
+                while not self._pending and not self._clear:
+                    self._idle = True
+                    self._cond.notify_all()
+                    self._cond.wait()
+                self._idle = False
+                pending, self._pending = self._pending, {}
+                clear, self._clear = self._clear, False
+            try:
+                self._write(clear, pending)
+                delay = WRITE_RETRY_MIN
+            except mongo.errors.PyMongoError, e:
+                self.log.warning("Failed to write %d change(s) to %s, "
+                                 "retrying in %.1fs: %s" %
+                                 (len(pending), self.collection.name, delay,
+                                  e))
+                self._requeue(clear, pending)
+                time.sleep(delay)
+                delay = min(delay * 2, WRITE_RETRY_MAX)
+
+    def _write(self, clear, pending):
+        if clear:
+            self.collection.remove()
+        # All the pending changes go in a single bulk operation
+        if pending:
+            bulk = self.collection.initialize_unordered_bulk_op()
+            for (id_, data) in pending.items():
+                if data is None:
+                    bulk.find({"_id": id_}).remove_one()
+                else:
+                    bulk.find({"_id": id_}).upsert().replace_one(data)
+            bulk.execute()
+        if self.events is not None:
+            self._record(clear, pending)
+
+    # Puts back the changes of a failed write under the ones queued since
+    def _requeue(self, clear, pending):
+        with self._cond:
+            # A clear queued since supersedes the failed changes
+            if self._clear:
+                return
+            pending.update(self._pending)
+            self._pending = pending
+            self._clear = clear
+
+    def _record(self, clear, pending):
+        source = self.collection.name
+        events = []
+        if clear:
+            events.append({"source": source, "op": "clear"})
+        for (id_, data) in pending.items():
+            if data is None:
+                events.append({"source": source, "op": "remove", "id": id_})
+            else:
+                events.append({"source": source, "op": "save", "id": id_,
+                               "doc": data})
+        if events:
+            self.events.insert(events)
+
+# A table kept in memory and persisted to Mongo in the background, so that
+# other applications (e.g. rfweb) can see it. Lookups never hit the database.
 class MongoTable:
+    # Tuples of fields to keep hash indexes on. Queries use the largest index
+    # whose fields are all constrained, and fall back to a scan otherwise.
+    indexes = ()
+    # Whether changes are recorded in the events collection for rfweb
+    record_events = False
+
     def __init__(self, address, name, entry_type):
         self.address = format_address(address)
         self.connection = mongo.Connection(*self.address)
         self.data = self.connection[MONGO_DB_NAME][name]
         self.entry_type = entry_type
-
-    def get_entries(self, **kwargs):
-        for (k, v) in kwargs.items():
-            kwargs[k] = str(v)
-        results = self.data.find(kwargs)
-        entries = []
-        for result in results:
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._index = dict((fields, {}) for fields in self.indexes)
+        events = None
+        if self.record_events:
+            events = create_capped_collection(self.connection[MONGO_DB_NAME],
+                                              RFEVENTS_NAME, RFEVENTS_SIZE)
+        self._writer = MongoWriteBehind(self.data, events)
+        for fields in self.indexes:
+            self.data.ensure_index([(f, mongo.ASCENDING) for f in fields])
+        self._load()
+
+    def _load(self):
+        for result in self.data.find():
+            raw = dict(result)
             entry = MongoTableEntryFactory.make(self.entry_type)
             entry.from_dict(result)
-            entries.append(entry)
-        return entries
+            self._add(entry)
+            # Migrate documents stored by older versions, which kept every
+            # value as a string
+            data = entry.to_dict()
+            if data != raw:
+                self._writer.save(data)
+
+    def _add(self, entry):
+        self._entries[entry.id] = entry
+        for (fields, index) in self._index.items():
+            key = index_key(entry, fields)
+            if key is not None:
+                index.setdefault(key, []).append(entry)
+
+    def _discard(self, id_):
+        entry = self._entries.pop(id_, None)
+        if entry is None:
+            return
+        for (fields, index) in self._index.items():
+            key = index_key(entry, fields)
+            if key is not None:
+                bucket = index[key]
+                bucket.remove(entry)
+                if not bucket:
+                    del index[key]
+
+    def _find(self, query):
+        query = dict((k, coerce_field(k, v)) for (k, v) in query.items())
+        best = None
+        for fields in self._index:
+            if set(fields).issubset(query) and \
+               (best is None or len(fields) > len(best)):
+                best = fields
+        if best is None:
+            candidates = self._entries.values()
+        else:
+            key = tuple(query[f] for f in best)
+            candidates = self._index[best].get(key, [])
+        return [entry for entry in candidates
+                if all(getattr(entry, k) == v for (k, v) in query.items())]
+
+    def get_entries(self, **kwargs):
+        with self._lock:
+            # Return copies: callers modify entries before calling set_entry
+            return [copy.copy(entry) for entry in self._find(kwargs)]
 
     def set_entry(self, entry):
         # TODO: enforce (*_id, *_port) uniqueness restriction
-        entry.id = self.data.save(entry.to_dict())
+        with self._lock:
+            if entry.id is None:
+                entry.id = bson.ObjectId()
+            normalize_entry(entry)
+            self._discard(entry.id)
+            self._add(copy.copy(entry))
+            self._writer.save(entry.to_dict())
 
     def remove_entry(self, entry):
-        self.data.remove(entry.id)
+        with self._lock:
+            self._discard(entry.id)
+            self._writer.remove(entry.id)
 
     def clear(self):
-        self.data.remove()
+        with self._lock:
+            self._entries = {}
+            self._index = dict((fields, {}) for fields in self.indexes)
+            self._writer.clear()
+
+    # Makes the table hold the given entries. Existing entries with the same
+    # values are kept as they are, so only the difference is written. Returns
+    # the lists of entries added and removed.
+    def sync_entries(self, entries):
+        with self._lock:
+            existing = {}
+            for entry in self._entries.values():
+                existing.setdefault(entry_values(entry), []).append(entry)
+            added = []
+            for entry in entries:
+                same = existing.get(entry_values(entry))
+                if same:
+                    same.pop()
+                    continue
+                entry.id = bson.ObjectId()
+                normalize_entry(entry)
+                self._add(copy.copy(entry))
+                added.append(entry)
+            removed = []
+            for same in existing.values():
+                for entry in same:
+                    self._discard(entry.id)
+                    removed.append(entry)
+            self._writer.save_many([entry.to_dict() for entry in added],
+                                   [entry.id for entry in removed])
+            return (added, removed)
+
+    def flush(self):
+        self._writer.flush()
 
     def __str__(self):
         s = ""
@@ -63,8 +285,26 @@ class MongoTable:
             s += str(entry) + "\n\n"
         return s.strip("\n")
 
+def entry_values(entry):
+    data = entry.to_dict()
+    data.pop("_id", None)
+    return tuple(sorted(data.items()))
+
+def index_key(entry, fields):
+    key = tuple(getattr(entry, f) for f in fields)
+    # Unset fields never match a query, don't index them
+    if None in key:
+        return None
+    return key
+
 
 class RFTable(MongoTable):
+    indexes = (("vm_id", "vm_port"),
+               ("ct_id", "dp_id"),
+               ("ct_id", "dp_id", "dp_port"),
+               ("vs_id", "vs_port"))
+    record_events = True
+
     def __init__(self, address=MONGO_ADDRESS):
         MongoTable.__init__(self, address, RFTABLE_NAME, RFENTRY)
 
@@ -97,17 +337,120 @@ class RFTable(MongoTable):
         return bool(self.get_dp_entries(ct_id, dp_id))
 
 
-class RFConfig(MongoTable):
+# Parsers for the columns of the configuration files. They raise ValueError
+# for invalid values.
+ETH_ADDR_RE = re.compile(r"^[0-9a-fA-F]{2}(:[0-9a-fA-F]{2}){5}$")
+
+def parse_id(value):
+    value = int(value, 16)
+    if not 0 <= value < 2 ** 64:
+        raise ValueError("id out of range: %x" % value)
+    return value
+
+def parse_port(value):
+    value = int(value)
+    if not 0 <= value <= 0xffff:
+        raise ValueError("port out of range: %d" % value)
+    return value
+
+def parse_ct_id(value):
+    value = int(value)
+    if value < 0:
+        raise ValueError("controller id out of range: %d" % value)
+    return value
+
+def parse_eth_addr(value):
+    if not ETH_ADDR_RE.match(value):
+        raise ValueError("invalid Ethernet address: %s" % value)
+    return value
+
+# A table loaded from a CSV file (with a header line) and kept in sync with
+# it. The file is read one row at a time; invalid rows, and rows repeating the
+# fields of an index of an earlier row, are skipped and reported.
+class ConfigTable(MongoTable):
+    # (attribute, parser) of each column, in file order
+    columns = ()
+
+    def __init__(self, ifile, address, name, entry_type):
+        MongoTable.__init__(self, address, name, entry_type)
+        self.ifile = ifile
+        self.log = logging.getLogger("rfserver")
+        # (modification time, size) of the version of the file last read
+        self._signature = None
+        self.apply(self.read())
+
+    def _file_signature(self):
+        stat = os.stat(self.ifile)
+        return (stat.st_mtime, stat.st_size)
+
+    # Whether the file changed since it was last read
+    def changed(self):
+        try:
+            return self._file_signature() != self._signature
+        except OSError:
+            return False
+
+    # Returns the entries in the file, without touching the table
+    def read(self):
+        configfile = open(self.ifile)
+        try:
+            signature = self._file_signature()
+            entries = []
+            seen = dict((fields, set()) for fields in self.indexes)
+            reader = csv.reader(configfile)
+            for row in reader:
+                if reader.line_num == 1 or not row:
+                    continue
+                try:
+                    entry = self.parse_row(row)
+                except ValueError as e:
+                    self.log.warning("Skipping invalid row %d of %s: %s" %
+                                     (reader.line_num, self.ifile, e))
+                    continue
+                keys = [(fields, index_key(entry, fields))
+                        for fields in self.indexes]
+                if any(key in seen[fields] for (fields, key) in keys):
+                    self.log.warning("Skipping duplicate row %d of %s" %
+                                     (reader.line_num, self.ifile))
+                    continue
+                for (fields, key) in keys:
+                    seen[fields].add(key)
+                entries.append(entry)
+            self._signature = signature
+            return entries
+        finally:
+            configfile.close()
+
+    def parse_row(self, row):
+        if len(row) != len(self.columns):
+            raise ValueError("expected %d columns, found %d" %
+                             (len(self.columns), len(row)))
+        entry = MongoTableEntryFactory.make(self.entry_type)
+        for ((attr, parse), value) in zip(self.columns, row):
+            setattr(entry, attr, parse(value.strip()))
+        return entry
+
+    # Brings the table to the entries read. Returns the entries added and
+    # removed.
+    def apply(self, entries):
+        (added, removed) = self.sync_entries(entries)
+        self.log.info("Loaded %s: %d entries, %d added, %d removed" %
+                      (self.ifile, len(entries), len(added), len(removed)))
+        return (added, removed)
+
+
+class RFConfig(ConfigTable):
+    indexes = (("vm_id", "vm_port"),
+               ("ct_id", "dp_id", "dp_port"))
+    columns = (("vm_id", parse_id),
+               ("vm_port", parse_port),
+               ("ct_id", parse_ct_id),
+               ("dp_id", parse_id),
+               ("dp_port", parse_port))
+
     def __init__(self, ifile, address=MONGO_ADDRESS):
-        MongoTable.__init__(self, address, RFCONFIG_NAME, RFCONFIGENTRY)
-        # TODO: perform validation of config
-        configfile = file(ifile)
-        lines = configfile.readlines()[1:]
-        entries = [line.strip("\n").split(",") for line in lines]
-        for (a, b, c, d, e) in entries:
-            self.set_entry(RFConfigEntry(vm_id=int(a, 16), vm_port=int(b),
-                                         ct_id=int(c), dp_id=int(d, 16),
-                                         dp_port=int(e)))
+        ConfigTable.__init__(self, ifile, address, RFCONFIG_NAME,
+                             RFCONFIGENTRY)
 
     def get_config_for_vm_port(self, vm_id, vm_port):
         result = self.get_entries(vm_id=vm_id,
@@ -125,6 +468,11 @@ class RFConfig(MongoTable):
         return result[0]
 
 class RFISLTable(MongoTable):
+    indexes = (("ct_id", "dp_id"),
+               ("ct_id", "dp_id", "dp_port", "eth_addr"),
+               ("rem_ct", "rem_id"),
+               ("rem_ct", "rem_id", "rem_port", "rem_eth_addr"))
+
     def __init__(self, address=MONGO_ADDRESS):
         MongoTable.__init__(self, address, RFISL_NAME, RFISLENTRY)
 
@@ -148,32 +496,58 @@ class RFISLTable(MongoTable):
     def is_dp_registered(self, ct_id, dp_id):
         return bool(self.get_dp_entries(ct_id, dp_id))
 
-class RFISLConf(MongoTable):
+class RFISLConf(ConfigTable):
+    indexes = (("ct_id", "dp_id", "dp_port"),
+               ("rem_ct", "rem_id", "rem_port"))
+    columns = (("vm_id", parse_id),
+               ("ct_id", parse_ct_id),
+               ("dp_id", parse_id),
+               ("dp_port", parse_port),
+               ("eth_addr", parse_eth_addr),
+               ("rem_ct", parse_ct_id),
+               ("rem_id", parse_id),
+               ("rem_port", parse_port),
+               ("rem_eth_addr", parse_eth_addr))
+
     def __init__(self, ifile, address=MONGO_ADDRESS):
-        MongoTable.__init__(self, address, RFISLCONF_NAME, RFISLCONFENTRY)
-        # TODO: perform validation of config
-        internalfile = file(ifile)
-        lines = internalfile.readlines()[1:]
-        entries = [line.strip("\n").split(",") for line in lines]
-        for (a, b, c, d, e, f, g, h, i) in entries:
-            self.set_entry(RFISLConfEntry(vm_id=int(a, 16), ct_id=int(b), 
-                                          dp_id=int(c, 16), dp_port=int(d), 
-                                          eth_addr=e, rem_ct=int(f), 
-                                          rem_id=int(g, 16), rem_port=int(h),
-                                          rem_eth_addr=i))
+        ConfigTable.__init__(self, ifile, address, RFISLCONF_NAME,
+                             RFISLCONFENTRY)
 
     def get_entries_by_port(self, ct, id_, port):
         results = self.get_entries(ct_id=ct, dp_id=id_, dp_port=port)
         results.extend(self.get_entries(rem_ct=ct, rem_id=id_, rem_port=port))
         return results
 
+# Ids are integers in memory and formatted with format_table_id in Mongo, so
+# that every document has the same type and a query of one type finds them all
+ID_FIELDS = frozenset(("vm_id", "dp_id", "vs_id", "rem_id"))
+
+# Brings a field value (from a query, a document or a caller) to the type it
+# has in memory: ints for ids, ports and controller ids, strings for Ethernet
+# addresses.
+def coerce_field(attr, value):
+    if value is None or value == "":
+        return None
+    if attr in ID_FIELDS:
+        return parse_table_id(value)
+    if attr.endswith("eth_addr"):
+        return value
+    return int(value)
+
+def normalize_entry(entry):
+    for (attr, value) in vars(entry).items():
+        if attr != "id":
+            setattr(entry, attr, coerce_field(attr, value))
+
 # Convenience functions for packing/unpacking to a dict for BSON representation
 def load_from_dict(src, obj, attr):
     setattr(obj, attr, src[attr])
 
 def pack_into_dict(dest, obj, attr):
     value = getattr(obj, attr)
-    dest[attr] = "" if value is None else str(value)
+    if attr in ID_FIELDS and value is not None:
+        value = format_table_id(value)
+    dest[attr] = value
 
 
 class RFEntry:
@@ -264,10 +638,8 @@ class RFEntry:
 
     def from_dict(self, data):
         for k, v in data.items():
-            if str(v) is "":
-                data[k] = None
-            elif k != "_id" and k != "eth_addr": # All our data is int
-                data[k] = int(v)
+            if k != "_id":
+                data[k] = coerce_field(k, v)
         self.id = data["_id"]
         load_from_dict(data, self, "vm_id")
         load_from_dict(data, self, "vm_port")
@@ -366,10 +738,8 @@ class RFISLEntry:
                                 
     def from_dict(self, data):
         for k, v in data.items():
-            if str(v) is "":
-                data[k] = None
-            elif k != "_id" and not k.endswith("eth_addr"): 
-                data[k] = int(v)
+            if k != "_id":
+                data[k] = coerce_field(k, v)
         self.id = data["_id"]
         load_from_dict(data, self, "vm_id")
         load_from_dict(data, self, "ct_id")
@@ -425,10 +795,8 @@ class RFISLConfEntry:
                                 
     def from_dict(self, data):
         for k, v in data.items():
-            if str(v) is "":
-                data[k] = None
-            elif k != "_id" and not k.endswith("eth_addr"): 
-                data[k] = int(v)
+            if k != "_id":
+                data[k] = coerce_field(k, v)
         self.id = data["_id"]
         load_from_dict(data, self, "vm_id")
         load_from_dict(data, self, "ct_id")
@@ -475,10 +843,8 @@ class RFConfigEntry:
                                 
     def from_dict(self, data):
         for k, v in data.items():
-            if str(v) is "":
-                data[k] = None
-            elif k != "_id": # All our data is int
-                data[k] = int(v)
+            if k != "_id":
+                data[k] = coerce_field(k, v)
         self.id = data["_id"]
         load_from_dict(data, self, "vm_id")
         load_from_dict(data, self, "vm_port")
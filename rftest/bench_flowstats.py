@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Micro-benchmark for the encoding of flow stats in rfstats.
+#
+# Encodes the matches and actions of a table of RouteFlow flows with the
+# field-level serializers of pox.openflow.of_json and with the previous
+# show()-string parsing, and prints the cost per flow.
+#
+# Usage: PYTHONPATH=../pox python bench_flowstats.py [flows]
+
+import sys
+import timeit
+
+from pox.openflow.libopenflow_01 import *
+from pox.openflow.of_json import match_to_dict, action_to_dict
+
+# Previous encoding, kept here as the baseline
+def legacy_match_dict(match):
+    match = match.show().strip("\n").split("\n")
+    return dict([attr.split(": ") for attr in match])
+
+def legacy_actions_list(actions):
+    actionlist = []
+    for action in actions:
+        string = action.__class__.__name__ + "["
+        string += action.show().strip("\n").replace("\n", ", ") + "]"
+        actionlist.append(string)
+    return actionlist
+
+# Flows like the ones RFServer installs for a route: match on the
+# destination prefix, rewrite the Ethernet addresses and output
+def make_flows(n):
+    flows = []
+    for i in range(n):
+        flow = ofp_flow_stats()
+        flow.match = ofp_match(dl_type=0x800,
+                               dl_dst=EthAddr("12:a0:a0:a0:a0:a0"),
+                               nw_dst="10.%d.%d.0/24" % (i / 256 % 256,
+                                                         i % 256))
+        flow.actions = [
+            ofp_action_dl_addr.set_src(EthAddr("12:a0:a0:a0:a0:a0")),
+            ofp_action_dl_addr.set_dst(EthAddr("12:b1:b1:b1:b1:b1")),
+            ofp_action_output(port=i % 48 + 1)]
+        flows.append(flow)
+    return flows
+
+def encode(flows):
+    return [(match_to_dict(flow.match),
+             [action_to_dict(action) for action in flow.actions])
+            for flow in flows]
+
+def legacy_encode(flows):
+    return [(legacy_match_dict(flow.match),
+             legacy_actions_list(flow.actions))
+            for flow in flows]
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    flows = make_flows(n)
+
+    # Both describe the same fields
+    for ((match, actions), (legacy_match, legacy_actions)) in \
+            zip(encode(flows[:10]), legacy_encode(flows[:10])):
+        assert set(match) == set(legacy_match) - set(["wildcards"])
+        assert len(actions) == len(legacy_actions)
+
+    setup = "from __main__ import encode, legacy_encode, make_flows; " \
+            "flows = make_flows(%d)" % n
+    for (name, stmt) in (("show() (legacy)", "legacy_encode(flows)"),
+                         ("of_json", "encode(flows)")):
+        t = min(timeit.repeat(stmt, setup, repeat=3, number=1))
+        print "%-16s %8.2f us/flow" % (name, t / n * 1e6)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Micro-benchmark for the receive path of POX's OpenFlow connections.
+#
+# A thread writes a stream of small PACKET_INs from one switch into a socket
+# pair, and of_01.Connection.read handles them on the other end. Prints the
+# messages handled per second with the previous framing (string buffer
+# re-sliced after every message) and the current one, for a few read sizes.
+#
+# Usage: PYTHONPATH=../pox python bench_of_read.py [messages]
+
+import socket
+import sys
+import threading
+import time
+
+from pox.openflow.libopenflow_01 import *
+import pox.openflow.of_01 as of_01
+from pox.openflow.of_01 import Connection, classes, handlers
+
+class NullNexus(object):
+    def raiseEventNoErrors(self, *args, **kw):
+        pass
+
+# Previous Connection.read, kept here as the baseline
+class LegacyConnection(Connection):
+    def __init__(self, sock):
+        Connection.__init__(self, sock)
+        self.buf = ''
+
+    def read(self):
+        d = self.sock.recv(self.recv_size)
+        if len(d) == 0:
+            return False
+        self.buf += d
+        l = len(self.buf)
+        while l > 4:
+            ofp_type = ord(self.buf[1])
+            packet_length = ord(self.buf[2]) << 8 | ord(self.buf[3])
+            if packet_length > l: break
+            msg = classes[ofp_type]()
+            msg.unpack(self.buf)
+            self.buf = self.buf[packet_length:]
+            l = len(self.buf)
+            handlers[ofp_type](self, msg)
+        return True
+
+# PACKET_INs carrying a 64 byte frame, like the LLDP and routing protocol
+# packets rfproxy gets
+def make_stream(n):
+    msg = ofp_packet_in(xid=0, buffer_id=-1, in_port=1,
+                        reason=OFPR_ACTION, data="\x00" * 64)
+    return msg.pack() * n
+
+def write(sock, stream):
+    sock.sendall(stream)
+    sock.close()
+
+def run(cls, stream, n, recv_size):
+    (switch, controller) = socket.socketpair()
+    con = cls(controller)
+    con.recv_size = recv_size
+    con.ofnexus = NullNexus()
+    switch.recv(1024) # Our hello
+    writer = threading.Thread(target=write, args=(switch, stream))
+    start = time.time()
+    writer.start()
+    while con.read():
+        pass
+    elapsed = time.time() - start
+    writer.join()
+    controller.close()
+    return n / elapsed
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    stream = make_stream(n)
+    of_01.log.setLevel("ERROR")
+    for (name, cls, recv_size) in (("legacy", LegacyConnection, 2048),
+                                   ("legacy", LegacyConnection, 16384),
+                                   ("legacy", LegacyConnection, 65536),
+                                   ("current", Connection, 2048),
+                                   ("current", Connection, 16384),
+                                   ("current", Connection, 65536)):
+        rate = max(run(cls, stream, n, recv_size) for i in range(3))
+        print "%-8s read size %5d %10.0f msgs/s" % (name, recv_size, rate)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Benchmark for the send path of POX's OpenFlow connections with a slow
+# switch.
+#
+# Flow mods are sent round robin to a number of switches over socket pairs.
+# All of them read as fast as they can, except one that never reads. Prints
+# the rate at which the app gets to send flow mods, and the rate at which the
+# fast switches get them, with the previous sending (a global DeferredSender
+# thread, which every send goes through once any connection blocks) and the
+# current one (a queue per connection).
+#
+# Usage: PYTHONPATH=../pox python bench_of_send.py [flow mods] [switches]
+
+import select
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+from pox.lib.util import makePinger
+from pox.openflow.libopenflow_01 import *
+import pox.openflow.of_01 as of_01
+from pox.openflow.of_01 import Connection
+
+PIPE_BUF = 512
+
+# Previous DeferredSender, kept here as the baseline
+class DeferredSender(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self._dataForConnection = {}
+        self._lock = threading.RLock()
+        self._waker = makePinger()
+        self.daemon = True
+        self.sending = False
+        self.start()
+
+    def _sliceup(self, data):
+        out = []
+        while len(data) > PIPE_BUF:
+            out.append(data[0:PIPE_BUF])
+            data = data[PIPE_BUF:]
+        if len(data) > 0:
+            out.append(data)
+        return out
+
+    def send(self, con, data):
+        with self._lock:
+            self.sending = True
+            data = self._sliceup(data)
+            if con not in self._dataForConnection:
+                self._dataForConnection[con] = data
+            else:
+                self._dataForConnection[con].extend(data)
+            self._waker.ping()
+
+    def run(self):
+        while True:
+            with self._lock:
+                cons = self._dataForConnection.keys()
+            rlist, wlist, elist = select.select([self._waker], cons, cons, 1)
+            with self._lock:
+                if len(rlist) > 0:
+                    self._waker.pongAll()
+                for con in wlist:
+                    alldata = self._dataForConnection[con]
+                    while len(alldata):
+                        data = alldata[0]
+                        try:
+                            l = con.sock.send(data)
+                            if l != len(data):
+                                alldata[0] = data[l:]
+                                break
+                            del alldata[0]
+                        except socket.error:
+                            break
+                    if len(alldata) == 0:
+                        del self._dataForConnection[con]
+                        if len(self._dataForConnection) == 0:
+                            self.sending = False
+                            break
+
+deferredSender = DeferredSender()
+
+class LegacyConnection(Connection):
+    def send(self, data):
+        if type(data) is not bytes:
+            data = data.pack()
+        if deferredSender.sending:
+            deferredSender.send(self, data)
+            return
+        try:
+            l = self.sock.send(data)
+            if l != len(data):
+                deferredSender.send(self, data[l:])
+        except socket.error:
+            deferredSender.send(self, data)
+
+# Does the OpenFlow loop's part in the current sending: sends what the
+# connections queue, and waits for the sockets that can't take it all
+class Flusher(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.queued = deque()
+        self.pinger = makePinger()
+        self.poller = select.epoll()
+        self.poller.register(self.pinger.fileno(), select.EPOLLIN)
+        # fd -> Connection waited for
+        self.writing = {}
+        self.daemon = True
+        self.start()
+
+    def on_queued(self, con):
+        self.queued.append(con)
+        self.pinger.ping()
+
+    def run(self):
+        while True:
+            for (fd, events) in self.poller.poll():
+                if fd == self.pinger.fileno():
+                    self.pinger.pongAll()
+                    continue
+                con = self.writing[fd]
+                con.flush()
+                if not con.sending:
+                    del self.writing[fd]
+                    self.poller.unregister(fd)
+            while self.queued:
+                con = self.queued.popleft()
+                if con.fileno() in self.writing:
+                    continue
+                con.flush()
+                if con.sending:
+                    self.writing[con.fileno()] = con
+                    self.poller.register(con.fileno(), select.EPOLLOUT)
+
+flusher = Flusher()
+
+def drain(sock, expected):
+    got = 0
+    while got < expected:
+        got += len(sock.recv(65536))
+
+def run(cls, n, switches):
+    cons = []
+    readers = []
+    flow_mod = ofp_flow_mod(match=ofp_match(dl_type=0x800, nw_proto=6),
+                            actions=[ofp_action_output(port=1)]).pack()
+    for i in range(switches):
+        (switch, controller) = socket.socketpair()
+        controller.setblocking(0)
+        con = cls(controller)
+        if cls is Connection:
+            con.on_queued = flusher.on_queued
+        switch.recv(1024) # Our hello
+        cons.append((switch, con))
+    # The first switch never reads
+    fast = cons[1:]
+    per_switch = n / switches
+    expected = per_switch * len(flow_mod)
+    for (switch, con) in fast:
+        reader = threading.Thread(target=drain, args=(switch, expected))
+        reader.start()
+        readers.append(reader)
+    start = time.time()
+    for i in xrange(per_switch * switches):
+        cons[i % len(cons)][1].send(flow_mod)
+    sending = time.time() - start
+    for reader in readers:
+        reader.join()
+    elapsed = time.time() - start
+    # The sockets are left open, as the legacy sender keeps selecting on
+    # the slow one
+    return (per_switch * switches / sending, len(fast) * per_switch / elapsed)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    switches = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    of_01.log.setLevel("ERROR")
+    for (name, cls) in (("legacy", LegacyConnection), ("current", Connection)):
+        (sent, received) = run(cls, n, switches)
+        print "%-8s %10.0f sent/s %10.0f received/s by the fast switches" % (
+            name, sent, received)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Load test for POX's OpenFlow connection loop.
+#
+# Connects a growing number of emulated switches (switch_impl.SwitchImpl) to
+# a controller running of_01. At each step, every switch must complete the
+# handshake (hello, features and the barrier POX sends before ConnectionUp),
+# and then sends an echo request every second for a while. A step is
+# sustained if no switch was left behind or disconnected, and the controller
+# answered nearly every echo in time. Prints the numbers of each step and the
+# largest number of switches sustained.
+#
+# Unless --controller is given, POX is started with of_01 on a free port,
+# using the select() loop with --select and the epoll one otherwise.
+#
+# Usage: PYTHONPATH=../pox python bench_of_switches.py [options] [steps...]
+#        e.g. python bench_of_switches.py --select 250 500 1000 2000
+
+import errno
+import optparse
+import os
+import resource
+import select
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+from pox.lib.ioworker.io_worker import IOWorker
+from pox.openflow.libopenflow_01 import *
+from pox.openflow.switch_impl import SwitchImpl
+
+POX = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                   "..", "pox", "pox.py")
+
+DEFAULT_STEPS = (250, 500, 1000, 2000, 4000)
+# New connections opened per round of the event loop
+CONNECT_BURST = 100
+# Seconds allowed for the handshakes of a step
+HANDSHAKE_TIMEOUT = 30
+# Echo requests are spread over this many slots of each second
+ECHO_SLOTS = 10
+# Share of echo requests that must be answered within the deadline
+ECHO_QUORUM = 0.99
+
+TIMESTAMP = struct.Struct("!d")
+
+class EmulatedSwitch:
+    def __init__(self, bench, dpid):
+        self.bench = bench
+        self.switch = SwitchImpl(dpid, ports=4)
+        self.worker = IOWorker()
+        self.switch.set_io_worker(self.worker)
+        handlers = self.switch.ofp_handlers
+        handlers[OFPT_BARRIER_REQUEST] = self.on_barrier_request(
+            handlers[OFPT_BARRIER_REQUEST])
+        handlers[OFPT_ECHO_REPLY] = self.on_echo_reply
+        self.sock = None
+        self.writing = False
+        self.connected = False
+        self.closed = False
+
+    def connect(self, address):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(0)
+        self.sock.connect_ex(address)
+
+    # POX sends a barrier once it has the features reply, and raises
+    # ConnectionUp when it gets the reply
+    def on_barrier_request(self, handler):
+        def on_barrier_request(ofp):
+            handler(ofp)
+            if not self.connected:
+                self.connected = True
+                self.bench.connected += 1
+        return on_barrier_request
+
+    def on_echo_reply(self, ofp):
+        (sent,) = TIMESTAMP.unpack(ofp.body[:TIMESTAMP.size])
+        self.bench.rtts.append(time.time() - sent)
+
+    def send_echo(self):
+        echo = ofp_echo_request(body=TIMESTAMP.pack(time.time()))
+        echo.length = len(echo)
+        self.switch.send(echo)
+
+class Bench:
+    def __init__(self, address, deadline):
+        self.address = address
+        self.deadline = deadline
+        self.poller = select.epoll()
+        # fd -> EmulatedSwitch
+        self.switches = {}
+        self.connected = 0
+        self.disconnected = 0
+        self.rtts = []
+
+    def add_switches(self, n):
+        for i in xrange(n):
+            s = EmulatedSwitch(self, len(self.switches) + 1)
+            s.connect(self.address)
+            self.switches[s.sock.fileno()] = s
+            self.poller.register(s.sock.fileno(), select.EPOLLIN)
+            self.flush(s)
+
+    def close(self, s):
+        if s.closed:
+            return
+        s.closed = True
+        self.disconnected += 1
+        self.poller.unregister(s.sock.fileno())
+        s.sock.close()
+
+    def flush(self, s):
+        try:
+            while s.worker.send_buf:
+                n = s.sock.send(s.worker.send_buf)
+                s.worker._consume_send_buf(n)
+        except socket.error as e:
+            if e.args[0] not in (errno.EAGAIN, errno.ENOTCONN):
+                self.close(s)
+                return
+        writing = len(s.worker.send_buf) > 0
+        if writing != s.writing:
+            s.writing = writing
+            mask = select.EPOLLIN | (select.EPOLLOUT if writing else 0)
+            self.poller.modify(s.sock.fileno(), mask)
+
+    def poll(self, timeout):
+        for (fd, events) in self.poller.poll(timeout):
+            s = self.switches[fd]
+            if s.closed:
+                continue
+            if events & select.EPOLLIN:
+                try:
+                    data = s.sock.recv(65536)
+                except socket.error:
+                    data = ""
+                if not data:
+                    self.close(s)
+                    continue
+                s.worker._push_receive_data(data)
+            self.flush(s)
+
+    def alive(self):
+        return [s for s in self.switches.itervalues() if not s.closed]
+
+    # Opens switches until there are n, and waits for their handshakes.
+    # Returns the seconds it took.
+    def ramp_up(self, n):
+        start = time.time()
+        while time.time() - start < HANDSHAKE_TIMEOUT:
+            if len(self.switches) < n:
+                self.add_switches(min(CONNECT_BURST, n - len(self.switches)))
+            elif self.connected + self.disconnected >= n:
+                break
+            self.poll(0.01)
+        return time.time() - start
+
+    # Sends each switch an echo request per second for the given seconds.
+    # Returns (sent, answered in time).
+    def measure(self, duration):
+        switches = self.alive()
+        self.rtts = []
+        sent = 0
+        start = time.time()
+        slot = 0
+        while time.time() - start < duration:
+            for s in switches[slot % ECHO_SLOTS::ECHO_SLOTS]:
+                if not s.closed:
+                    s.send_echo()
+                    self.flush(s)
+                    sent += 1
+            slot += 1
+            end = start + float(slot) / ECHO_SLOTS
+            while time.time() < end:
+                self.poll(max(0, end - time.time()))
+        # Give the last echoes their chance
+        end = time.time() + self.deadline
+        while time.time() < end and len(self.rtts) < sent:
+            self.poll(0.01)
+        return (sent, len([r for r in self.rtts if r <= self.deadline]))
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def start_controller(port, use_epoll):
+    args = [sys.executable, POX, "--no-cli", "log.level", "--WARNING",
+            "openflow.of_01", "--port=%d" % port,
+            "--epoll=%s" % use_epoll]
+    controller = subprocess.Popen(args, cwd=os.path.dirname(POX))
+    # Wait for it to listen
+    for i in range(100):
+        if controller.poll() is not None:
+            raise RuntimeError("POX exited with %d" % controller.returncode)
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if probe.connect_ex(("127.0.0.1", port)) == 0:
+            probe.close()
+            return controller
+        probe.close()
+        time.sleep(0.1)
+    controller.kill()
+    raise RuntimeError("POX isn't listening on port %d" % port)
+
+def free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def raise_fd_limit():
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options] [steps...]")
+    parser.add_option("--controller", metavar="HOST:PORT",
+                      help="use a running controller instead of starting POX")
+    parser.add_option("--select", action="store_true", default=False,
+                      help="start POX with the select() loop")
+    parser.add_option("--duration", type="float", default=5,
+                      help="seconds of echo requests at each step")
+    parser.add_option("--deadline", type="float", default=1,
+                      help="seconds an echo reply may take")
+    (options, args) = parser.parse_args()
+    steps = [int(a) for a in args] or DEFAULT_STEPS
+
+    # Both ends of every connection may be in this process and POX's
+    limit = raise_fd_limit()
+    if max(steps) + 64 > limit:
+        print "warning: open file limit is %d" % limit
+
+    controller = None
+    if options.controller:
+        (host, port) = options.controller.rsplit(":", 1)
+        address = (host, int(port))
+    else:
+        address = ("127.0.0.1", free_port())
+        controller = start_controller(address[1], not options.select)
+
+    bench = Bench(address, options.deadline)
+    sustained = 0
+    try:
+        print "%8s %9s %8s %9s %9s %9s %9s" % ("switches", "connected",
+            "dropped", "ramp (s)", "echo ok", "p50 (ms)", "p99 (ms)")
+        for n in steps:
+            ramp = bench.ramp_up(n)
+            (sent, answered) = bench.measure(options.duration)
+            ok = float(answered) / sent if sent else 0
+            print "%8d %9d %8d %9.1f %8.1f%% %9.1f %9.1f" % (
+                n, bench.connected, bench.disconnected, ramp, ok * 100,
+                percentile(bench.rtts, 0.5) * 1000,
+                percentile(bench.rtts, 0.99) * 1000)
+            sys.stdout.flush()
+            if bench.connected < n or bench.disconnected or \
+               ok < ECHO_QUORUM:
+                break
+            sustained = n
+    finally:
+        if controller is not None:
+            controller.terminate()
+            controller.wait()
+    print "sustained %d switches" % sustained
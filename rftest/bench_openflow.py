@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Micro-benchmarks for packing and unpacking the OpenFlow messages POX
+# handles most: the flow mods rfproxy installs for routes, the PACKET_INs and
+# PACKET_OUTs of the routing protocols and ARP, and the ports of features
+# replies. Prints the operations per second of each case.
+#
+# Usage: PYTHONPATH=../pox python bench_openflow.py [iterations] [case...]
+
+import sys
+import time
+
+from pox.lib.addresses import EthAddr, IPAddr
+from pox.openflow.libopenflow_01 import *
+
+SRC_MAC = EthAddr("02:00:00:00:00:01")
+DST_MAC = EthAddr("02:00:00:00:00:02")
+FRAME = "\x00" * 64
+
+# A route, as made by rflib.openflow.rfofmsg.create_flow_mod
+def route_flow_mod(i=0):
+    ofm = ofp_flow_mod()
+    ofm.command = OFPFC_ADD
+    ofm.idle_timeout = OFP_FLOW_PERMANENT
+    ofm.hard_timeout = OFP_FLOW_PERMANENT
+    ofm.out_port = OFPP_NONE
+    ofm.match.dl_type = 0x0800
+    ofm.match.set_nw_dst(IPAddr(0x0a000000 + (i << 8)), 24)
+    ofm.actions.append(ofp_action_dl_addr(type=OFPAT_SET_DL_SRC,
+                                          dl_addr=SRC_MAC))
+    ofm.actions.append(ofp_action_dl_addr(type=OFPAT_SET_DL_DST,
+                                          dl_addr=DST_MAC))
+    ofm.actions.append(ofp_action_output(port=2))
+    return ofm
+
+def packet_out():
+    return ofp_packet_out(data=FRAME, in_port=OFPP_NONE,
+                          actions=[ofp_action_output(port=1)])
+
+def packet_in():
+    return ofp_packet_in(xid=0, buffer_id=-1, in_port=1, reason=OFPR_ACTION,
+                         data=FRAME)
+
+def features_reply(ports=4):
+    return ofp_features_reply(datapath_id=1, ports=[
+        ofp_phy_port(port_no=i, hw_addr=EthAddr("02:00:00:00:01:%02x" % i),
+                     name="eth%d" % i) for i in range(1, ports + 1)])
+
+def change(match):
+    match.in_port = 1 - (match.in_port or 0)
+    return match
+
+def unpacker(cls, data):
+    def unpack():
+        cls().unpack(data)
+    return unpack
+
+def cases():
+    ofm = route_flow_mod()
+    ofm.xid = 1
+    match = ofm.match
+    pout = packet_out()
+    pout.xid = 1
+    pin = packet_in()
+    features = features_reply()
+    features.xid = 1
+    port = features.ports[0]
+    return [
+        ("flow_mod build+pack",
+         lambda: route_flow_mod().pack()),
+        ("flow_mod pack", ofm.pack),
+        ("flow_mod unpack", unpacker(ofp_flow_mod, ofm.pack())),
+        ("match pack", lambda: match.pack(flow_mod=True)),
+        ("match change+pack", lambda: change(match).pack(flow_mod=True)),
+        ("match unpack", unpacker(ofp_match, match.pack())),
+        ("action_output pack", ofp_action_output(port=1).pack),
+        ("packet_out build+pack", lambda: packet_out().pack()),
+        ("packet_out unpack", unpacker(ofp_packet_out, pout.pack())),
+        ("packet_in pack", pin.pack),
+        ("packet_in unpack", unpacker(ofp_packet_in, pin.pack())),
+        ("phy_port pack", port.pack),
+        ("features_reply unpack",
+         unpacker(ofp_features_reply, features.pack())),
+    ]
+
+def run(fn, n):
+    start = time.time()
+    for i in xrange(n):
+        fn()
+    return n / (time.time() - start)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    selected = sys.argv[2:]
+    for (name, fn) in cases():
+        if selected and name not in selected:
+            continue
+        rate = max(run(fn, n) for i in range(3))
+        print "%-24s %10.0f ops/s" % (name, rate)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Micro-benchmark for the Match/Action/Option TLV codec.
+#
+# Encodes and decodes the TLVs of a typical RouteMod (as built by RFServer)
+# with the current struct-based codec and with the previous hex-string codec,
+# checks that both produce the same bytes and prints the cost per RouteMod.
+#
+# Usage: PYTHONPATH=.. python bench_tlv.py [iterations]
+
+import sys
+import timeit
+from socket import *
+from binascii import *
+from bson.binary import Binary
+
+from rflib.types.Match import *
+from rflib.types.Action import *
+from rflib.types.Option import *
+
+# Previous codec, kept here as the baseline
+def legacy_int_to_bin(num, length):
+    hexnum = hex(num)[2:]
+    hexnum = hexnum if len(hexnum) % 2 == 0 else '0' + hexnum
+    return a2b_hex(((length/4 - len(hexnum)) * '0') + hexnum)
+
+def legacy_bin_to_int(value):
+    return int(b2a_hex(value), 16)
+
+def legacy_bin_to_ether(value):
+    hexval = b2a_hex(value)
+    return '%2s:%2s:%2s:%2s:%2s:%2s' % (hexval[:2], hexval[2:4], hexval[4:6],
+                                        hexval[6:8], hexval[8:10], hexval[10:])
+
+class LegacyTLV(object):
+    def __init__(self, _type=None, _value=None):
+        self._type = _type
+        if(_type != None):
+            self._value = Binary(_value, 0)
+        else:
+            self._value = _value
+
+    @classmethod
+    def from_dict(cls, dic):
+        tlv = cls()
+        tlv._type = dic['type']
+        tlv._value = dic['value']
+        return tlv
+
+    def to_dict(self):
+        return { 'type' : self._type, 'value' : self._value }
+
+    def set_value(self, value):
+        self._value = Binary(self.type_to_bin(self._type, value), 0)
+
+class LegacyMatch(LegacyTLV):
+    def __init__(self, matchType=None, value=None):
+        super(LegacyMatch, self).__init__(matchType, self.type_to_bin(matchType, value))
+
+    @staticmethod
+    def type_to_bin(matchType, value):
+        if matchType == RFMT_IPV4:
+            return inet_pton(AF_INET, value[0]) + inet_pton(AF_INET, value[1])
+        elif matchType == RFMT_ETHERNET:
+            return a2b_hex(value.replace(':', ''))
+        elif matchType in (RFMT_MPLS, RFMT_IN_PORT):
+            return legacy_int_to_bin(value, 32)
+        else:
+            return None
+
+    def get_value(self):
+        if self._type == RFMT_IPV4:
+            return (inet_ntop(AF_INET, self._value[:4]),
+                    inet_ntop(AF_INET, self._value[4:]))
+        elif self._type == RFMT_ETHERNET:
+            return legacy_bin_to_ether(self._value)
+        elif self._type in (RFMT_MPLS, RFMT_IN_PORT):
+            return legacy_bin_to_int(self._value)
+        else:
+            return None
+
+class LegacyAction(LegacyTLV):
+    def __init__(self, actionType=None, value=None):
+        super(LegacyAction, self).__init__(actionType, self.type_to_bin(actionType, value))
+
+    @staticmethod
+    def type_to_bin(actionType, value):
+        if actionType in (RFAT_OUTPUT, RFAT_PUSH_MPLS, RFAT_SWAP_MPLS):
+            return legacy_int_to_bin(value, 32)
+        elif actionType in (RFAT_SET_ETH_SRC, RFAT_SET_ETH_DST):
+            return a2b_hex(value.replace(':', ''))
+        else:
+            return None
+
+    def get_value(self):
+        if self._type in (RFAT_OUTPUT, RFAT_PUSH_MPLS, RFAT_SWAP_MPLS):
+            return legacy_bin_to_int(self._value)
+        elif self._type in (RFAT_SET_ETH_SRC, RFAT_SET_ETH_DST):
+            return legacy_bin_to_ether(self._value)
+        else:
+            return None
+
+class LegacyOption(LegacyTLV):
+    def __init__(self, optionType=None, value=None):
+        super(LegacyOption, self).__init__(optionType, self.type_to_bin(optionType, value))
+
+    @staticmethod
+    def type_to_bin(optionType, value):
+        if optionType in (RFOT_PRIORITY, RFOT_IDLE_TIMEOUT, RFOT_HARD_TIMEOUT):
+            return legacy_int_to_bin(value, 16)
+        elif optionType == RFOT_CT_ID:
+            return legacy_int_to_bin(value, 64)
+        else:
+            return None
+
+    def get_value(self):
+        return legacy_bin_to_int(self._value)
+
+def encode(match=Match, action=Action, option=Option):
+    return [match(RFMT_IPV4, ("172.31.1.0", "255.255.255.0")).to_dict(),
+            match(RFMT_ETHERNET, "12:a0:a0:a0:a0:a0").to_dict(),
+            match(RFMT_IN_PORT, 3).to_dict(),
+            action(RFAT_SET_ETH_SRC, "12:a0:a0:a0:a0:a0").to_dict(),
+            action(RFAT_SET_ETH_DST, "12:b1:b1:b1:b1:b1").to_dict(),
+            action(RFAT_OUTPUT, 2).to_dict(),
+            option(RFOT_PRIORITY, 0x8018).to_dict(),
+            option(RFOT_CT_ID, 0).to_dict()]
+
+def decode(tlvs, match=Match, action=Action, option=Option):
+    return [cls.from_dict(tlv).get_value()
+            for (cls, tlv) in zip((match, match, match, action, action, action,
+                                   option, option), tlvs)]
+
+def legacy_encode():
+    return encode(LegacyMatch, LegacyAction, LegacyOption)
+
+def legacy_decode(tlvs):
+    return decode(tlvs, LegacyMatch, LegacyAction, LegacyOption)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    new = encode()
+    old = legacy_encode()
+    assert [str(t['value']) for t in new] == [str(t['value']) for t in old]
+    assert decode(new) == legacy_decode(old)
+
+    setup = "from __main__ import encode, decode, legacy_encode, legacy_decode"
+    for (name, stmt, init) in (
+            ("encode (legacy)", "legacy_encode()", ""),
+            ("encode", "encode()", ""),
+            ("decode (legacy)", "legacy_decode(t)", "; t = legacy_encode()"),
+            ("decode", "decode(t)", "; t = encode()")):
+        t = min(timeit.repeat(stmt, setup + init, repeat=5, number=n))
+        print "%-16s %8.2f us/RouteMod" % (name, t / n * 1e6)
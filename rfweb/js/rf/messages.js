@@ -90,25 +90,41 @@ function process_message(i, msgprefix, msg) {
     msg["style"] = i % 2;
 }
 
-function update_table(table, msgprefix) {
-    var msgtypes = $('input[name=types]:checked').map(function() {
+MESSAGES_SHOWN = 50; // Same as the default limit of /messages
+
+var shown = {}; // Messages shown in each table, newest first
+var message_events = undefined; // Stream of live updates
+var prefixes = {
+    "rfclient_rfserver": "ss",
+    "rfserver_rfproxy": "sc",
+};
+
+function checked_types() {
+    return $('input[name=types]:checked').map(function() {
         return this.value;
     }).get();
-    
+}
+
+function show_table(table) {
+    var rows = "";
+    for (var i in shown[table]) {
+        var msg = $.extend(true, {}, shown[table][i]);
+        process_message(i, prefixes[table], msg);
+        rows += apply_template(rowtemplate, msg);
+    }
+    $("#" + table).html(rows);
+}
+
+function update_table(table, msgprefix) {
     var request = table.replace("_", "<->");
-    request += "?types=" + msgtypes;
-    
-    var table = $("#" + table);
-    table.html("");
+    request += "?types=" + checked_types();
     
     $.ajax({
         url: "messages/" + request,
         dataType: 'json',
         success: function (data) {
-            for (var i in data) {
-                process_message(i, msgprefix, data[i]);
-                table.html(table.html() + apply_template(rowtemplate, data[i]));
-            }
+            shown[table] = data;
+            show_table(table);
         }
     });
 }
@@ -118,6 +134,17 @@ function update() {
     update_table("rfserver_rfproxy", "sc");
 }
 
+// New message in a channel (see rfevents.py)
+function on_message(event) {
+    var table = event.channel.replace("<->", "_");
+    if (shown[table] == undefined ||
+        $.inArray(String(event.message.type), checked_types()) == -1)
+        return;
+    shown[table].unshift(event.message);
+    shown[table] = shown[table].slice(0, MESSAGES_SHOWN);
+    show_table(table);
+}
+
 function toggle(id) {
     var el = document.getElementById(id + "_content");
     var ex = document.getElementById(id + "_expand");
@@ -155,8 +182,16 @@ function start() {
 
 function messages_init() {
 	start();
-	update(); 
+	// The messages are loaded when the stream opens
+	message_events = subscribe("topics=messages", {
+	    "open": update,
+	    "message": on_message,
+	});
 }
 
 function messages_stop() {
+    if (message_events != undefined) {
+        message_events.close();
+        message_events = undefined;
+    }
 }
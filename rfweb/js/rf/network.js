@@ -17,7 +17,13 @@ var labelType, useGradients, nativeTextSupport, animate;
 var rgraph = undefined; // Network graph
 var previous_pos = {}; // Keep the positions when updating
 var selected_node = undefined; // Selected node id
-var interval_id; // Update timer
+var selected_data = undefined; // Stats of the selected node
+var topology = {}; // Nodes by id, as in /topology
+var events = undefined; // Stream of live updates
+var updating = false; // Whether changes are drawn as they come
+var draw_timer = undefined; // Changes are drawn at most every DRAW_DELAY ms
+var info_timer = undefined;
+DRAW_DELAY = 500;
 
 // From: http://thejit.org/static/v20/Jit/Examples/RGraph/example1.js
 (function() {
@@ -116,6 +122,10 @@ function show_info(node, data) {
 		    list.push("Packet count: " + data.aggregate.packet_count);
 		    list.push("Byte count: " + data.aggregate.byte_count);
 		    list.push("Flow count: " + data.aggregate.flow_count);
+		    if (data.aggregate.packet_rate != undefined) {
+		        list.push("Packet rate: " + data.aggregate.packet_rate + " packets/s");
+		        list.push("Byte rate: " + data.aggregate.byte_rate + " bytes/s");
+		    }
 		    info = info + list.join("</li><li>") + "</li></ul></div>";
 	    }
 
@@ -161,86 +171,97 @@ function show_info(node, data) {
 function prettify_match(match) {
     var string = "";
     for (var m in match) {
-        if (m != "wildcards")
-            string += m + ": " + flow.match[m] + ", "
+        string += m + ": " + match[m] + ", "
     }
     return string.replace(new RegExp(", $"), "");
 }
 
 function prettify_actions(actions) {
-    function get_params_list(params) {
-        var params_list = [];
-        var elements = params.split(", ");
-        for (var i in elements)
-            params_list.push(elements[i].split(": "));
-        return params_list;
-    }
-
     var string = "";
-    var re = /(\w*)\[([^\]]*)\]/;
     for (var i in actions) {
-        var result = actions[i].match(re);
-        if (result == null || result == undefined || result.length < 3) {
-            string += actions[i] + ", ";
-            continue;
-        }
-
-        var action = result[1];
-        var params = result[2];
-
-        // ofp_action_output
-        if (action == "ofp_action_output") {
-            action = "OUTPUT";
-            var params_list = get_params_list(params);
-            params = ""
-            for (var i in params_list) {
-                var param = params_list[i][0];
-                var value = params_list[i][1];
-                // port
-                if (param == "port") {
-                    if (parseInt(value) == 0xfffd)
-                        port = "CONTROLLER";
-                    params += "port: " + value + ", ";
-                }
-            }
-        }
-
-        // ofp_action_dl_addr
-        else if (action == "ofp_action_dl_addr") {
-
-            action = "";
-            var params_list = get_params_list(params);
-            params = ""
-            for (var i in params_list) {
-                var param = params_list[i][0];
-                var value = params_list[i][1];
-                // type
-                if (param == "type") {
-                    type = parseInt(value);
-                    if (type == 4)
-                        action = "SET_DL_SRC";
-                    else if (type == 5)
-                        action = "SET_DL_DST";
-                }
-                // dl_addr
-                else if (param == "dl_addr") {
-                    params += param + ": " + value + ", ";
-                }
-            }
+        var action = actions[i].type.replace(new RegExp("^OFPAT_"), "");
+        var params = "";
+        for (var param in actions[i]) {
+            // max_len only matters for the controller
+            if (param == "type" || param == "max_len")
+                continue;
+            var value = actions[i][param];
+            if (action == "OUTPUT" && param == "port" && value == 0xfffd)
+                value = "CONTROLLER";
+            params += param + ": " + value + ", ";
         }
-
-        // append action
         string += action + "(" + rstrip(params, ", ") + ")" + ", ";
     }
     return rstrip(string, ", ");
 }
 
 function network_start_updating() {
-    interval_id = setInterval("network_update()", 5000);
+    updating = true;
+    schedule_draw();
 }
 
 function network_stop_updating() {
-    clearInterval(interval_id);
+    updating = false;
+}
+
+function schedule_draw() {
+    if (draw_timer == undefined)
+        draw_timer = setTimeout(function () {
+            draw_timer = undefined;
+            if (updating)
+                draw();
+        }, DRAW_DELAY);
+}
+
+function schedule_info() {
+    if (info_timer == undefined)
+        info_timer = setTimeout(function () {
+            info_timer = undefined;
+            if (selected_data != undefined)
+                show_info(rgraph.graph.getNode(selected_node), selected_data);
+        }, DRAW_DELAY);
+}
+
+// Topology changes (see rfevents.py)
+function on_topology(event) {
+    if (event.op == "save")
+        topology[event.id] = {"id": event.id, "type": event.type,
+                              "links": event.links};
+    else if (event.op == "remove")
+        delete topology[event.id];
+    else if (event.op == "set" && event.id in topology)
+        for (var i in event.changes)
+            set_path(topology[event.id], event.changes[i][0],
+                     event.changes[i][1]);
+    schedule_draw();
+}
+
+// Changes to the stats of the selected node
+function on_switch(event) {
+    if (event.id != selected_node || selected_data == undefined)
+        return;
+    if (event.op == "save")
+        selected_data = event.doc.data;
+    else if (event.op == "set")
+        for (var i in event.changes) {
+            var path = event.changes[i][0];
+            if (path.substr(0, 5) == "data.")
+                set_path(selected_data, path.substr(5), event.changes[i][1]);
+        }
+    schedule_info();
+}
+
+function subscribe_events() {
+    if (events != undefined)
+        events.close();
+    var query = "topics=topology";
+    if (selected_node != undefined)
+        query += "&switch=" + encodeURIComponent(selected_node);
+    events = subscribe(query, {
+        "open": network_update,
+        "topology": on_topology,
+        "switch": on_switch,
+    });
 }
 
 function build() {
@@ -297,7 +318,10 @@ function build() {
             onClick: function(node, eventInfo, e) {
                 if (node) {
                     selected_node = node.id;
-                    node_update(node.id);
+                    selected_data = undefined;
+                    // Follow the stats of the new node, which are loaded
+                    // when the stream opens
+                    subscribe_events();
                 }
             },
 
@@ -333,6 +357,7 @@ function node_update(id) {
         function (data) {
             if (data == null || data == undefined)
                 return;
+            selected_data = data;
             show_info(rgraph.graph.getNode(selected_node), data);
         });
 }
@@ -343,71 +368,81 @@ function network_update() {
             if (data == null || data == undefined)
                 return;
 
-            // Pre-process data
-            nodes = [];
-            var center = 0;
-            for (var i in data) {
-                var node = data[i]
-                node["name"] = node["id"];
-                // Mark rfproxy as the central node (used when creating the graph)
-                if (node["name"] == "rfproxy")
-                    center = i;
-
-                if (node["type"] == "rfserver")
-                    node.name = "RFServer"
-                else if (node["type"] == "rfproxy")
-                    node.name = "RFProxy"
-                else if (is_rfvs(node.id))
-                    node.name = "RouteFlow virtual switch"
-
-                node["data"] = {};
-                if (node["type"] == "switch")
-                    node["data"]["$height"] = ICON_SIZE/5 + SPACING + LABEL_SIZE;
-                node["data"]["$type"] = node["type"];
-                delete node["type"];
-                node["adjacencies"] = node["links"];
-                delete node["links"];
-                nodes.push(node);
-            }
+            topology = {};
+            for (var i in data)
+                topology[data[i].id] = data[i];
+            draw();
 
-            // If the graph hasn't been built yet, build it
-            if (rgraph == undefined) {
-                build();
-                rgraph.loadJSON(nodes, center);
-                rgraph.plot();
-                rgraph.refresh();
-                rgraph.canvas.scale(0.7, 0.7);
-                return;
+            if (selected_node != undefined) {
+                node_update(selected_node);
             }
+    });
+}
 
-            // Save old node positions
-            rgraph.graph.eachNode(function(node) {
-                previous_pos[node.id] = node.getPos();
-            });
+function draw() {
+    // Pre-process data
+    nodes = [];
+    var center = 0;
+    for (var id in topology) {
+        var node = {"id": id, "name": id};
+        // Mark rfproxy as the central node (used when creating the graph)
+        if (node["name"] == "rfproxy")
+            center = nodes.length;
+
+        var type = topology[id]["type"];
+        if (type == "rfserver")
+            node.name = "RFServer"
+        else if (type == "rfproxy")
+            node.name = "RFProxy"
+        else if (is_rfvs(node.id))
+            node.name = "RouteFlow virtual switch"
+
+        node["data"] = {};
+        if (type == "switch")
+            node["data"]["$height"] = ICON_SIZE/5 + SPACING + LABEL_SIZE;
+        node["data"]["$type"] = type;
+        node["adjacencies"] = topology[id]["links"];
+        nodes.push(node);
+    }
 
-            // Update
-            rgraph.loadJSON(nodes);
-            rgraph.refresh();
+    // If the graph hasn't been built yet, build it
+    if (rgraph == undefined) {
+        build();
+        rgraph.loadJSON(nodes, center);
+        rgraph.plot();
+        rgraph.refresh();
+        rgraph.canvas.scale(0.7, 0.7);
+        return;
+    }
 
-            // Restore old positions
-            rgraph.graph.eachNode(function(node) {
-                if (node.id in previous_pos) {
-                    node.setPos(previous_pos[node.id]);
-                }
-            });
-            rgraph.plot();
+    // Save old node positions
+    rgraph.graph.eachNode(function(node) {
+        previous_pos[node.id] = node.getPos();
+    });
 
-            if (selected_node != undefined) {
-                node_update(selected_node);
-            }
+    // Update
+    rgraph.loadJSON(nodes);
+    rgraph.refresh();
+
+    // Restore old positions
+    rgraph.graph.eachNode(function(node) {
+        if (node.id in previous_pos) {
+            node.setPos(previous_pos[node.id]);
+        }
     });
+    rgraph.plot();
 }
 
 function network_init() {
-    network_start_updating();
-    network_update();
+    updating = true;
+    // The topology is loaded when the stream opens
+    subscribe_events();
 }
 
 function network_stop() {
 	network_stop_updating();
+	if (events != undefined) {
+	    events.close();
+	    events = undefined;
+	}
 }
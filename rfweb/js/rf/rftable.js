@@ -7,29 +7,74 @@ rowtemplate += "<td>{vs_id}</td>"
 rowtemplate += "<td>{vs_port}</td>"
 rowtemplate += "</tr>"
 
+// Ids are stored as "0x" and 16 hex digits (see rftable.py), which may not
+// fit in a JavaScript number
+function table_id(value) {
+    if (value == null)
+        return "";
+    return "0x" + value.substr(2).toUpperCase();
+}
+
 function process_entry(i, msg) {
     msg["id"] = i;
-    msg["vm_id"] = toHex(parseInt(msg["vm_id"]), 64)
-    msg["vs_id"] = toHex(parseInt(msg["vs_id"]), 64)
-    msg["dp_id"] = toHex(parseInt(msg["dp_id"]), 64)
+    msg["vm_id"] = table_id(msg["vm_id"])
+    msg["vs_id"] = table_id(msg["vs_id"])
+    msg["dp_id"] = table_id(msg["dp_id"])
     msg["style"] = i % 2;
 }
 
-function rftable_init() {
-    var table = document.getElementById("rftable");
+var rftable_entries = {}; // Entries by id
+var rftable_events = undefined; // Stream of live updates
+
+function rftable_show() {
+    var data = [];
+    for (var id in rftable_entries)
+        data.push($.extend({}, rftable_entries[id]));
+    // TODO: this sort doesn't seem to be working. Figure out why.
+    data.sort(function(a, b) { return a["vm_id"] < b["vm_id"]; });
+    var rows = "";
+    for (var i in data) {
+        process_entry(i, data[i])
+        rows += apply_template(rowtemplate, data[i]);
+    }
+    $("#rftable_entries").html(rows);
+}
+
+function rftable_load() {
     $.ajax({
         url: "/rftable",
         dataType: 'jsonp',
         success: function (data) {
-            // TODO: this sort doesn't seem to be working. Figure out why.
-            data.sort(function(a, b) { return a["vm_id"] < b["vm_id"]; });
-            for (var i in data) {
-                process_entry(i, data[i])
-                table.innerHTML += apply_template(rowtemplate, data[i]);
-            }
+            rftable_entries = {};
+            for (var i in data)
+                rftable_entries[id_key(data[i]["_id"])] = data[i];
+            rftable_show();
         }
     });
 }
 
+// Changes to the table (see rfevents.py)
+function rftable_change(event) {
+    if (event.op == "save")
+        rftable_entries[id_key(event.id)] = event.doc;
+    else if (event.op == "remove")
+        delete rftable_entries[id_key(event.id)];
+    else if (event.op == "clear")
+        rftable_entries = {};
+    rftable_show();
+}
+
+function rftable_init() {
+    // The table is loaded when the stream opens
+    rftable_events = subscribe("topics=rftable", {
+        "open": rftable_load,
+        "rftable": rftable_change,
+    });
+}
+
 function rftable_stop() {
+    if (rftable_events != undefined) {
+        rftable_events.close();
+        rftable_events = undefined;
+    }
 }
@@ -29,3 +29,42 @@ function apply_template(template, data) {
     }
     return code;
 }
+
+// Opens a stream of live updates from /events. handlers maps event names to
+// functions receiving the decoded data. handlers.open is called whenever the
+// stream is (re)connected or falls behind, when the page should reload.
+function subscribe(query, handlers) {
+    var source = new EventSource("/events?" + query);
+    for (var name in handlers) {
+        if (name == "open")
+            continue;
+        (function (handler) {
+            source.addEventListener(name, function (e) {
+                handler(JSON.parse(e.data));
+            });
+        })(handlers[name]);
+    }
+    if (handlers.open != undefined) {
+        source.addEventListener("open", handlers.open);
+        source.addEventListener("reset", handlers.open);
+    }
+    return source;
+}
+
+// Sets the value at a dotted path (e.g. "flows.3.packet_count") of object
+function set_path(object, path, value) {
+    var keys = path.split(".");
+    for (var i = 0; i < keys.length - 1; i++) {
+        if (object[keys[i]] == undefined)
+            object[keys[i]] = {};
+        object = object[keys[i]];
+    }
+    object[keys[keys.length - 1]] = value;
+}
+
+// Key for an id as serialized by rfweb (ObjectIds are {"$oid": ...})
+function id_key(id) {
+    if (id != null && id["$oid"] != undefined)
+        return id["$oid"];
+    return id;
+}
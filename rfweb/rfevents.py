@@ -0,0 +1,162 @@
+# Live updates for rfweb
+#
+# A thread per capped collection tails the changes recorded by rfserver and
+# rfstats (see RFEVENTS_NAME in rflib/defs.py) and the messages sent on the
+# IPC channels, and hands them to the subscribers interested in them. Mongo is
+# read once, however many browsers are connected.
+
+import Queue
+import threading
+import time
+
+import pymongo
+
+from rflib.defs import MONGO_DB_NAME, RFEVENTS_NAME, \
+                       RFCLIENT_RFSERVER_CHANNEL, RFSERVER_RFPROXY_CHANNEL
+
+CHANNELS = (RFCLIENT_RFSERVER_CHANNEL, RFSERVER_RFPROXY_CHANNEL)
+
+TOPICS = ("topology", "rftable", "messages")
+# Fields of the rfstats documents shown in the topology. The rest (data.*) is
+# only sent to the subscribers of each switch.
+TOPOLOGY_FIELDS = ("type", "links")
+
+# Tailable cursors die on empty collections; reopen them after a short wait
+TAIL_RETRY_INTERVAL = 0.5
+# A subscriber that falls this many events behind is sent a reset event
+# instead, and reloads
+SUBSCRIBER_QUEUE_SIZE = 1024
+
+class Subscriber:
+    def __init__(self, topics, switch):
+        self.topics = topics
+        self.switch = switch
+        self.queue = Queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, name, data):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait((name, data))
+        except Queue.Full:
+            self.overflowed = True
+
+    # Returns the next (name, data), or None if there was none for timeout
+    # seconds
+    def get(self, timeout):
+        if self.overflowed:
+            try:
+                while True:
+                    self.queue.get_nowait()
+            except Queue.Empty:
+                pass
+            self.overflowed = False
+            return ("reset", {})
+        try:
+            return self.queue.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+
+class EventHub:
+    # connect returns the Mongo connection to read from
+    def __init__(self, connect):
+        self.connect = connect
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def subscribe(self, topics, switch=None):
+        subscriber = Subscriber(topics, switch)
+        with self.lock:
+            if not self.started:
+                self.started = True
+                self.start()
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def start(self):
+        tailers = [(RFEVENTS_NAME, self.on_change)]
+        for channel in CHANNELS:
+            tailers.append((channel, self.message_handler(channel)))
+        for (name, handler) in tailers:
+            worker = threading.Thread(target=self.tail, args=(name, handler))
+            worker.daemon = True
+            worker.start()
+
+    def tail(self, name, handler):
+        collection = None
+        last = None
+        while True:
+            try:
+                if collection is None:
+                    collection = self.connect()[MONGO_DB_NAME][name]
+                    # Only what is written from now on is sent
+                    newest = list(collection.find(
+                                      sort=[("$natural", pymongo.DESCENDING)],
+                                      limit=1))
+                    if newest:
+                        last = newest[0]["_id"]
+                cursor = collection.find(tailable=True, await_data=True)
+                # Capped collections keep insertion order, so everything up to
+                # and including the last document has been sent. If it was
+                # rotated out of the collection, every document is newer.
+                skipping = last is not None and \
+                           collection.find_one({"_id": last}) is not None
+                while cursor.alive:
+                    try:
+                        doc = cursor.next()
+                    except StopIteration:
+                        continue
+                    if skipping:
+                        skipping = doc["_id"] != last
+                        continue
+                    last = doc["_id"]
+                    handler(doc)
+            except pymongo.errors.PyMongoError:
+                pass
+            time.sleep(TAIL_RETRY_INTERVAL)
+
+    def publish(self, name, data, topic=None, switch=None):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            if (topic is not None and topic in subscriber.topics) or \
+               (switch is not None and switch == subscriber.switch):
+                subscriber.put(name, data)
+
+    def on_change(self, event):
+        del event["_id"]
+        source = event.pop("source", None)
+        if source == "rftable":
+            self.publish("rftable", event, topic="rftable")
+        elif source == "rfstats":
+            self.publish("switch", event, switch=event["id"])
+            event = topology_event(event)
+            if event is not None:
+                self.publish("topology", event, topic="topology")
+
+    def message_handler(self, channel):
+        def on_message(envelope):
+            self.publish("message", {"channel": channel, "message": envelope},
+                         topic="messages")
+        return on_message
+
+# The part of an rfstats change that affects the topology, if any
+def topology_event(event):
+    op = event["op"]
+    if op == "save":
+        doc = event["doc"]
+        return {"op": op, "id": event["id"], "type": doc["type"],
+                "links": doc["links"]}
+    elif op == "set":
+        changes = [(path, value) for (path, value) in event["changes"]
+                   if path.split(".", 1)[0] in TOPOLOGY_FIELDS]
+        if not changes:
+            return None
+        return {"op": op, "id": event["id"], "changes": changes}
+    return {"op": op, "id": event["id"]}
@@ -7,12 +7,20 @@
 
 from cgi import parse_qs, escape
 import json
+import urllib
 import urlparse
 from wsgiref.util import shift_path_info
 import pymongo
 import bson.json_util
+import bson.errors
 import os
 import os.path
+import time
+import itertools
+import threading
+import hashlib
+
+import rfevents
 
 PLAIN = 0
 HTML = 1
@@ -22,6 +30,7 @@ JS = 4
 GIF = 5
 PNG = 6
 JPEG = 7
+EVENT_STREAM = 8
 
 CONTENT_TYPES = {
 PLAIN: "text/plain",
@@ -32,6 +41,7 @@ JS: "text/javascript",
 GIF: "image/gif",
 PNG: "image/png",
 JPEG: "image/jpeg",
+EVENT_STREAM: "text/event-stream",
 }
 
 exts = {
@@ -45,23 +55,146 @@ exts = {
 ".json": JSON,
 }
 
+# The connection is shared by the server threads, each request taking a
+# socket from its pool
+DB_POOL_SIZE = 16
 db_conn = None
+db_lock = threading.Lock()
+
+def get_connection():
+    global db_conn
+    with db_lock:
+        if db_conn is None:
+            try:
+                db_conn = pymongo.Connection("localhost", 27017,
+                                             max_pool_size=DB_POOL_SIZE,
+                                             auto_start_request=False)
+            except:
+                db_conn = None
+        return db_conn
+
+# JSON responses are kept for this many seconds, so that dashboards polling
+# the same resource share one query, and are tagged so that clients can
+# revalidate them with If-None-Match
+CACHE_TTL = 1.0
+CACHE_MAX_ENTRIES = 256
+
+class ResponseCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expiry time, status, body, content type, ETag)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self.entries[key]
+                return None
+            return entry[1:]
+
+    def put(self, key, status, body, ctype):
+        etag = '"{0}"'.format(hashlib.md5(body).hexdigest())
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                now = time.time()
+                for (k, entry) in self.entries.items():
+                    if entry[0] < now:
+                        del self.entries[k]
+                if len(self.entries) >= self.max_entries:
+                    self.entries.clear()
+            self.entries[key] = (time.time() + self.ttl, status, body, ctype,
+                                 etag)
+        return etag
+
+cache = ResponseCache(CACHE_TTL, CACHE_MAX_ENTRIES)
+
+# JSONP callbacks and the cache busters of jQuery ("_") do not change the
+# response, so they are left out of the cache key
+UNCACHED_PARAMETERS = ("callback", "_")
+
+def cache_key(env):
+    params = urlparse.parse_qsl(env.get("QUERY_STRING", ""), True)
+    params = sorted(p for p in params if p[0] not in UNCACHED_PARAMETERS)
+    return env.get("PATH_INFO", "") + "?" + urllib.urlencode(params)
+
+# The body is cached before being wrapped in the JSONP callback, so the
+# callback is part of the tag of the response
+def jsonp_etag(etag, callback):
+    return '{0}-{1}"'.format(etag[:-1], hashlib.md5(callback).hexdigest())
+
+def etag_matches(env, etag):
+    tags = env.get("HTTP_IF_NONE_MATCH")
+    if tags is None:
+        return False
+    tags = [tag.strip() for tag in tags.split(",")]
+    return "*" in tags or etag in tags
+
+# Collections with more documents than this are streamed instead of being
+# built into a single string, sending this many documents per chunk. The
+# first documents are read ahead to tell, so no count is queried.
+STREAM_MIN_DOCS = 1000
+STREAM_CHUNK_DOCS = 100
+
+def json_list(docs, transform=None):
+    if transform is not None:
+        docs = (transform(doc) for doc in docs)
+    else:
+        docs = iter(docs)
+    head = list(itertools.islice(docs, STREAM_MIN_DOCS + 1))
+    if len(head) <= STREAM_MIN_DOCS:
+        return json.dumps(head, default=bson.json_util.default)
+    return json_stream(itertools.chain(head, docs))
+
+def json_stream(docs):
+    chunk = ["["]
+    first = True
+    for doc in docs:
+        if not first:
+            chunk.append(", ")
+        first = False
+        chunk.append(json.dumps(doc, default=bson.json_util.default))
+        if len(chunk) >= 2 * STREAM_CHUNK_DOCS:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("]")
+    yield "".join(chunk)
+
+# Messages are returned newest first. The next page is requested with
+# before=<_id of the last message>, and newer messages with after=<_id of the
+# first one>.
+MESSAGES_DEFAULT_LIMIT = 50
+MESSAGES_MAX_LIMIT = 1000
 
 def messages(env, conn):
     channel = shift_path_info(env)
     if channel != None and channel != "":
         # TODO: escape parameters
-        messages = []
         try:
             table = getattr(conn.db, channel);
         except:
             return (404, "Invalid channel", JSON)
 
         request = parse_qs(env["QUERY_STRING"])
-        limit = 50
+        limit = MESSAGES_DEFAULT_LIMIT
         query = {}
-        if "limit" in request:
-            limit = request["limit"][0]
+        try:
+            if "limit" in request:
+                limit = min(int(request["limit"][0]), MESSAGES_MAX_LIMIT)
+            if "before" in request:
+                query.setdefault("_id", {})["$lt"] = \
+                    bson.ObjectId(request["before"][0])
+            if "after" in request:
+                query.setdefault("_id", {})["$gt"] = \
+                    bson.ObjectId(request["after"][0])
+        except (ValueError, bson.errors.InvalidId):
+            return (400, "Invalid parameters", PLAIN)
+        if limit <= 0:
+            return (400, "Invalid limit", PLAIN)
         if "types" in request:
             types = request["types"][0]
             query["$or"] = []
@@ -72,10 +205,9 @@ def messages(env, conn):
                     continue
                 query["$or"].append({"type": value})
 
-        for doc in table.find(query, limit=limit, sort=[("$natural", pymongo.DESCENDING)]):
-            messages.append(doc)
-
-        return (200, json.dumps(messages, default=bson.json_util.default), JSON)
+        docs = table.find(query, limit=limit,
+                          sort=[("_id", pymongo.DESCENDING)])
+        return (200, json_list(docs), JSON)
 
 
     else:
@@ -85,29 +217,147 @@ def messages(env, conn):
 def switch(env, conn):
     id_ = shift_path_info(env)
     if id_ != None and id_ != "":
+        if shift_path_info(env) == "series":
+            return series(env, conn, id_)
         switch = conn.db.rfstats.find_one(id_)
         return (200, json.dumps(switch["data"], default=bson.json_util.default), JSON)
     else:
         return (404, "Switch not specified", JSON)
 
+# Periods of the time series tiers written by rfstats (see rfseries.py), and
+# the number of points in each of their documents
+SERIES_TIERS = (5, 60, 3600)
+SERIES_POINTS_PER_DOCUMENT = 720
+# The finest tier giving at most this many points is used by default
+SERIES_MAX_POINTS = 1000
+
+def series(env, conn, id_):
+    request = parse_qs(env["QUERY_STRING"])
+    now = time.time()
+    try:
+        end = float(request.get("end", [now])[0])
+        start = float(request.get("start", [end - 3600])[0])
+        if "tier" in request:
+            tier = int(request["tier"][0])
+        else:
+            tier = SERIES_TIERS[-1]
+            for period in SERIES_TIERS:
+                if (end - start) / period <= SERIES_MAX_POINTS:
+                    tier = period
+                    break
+    except ValueError:
+        return (400, "Invalid parameters", PLAIN)
+    if tier not in SERIES_TIERS:
+        return (400, "Invalid tier", PLAIN)
+
+    # Only the documents whose span overlaps the range are read
+    span = tier * SERIES_POINTS_PER_DOCUMENT
+    docs = conn.db.rfseries.find({"switch": id_, "tier": tier,
+                                  "start": {"$gt": start - span, "$lte": end}},
+                                 sort=[("start", pymongo.ASCENDING)])
+    points = [point for doc in docs for point in doc["points"]
+              if start <= point["t"] <= end]
+    return (200, json.dumps({"tier": tier, "points": points}), JSON)
+
+def topology_element(element):
+    element["id"] = element["_id"]
+    del element["_id"]
+    return element
+
 def topology(env, conn):
-    elements_list = []
-    elements = conn.db.rfstats.find()
-    for element in elements:
-        element["id"] = element["_id"]
-        del element["_id"]
-        del element["data"]
-        elements_list.append(element)
-    return (200, json.dumps(elements_list, default=bson.json_util.default), JSON)
+    # The flows and counters are left out by the query
+    elements = conn.db.rfstats.find(fields={"data": False})
+    return (200, json_list(elements, topology_element), JSON)
         
 def rftable(env, conn):
-    entries = []
-    for doc in conn.db.rftable.find():
-        entries.append(doc)
-    return (200, json.dumps(entries, default=bson.json_util.default), JSON)
+    return (200, json_list(conn.db.rftable.find()), JSON)
+
+
+hub = rfevents.EventHub(get_connection)
+
+# A comment is sent after this many seconds without events, so that proxies
+# and browsers keep the stream open
+EVENTS_KEEPALIVE = 15
+# Milliseconds browsers wait before reconnecting
+EVENTS_RETRY = 2000
+
+def events(env, conn):
+    request = parse_qs(env["QUERY_STRING"])
+    topics = set(request.get("topics", [""])[0].split(","))
+    topics &= set(rfevents.TOPICS)
+    switch = request.get("switch", [None])[0]
+    if not topics and switch is None:
+        return (400, "No topics", PLAIN)
+    return (200, event_stream(hub.subscribe(topics, switch)), EVENT_STREAM)
+
+def event_stream(subscriber):
+    try:
+        yield "retry: {0}\n\n".format(EVENTS_RETRY)
+        while True:
+            event = subscriber.get(EVENTS_KEEPALIVE)
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            (name, data) = event
+            yield "event: {0}\ndata: {1}\n\n".format(
+                      name, json.dumps(data, default=bson.json_util.default))
+    # Closed by the server when the client goes away
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+                     .replace("\n", "\\n")
+
+def metrics(env, conn):
+    request = parse_qs(env["QUERY_STRING"])
+    docs = list(conn.db.ipcmetrics.find())
+    if request.get("format", [None])[0] == "json":
+        return (200, json.dumps(docs, default=bson.json_util.default), JSON)
+
+    # Prometheus text format, one histogram per metric name
+    histograms = {}
+    for doc in docs:
+        for h in doc["histograms"]:
+            histograms.setdefault(h["name"], []).append((doc["_id"], h))
 
+    lines = []
+    for name in sorted(histograms):
+        lines.append("# TYPE {0} histogram".format(name))
+        for (process, h) in histograms[name]:
+            labels = 'process="{0}",channel="{1}",type="{2}"'.format(
+                         label_value(process), label_value(h["channel"]),
+                         h["type"])
+            total = 0
+            for (bound, count) in zip(h["bounds"] + ["+Inf"], h["counts"]):
+                total += count
+                lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                                 name, labels, bound, total))
+            lines.append("{0}_sum{{{1}}} {2!r}".format(name, labels, h["sum"]))
+            lines.append("{0}_count{{{1}}} {2}".format(name, labels,
+                                                        h["count"]))
+    return (200, "\n".join(lines) + "\n", PLAIN)
+
+
+STATUS_LINES = {
+200: "200 OK",
+304: "304 Not Modified",
+400: "400 Bad Request",
+404: "404 Not Found",
+}
+
+API = {
+"rftable": rftable,
+"topology": topology,
+"switch": switch,
+"messages": messages,
+"metrics": metrics,
+"events": events,
+}
 
 def application(env, start_response):
+    key = cache_key(env)
     path = shift_path_info(env)
     request = parse_qs(env["QUERY_STRING"])
     try:
@@ -115,25 +365,25 @@ def application(env, start_response):
     except KeyError:
         callback = None
     
-    global db_conn
-    if db_conn is None:
-        try:
-            db_conn = pymongo.Connection("localhost", 27017)
-        except:
-            db_conn = None
-    
     status = 404
     rbody = ""
     ctype = PLAIN
+    etag = None
 
-    if (path == "rftable"):
-        status, rbody, ctype = rftable(env, db_conn)
-    elif (path == "topology"):
-        status, rbody, ctype = topology(env, db_conn)        
-    elif (path == "switch"):
-        status, rbody, ctype = switch(env, db_conn)
-    elif (path == "messages"):
-        status, rbody, ctype = messages(env, db_conn)
+    if path in API:
+        cached = cache.get(key)
+        if cached is not None:
+            status, rbody, ctype, etag = cached
+        else:
+            status, rbody, ctype = API[path](env, get_connection())
+            # Streamed responses are not cached
+            if status == 200 and isinstance(rbody, str):
+                etag = cache.put(key, status, rbody, ctype)
+        if etag is not None and ctype == JSON and callback is not None:
+            etag = jsonp_etag(etag, callback)
+        if etag is not None and etag_matches(env, etag):
+            start_response(STATUS_LINES[304], [("ETag", etag)])
+            return []
     else:
         path = os.path.join(os.getcwd(), path + env["PATH_INFO"])
         if os.path.exists(path) and os.path.isfile(path):
@@ -148,18 +398,40 @@ def application(env, start_response):
                     "GET /rftable: RouteFlow table\n" \
                     "GET /topology: network topology\n" \
                     "GET /switch/[id]: stats and flows for switch [id]\n" \
-                    "GET /messages/[channel]: messages in channel [channel]\n" \
+                    "GET /switch/[id]/series?start=&end=&tier=: aggregate " \
+                    "counters and rates of switch [id] over time\n" \
+                    "GET /messages/[channel]?limit=&before=&after=&types=: " \
+                    "messages in channel [channel], newest first, paged by " \
+                    "_id\n" \
+                    "GET /metrics: IPC latency histograms (Prometheus text " \
+                    "format, or JSON with ?format=json)\n" \
+                    "GET /events?topics=topology,rftable,messages&switch=: " \
+                    "server-sent events with the changes to the topology, " \
+                    "the RouteFlow table, the messages in the channels and " \
+                    "the stats of switch [switch]\n" \
                     "\n" \
                     "Pages:\n" \
                     "GET /index.html: main page\n"
 
+    streamed = not isinstance(rbody, str)
     if ctype == JSON and callback is not None:
-        rbody = "{0}({1})".format(callback, rbody)
-
-    if (status == 404):
-        start_response("404 Not Found", [("Content-Type", CONTENT_TYPES[ctype])])
-    elif (status == 200):
-        start_response("200 OK", [("Content-Type", CONTENT_TYPES[ctype]),
-                                  ("Content-Length", str(len(rbody)))])
+        if streamed:
+            rbody = itertools.chain([callback + "("], rbody, [")"])
+        else:
+            rbody = "{0}({1})".format(callback, rbody)
 
+    headers = [("Content-Type", CONTENT_TYPES[ctype])]
+    if status == 200:
+        if etag is not None:
+            headers.append(("ETag", etag))
+            # Clients keep the response but check it with the ETag every time
+            headers.append(("Cache-Control", "no-cache"))
+        if streamed:
+            if ctype == EVENT_STREAM:
+                headers.append(("Cache-Control", "no-cache"))
+            # No length: the server closes the connection or chunks the body
+            start_response(STATUS_LINES[status], headers)
+            return rbody
+        headers.append(("Content-Length", str(len(rbody))))
+    start_response(STATUS_LINES[status], headers)
     return [rbody]
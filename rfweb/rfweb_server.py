@@ -1,6 +1,13 @@
-from wsgiref.simple_server import make_server
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer
 import rfweb
 
-httpd = make_server("", 8080, rfweb.application)
+# Each request is handled in its own thread, so that a slow query does not
+# hold the other clients
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+httpd = make_server("", 8080, rfweb.application,
+                    server_class=ThreadingWSGIServer)
 print "Serving on 0.0.0.0:8080"
 httpd.serve_forever()
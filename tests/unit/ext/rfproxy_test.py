@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../pox")
+sys.path.append(os.path.dirname(__file__) + "/../../../pox/ext")
+
+from rflib.defs import *
+from rflib.ipc.RFProtocol import ROUTE_MOD
+from rflib.ipc.IPCMetrics import IPCMetrics
+from rflib.types.Action import *
+from rflib.types.Match import *
+from rflib.types.Route import Route
+import rflib.ipc.IPCService as IPCService
+from pox.openflow.libopenflow_01 import *
+
+class MockIPC(object):
+  """ Counts the inserts a MongoIPCMessageService would make """
+  def __init__(self):
+    self.metrics = IPCMetrics()
+    self.inserts = []
+
+  def send(self, channel_id, to, msg):
+    self.inserts.append([msg])
+
+  def send_many(self, channel_id, to, msgs):
+    self.inserts.append(list(msgs))
+
+# rfproxy creates its IPC service when imported
+create_ipc_service = IPCService.create_ipc_service
+IPCService.create_ipc_service = lambda *args, **kw: MockIPC()
+try:
+  import rfproxy
+finally:
+  IPCService.create_ipc_service = create_ipc_service
+
+class MockCore(object):
+  """ Runs what rfproxy hands to the POX thread when asked to """
+  def __init__(self):
+    self.later = []
+
+  def callLater(self, f, *args):
+    self.later.append((f, args))
+
+  def callDelayed(self, seconds, f, *args):
+    pass
+
+  def run(self):
+    while self.later:
+      (f, args) = self.later.pop(0)
+      f(*args)
+
+class MockConnection(object):
+  def __init__(self):
+    self.sent = []
+    self.blocked = False
+
+  def send(self, data):
+    if type(data) is not bytes:
+      data = data.pack()
+    self.sent.append(data)
+
+  def barriers(self):
+    """ xids of the barrier requests sent """
+    xids = []
+    for data in self.sent:
+      while data:
+        header = ofp_header()
+        header.unpack(data)
+        if header.header_type == OFPT_BARRIER_REQUEST:
+          xids.append(header.xid)
+        data = data[header.length:]
+    return xids
+
+def route(i):
+  return Route([Match.IPV4("10.0.%d.0" % i, "255.255.255.0").to_dict()],
+               [Action.OUTPUT(1).to_dict()])
+
+class RouteModResultTest(unittest.TestCase):
+  def setUp(self):
+    self.core = rfproxy.core
+    rfproxy.core = MockCore()
+    rfproxy.ipc = MockIPC()
+    self.connection = MockConnection()
+    self.pipeline = rfproxy.InstallPipeline(1, self.connection)
+    rfproxy.pipelines[1] = self.pipeline
+
+  def tearDown(self):
+    rfproxy.core = self.core
+    del rfproxy.pipelines[1]
+    rfproxy.desired_flows.pop(1, None)
+
+  def install(self, n):
+    for i in range(n):
+      rfproxy.install_routes(1, RMT_ADD, [route(i)], ROUTE_MOD, None)
+    rfproxy.core.run()
+
+  def test_one_insert_per_barrier(self):
+    n = 100
+    self.install(n)
+    barriers = self.connection.barriers()
+    self.assertEquals(len(barriers), 2)
+    self.assertEquals(rfproxy.ipc.inserts, [])
+    for xid in barriers:
+      self.pipeline.on_barrier(xid)
+    self.assertEquals(len(rfproxy.ipc.inserts), len(barriers))
+    results = sum(rfproxy.ipc.inserts, [])
+    self.assertEquals(len(results), n)
+    self.assertTrue(all(r.get_installed() == 1 for r in results))
+
+  def test_errors_sent_with_barrier(self):
+    self.install(3)
+    [barrier] = self.connection.barriers()
+    xid = min(self.pipeline.in_flight)
+    self.pipeline.on_error(xid, OFPET_FLOW_MOD_FAILED, OFPFMFC_ALL_TABLES_FULL)
+    self.assertEquals(rfproxy.ipc.inserts, [])
+    self.pipeline.on_barrier(barrier)
+    [results] = rfproxy.ipc.inserts
+    self.assertEquals(sorted(len(r.get_failed()) for r in results), [0, 0, 1])
+
+  def test_abort(self):
+    self.install(2)
+    xid = min(self.pipeline.in_flight)
+    self.pipeline.on_error(xid, OFPET_FLOW_MOD_FAILED, OFPFMFC_ALL_TABLES_FULL)
+    self.assertEquals(self.pipeline.abort(), 1)
+    self.assertEquals([len(msgs) for msgs in rfproxy.ipc.inserts], [1])
+
+  def test_disconnected_datapath(self):
+    rfproxy.install_routes(2, RMT_ADD, [route(0), route(1)], ROUTE_MOD, None)
+    [[result]] = rfproxy.ipc.inserts
+    self.assertEquals(result.get_id(), 2)
+    self.assertEquals(result.get_installed(), 0)
+    self.assertEquals(len(result.get_failed()), 2)
+
+  def test_blocked_connection(self):
+    self.connection.blocked = True
+    self.install(3)
+    self.assertEquals(self.connection.sent, [])
+    self.assertEquals(len(self.pipeline.queue), 3)
+    self.connection.blocked = False
+    rfproxy.on_send_queue_low(MockEvent(1, self.connection))
+    rfproxy.core.run()
+    self.assertEquals(len(self.pipeline.queue), 0)
+    [barrier] = self.connection.barriers()
+    self.pipeline.on_barrier(barrier)
+    self.assertEquals(len(sum(rfproxy.ipc.inserts, [])), 3)
+
+class MockEvent(object):
+  def __init__(self, dpid, connection):
+    self.dpid = dpid
+    self.connection = connection
+
+class ReconcileTest(unittest.TestCase):
+  def setUp(self):
+    self.core = rfproxy.core
+    rfproxy.core = MockCore()
+    rfproxy.ipc = MockIPC()
+    self.connection = MockConnection()
+    rfproxy.connections[1] = self.connection
+    rfproxy.pipelines[1] = rfproxy.InstallPipeline(1, self.connection)
+
+  def tearDown(self):
+    rfproxy.core = self.core
+    rfproxy.connections.pop(1, None)
+    rfproxy.pipelines.pop(1, None)
+    rfproxy.desired_flows.pop(1, None)
+
+  def flow_mods(self, connection, command):
+    ofms = []
+    for data in connection.sent:
+      while data:
+        header = ofp_header()
+        header.unpack(data)
+        if header.header_type == OFPT_FLOW_MOD:
+          ofm = ofp_flow_mod()
+          ofm.unpack(data[:header.length])
+          if ofm.command == command:
+            ofms.append(ofm)
+        data = data[header.length:]
+    return ofms
+
+  def test_reconnect(self):
+    rfproxy.install_routes(1, RMT_ADD, [route(0), route(1)], ROUTE_MOD, None)
+    rfproxy.core.run()
+    [barrier] = self.connection.barriers()
+    rfproxy.pipelines[1].on_barrier(barrier)
+    switch = [ofp_flow_stats(match=flow.match, priority=flow.priority,
+                             actions=flow.actions)
+              for flow in rfproxy.desired_flows[1].values()]
+
+    rfproxy.on_datapath_down(MockEvent(1, self.connection))
+    # RouteMods received while the datapath is down
+    rfproxy.ipc = MockIPC()
+    rfproxy.install_routes(1, RMT_DELETE, [route(1)], ROUTE_MOD, None)
+    rfproxy.install_routes(1, RMT_ADD, [route(2)], ROUTE_MOD, None)
+    results = sum(rfproxy.ipc.inserts, [])
+    self.assertEquals([len(r.get_failed()) for r in results], [1, 1])
+
+    connection = MockConnection()
+    pipeline = rfproxy.InstallPipeline(1, connection, reconcile=True)
+    pipeline.on_flow_stats(pipeline.reconcile_xid, switch)
+    rfproxy.core.run()
+    [delete] = self.flow_mods(connection, OFPFC_DELETE_STRICT)
+    [add] = self.flow_mods(connection, OFPFC_ADD)
+    self.assertEquals(delete.match, route_match(1))
+    self.assertEquals(add.match, route_match(2))
+    self.assertEquals(len(rfproxy.desired_flows[1]), 2)
+
+def route_match(i):
+  return ofp_match(dl_type=0x0800, nw_dst="10.0.%d.0/24" % i)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../pox/ext")
+
+from rfseries import *
+
+def sample(packets, rate):
+  return {"packet_count": packets, "byte_count": packets * 100,
+          "flow_count": 1, "packet_rate": rate, "byte_rate": rate * 100}
+
+class MockCollection(object):
+  """ Keeps the updates and removes made """
+  def __init__(self):
+    self.updates = []
+    self.removes = []
+
+  def ensure_index(self, keys):
+    pass
+
+  def update(self, spec, doc, upsert=False):
+    self.updates.append((spec, doc))
+
+  def remove(self, spec):
+    self.removes.append(spec)
+
+class SeriesTierTest(unittest.TestCase):
+  def test_rollover(self):
+    tier = SeriesTier(5)
+    self.assertEquals(tier.add(101, sample(10, 1.0)), None)
+    self.assertEquals(tier.add(104.5, sample(20, 3.0)), None)
+    point = tier.add(105, sample(30, 5.0))
+    self.assertEquals(point, {"t": 100, "packet_count": 20,
+                              "byte_count": 2000, "flow_count": 1,
+                              "packet_rate": 2.0, "byte_rate": 200.0})
+    point = tier.add(111, sample(40, 5.0))
+    self.assertEquals(point["t"], 105)
+    self.assertEquals(point["packet_count"], 30)
+
+  def test_gap(self):
+    tier = SeriesTier(60)
+    tier.add(0, sample(1, 1.0))
+    point = tier.add(600, sample(2, 1.0))
+    self.assertEquals(point["t"], 0)
+    self.assertEquals(tier.finish()["t"], 600)
+
+class SeriesStoreTest(unittest.TestCase):
+  def setUp(self):
+    self.collection = MockCollection()
+    self.store = SeriesStore(self.collection)
+
+  def tier_updates(self, period):
+    return [(spec, doc) for (spec, doc) in self.collection.updates
+            if doc["$set"]["tier"] == period]
+
+  def test_bucket_write(self):
+    for t in range(0, 20, 5):
+      self.store.add("sw", t, sample(t, 1.0))
+    updates = self.tier_updates(5)
+    self.assertEquals([spec["_id"] for (spec, _) in updates],
+                      ["sw:5:0"] * 3)
+    self.assertEquals([doc["$push"]["points"]["t"] for (_, doc) in updates],
+                      [0, 5, 10])
+    # The longer tiers have not finished a point yet
+    self.assertEquals(len(self.collection.updates), 3)
+
+  def test_bucket_expiry(self):
+    span = 5 * POINTS_PER_DOCUMENT
+    self.store.add("sw", 0, sample(0, 1.0))
+    self.store.add("sw", 5, sample(0, 1.0))
+    self.store.add("sw", 10, sample(0, 1.0))
+    # Only the first point of a bucket expires the old ones
+    self.assertEquals(self.collection.removes,
+                      [{"switch": "sw", "tier": 5,
+                        "start": {"$lt": -TIERS[0][1]}}])
+    self.store.add("sw", span, sample(0, 1.0))
+    self.store.add("sw", span + 5, sample(0, 1.0))
+    [spec, _] = self.tier_updates(5)[-1]
+    self.assertEquals(spec["_id"], "sw:5:%d" % span)
+    self.assertEquals(self.collection.removes[-1],
+                      {"switch": "sw", "tier": 5,
+                       "start": {"$lt": span - TIERS[0][1]}})
+
+  def test_delete(self):
+    self.store.add("sw", 0, sample(0, 1.0))
+    self.store.delete("sw")
+    self.store.add("sw", 5, sample(0, 1.0))
+    # The point being built was dropped with the switch
+    self.assertEquals(self.collection.updates, [])
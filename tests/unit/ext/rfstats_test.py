@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../pox")
+sys.path.append(os.path.dirname(__file__) + "/../../../pox/ext")
+
+import pymongo
+from pox.openflow.libopenflow_01 import *
+
+class MockCollection(object):
+  """ Accepts any operation """
+  def __getattr__(self, name):
+    return lambda *args, **kw: None
+
+class MockDB(object):
+  def __init__(self):
+    self.collections = {}
+
+  def create_collection(self, name, **kw):
+    return self[name]
+
+  def __getitem__(self, name):
+    return self.collections.setdefault(name, MockCollection())
+
+  def __getattr__(self, name):
+    return self[name]
+
+class MockMongo(object):
+  def __init__(self, *args, **kw):
+    self.db = MockDB()
+
+# rfstats connects to Mongo when imported
+Connection = pymongo.Connection
+pymongo.Connection = MockMongo
+try:
+  from rfstats import changed_fields, rate, SwitchCounters
+finally:
+  pymongo.Connection = Connection
+
+def changes(old, new):
+  result = {}
+  changed_fields("data", old, new, result)
+  return result
+
+def flow(i, packets, bytes_):
+  return ofp_flow_stats(table_id=0, priority=100,
+                        match=ofp_match(dl_type=0x0800,
+                                        nw_dst="10.0.%d.0/24" % i),
+                        packet_count=packets, byte_count=bytes_)
+
+class ChangedFieldsTest(unittest.TestCase):
+  def test_unchanged(self):
+    self.assertEquals(changes({"a": [1, {"b": 2}]}, {"a": [1, {"b": 2}]}), {})
+
+  def test_nested_dicts(self):
+    old = {"a": {"b": 1, "c": {"d": 2}}, "e": 3}
+    new = {"a": {"b": 1, "c": {"d": 4}}, "e": 3}
+    self.assertEquals(changes(old, new), {"data.a.c.d": 4})
+
+  def test_dict_keys_changed(self):
+    old = {"a": {"b": 1}}
+    new = {"a": {"b": 1, "c": 2}}
+    self.assertEquals(changes(old, new), {"data.a": {"b": 1, "c": 2}})
+
+  def test_lists_of_equal_length(self):
+    old = [{"packets": 1, "bytes": 10}, {"packets": 2, "bytes": 20}]
+    new = [{"packets": 1, "bytes": 10}, {"packets": 3, "bytes": 30}]
+    self.assertEquals(changes(old, new), {"data.1.packets": 3,
+                                          "data.1.bytes": 30})
+
+  def test_lists_of_unequal_length(self):
+    old = [1, 2]
+    new = [1, 2, 3]
+    self.assertEquals(changes(old, new), {"data": [1, 2, 3]})
+
+  def test_new_field(self):
+    self.assertEquals(changes(None, {"a": 1}), {"data": {"a": 1}})
+
+  def test_type_changed(self):
+    self.assertEquals(changes({"a": 1}, {"a": "1"}), {"data.a": "1"})
+
+class RateTest(unittest.TestCase):
+  def test_rate(self):
+    self.assertEquals(rate(100, 150, 5.0), 10.0)
+
+  def test_counter_reset(self):
+    self.assertEquals(rate(100, 20, 5.0), 0.0)
+
+  def test_no_time_elapsed(self):
+    self.assertEquals(rate(100, 150, 0), 0.0)
+
+class SwitchCountersTest(unittest.TestCase):
+  def keys(self, result):
+    return [f.match.nw_dst for (f, _, _) in result]
+
+  def test_rates(self):
+    counters = SwitchCounters()
+    result = counters.update_flows([flow(0, 10, 1000)], 100.0)
+    self.assertEquals([r[1:] for r in result], [(0.0, 0.0)])
+    result = counters.update_flows([flow(0, 30, 3000)], 105.0)
+    self.assertEquals([r[1:] for r in result], [(4.0, 400.0)])
+
+  def test_flow_replaced(self):
+    counters = SwitchCounters()
+    counters.update_flows([flow(0, 500, 50000)], 100.0)
+    # Same match and priority, counters starting over
+    result = counters.update_flows([flow(0, 5, 500)], 105.0)
+    self.assertEquals([r[1:] for r in result], [(0.0, 0.0)])
+    result = counters.update_flows([flow(0, 15, 1500)], 110.0)
+    self.assertEquals([r[1:] for r in result], [(2.0, 200.0)])
+
+  def test_order(self):
+    counters = SwitchCounters()
+    first = self.keys(counters.update_flows([flow(0, 0, 0), flow(1, 0, 0),
+                                             flow(2, 0, 0)], 100.0))
+    # The switch may list its flows in any order
+    result = counters.update_flows([flow(2, 0, 0), flow(0, 0, 0),
+                                    flow(1, 0, 0)], 105.0)
+    self.assertEquals(self.keys(result), first)
+    # Removed flows leave their place, new flows go last
+    result = counters.update_flows([flow(3, 0, 0), flow(2, 0, 0),
+                                    flow(0, 0, 0)], 110.0)
+    self.assertEquals(self.keys(result), [first[0], first[2],
+                                          flow(3, 0, 0).match.nw_dst])
+
+  def test_aggregate(self):
+    counters = SwitchCounters()
+    stats = ofp_aggregate_stats(packet_count=10, byte_count=100)
+    self.assertEquals(counters.update_aggregate(stats, 100.0), (0.0, 0.0))
+    stats = ofp_aggregate_stats(packet_count=20, byte_count=300)
+    self.assertEquals(counters.update_aggregate(stats, 110.0), (1.0, 20.0))
+    stats = ofp_aggregate_stats(packet_count=5, byte_count=50)
+    self.assertEquals(counters.update_aggregate(stats, 115.0), (0.0, 0.0))
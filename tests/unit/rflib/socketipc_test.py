@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os
+import os.path
+import shutil
+import socket
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from rflib.ipc.RFProtocol import DatapathDown
+from rflib.ipc.RFProtocolFactory import RFProtocolFactory
+from rflib.ipc.MongoIPC import FROM_FIELD, TO_FIELD
+import rflib.ipc.SocketIPC as SocketIPC
+
+CHANNEL = "test"
+
+class Recorder(object):
+  """ Keeps the messages it processes """
+  def __init__(self):
+    self.received = threading.Event()
+    self.msgs = []
+
+  def process(self, from_, to, channel, msg):
+    self.msgs.append(msg)
+    self.received.set()
+    return True
+
+def wait_for(condition, timeout=5):
+  deadline = time.time() + timeout
+  while not condition() and time.time() < deadline:
+    time.sleep(0.01)
+  return condition()
+
+class SocketIPCHubTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.address = "unix:" + os.path.join(self.dir, "ipc")
+    self.hub = SocketIPC.SocketIPCMessageService(self.address, "hub",
+                                                 hub=True)
+    self.assertTrue(wait_for(lambda: os.path.exists(self.address[5:])))
+    self.max_pending = SocketIPC.MAX_PENDING_FRAMES
+
+  def tearDown(self):
+    SocketIPC.MAX_PENDING_FRAMES = self.max_pending
+    shutil.rmtree(self.dir)
+
+  def connect_stuck_peer(self, id_):
+    """ A peer that introduces itself and never reads """
+    (sock, address) = SocketIPC.make_socket(self.address)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(address)
+    hello = {FROM_FIELD: id_, TO_FIELD: None}
+    sock.sendall(SocketIPC.encode_frame(SocketIPC.HELLO_CHANNEL, hello))
+    self.assertTrue(wait_for(lambda: id_ in self.hub._peers))
+    return sock
+
+  def test_stuck_peer(self):
+    stuck = self.connect_stuck_peer("stuck")
+    recorder = Recorder()
+    good = SocketIPC.SocketIPCMessageService(self.address, "good")
+    good.listen(CHANNEL, RFProtocolFactory(), recorder, False)
+    self.assertTrue(wait_for(lambda: "good" in self.hub._peers))
+
+    # Far more than the socket buffers of the stuck peer hold
+    msgs = [DatapathDown(ct_id=i, dp_id=i) for i in range(50000)]
+    sender = threading.Thread(target=self.hub.send_many,
+                              args=(CHANNEL, "stuck", msgs))
+    sender.daemon = True
+    sender.start()
+    sender.join(5)
+    self.assertFalse(sender.is_alive())
+
+    self.hub.send(CHANNEL, "good", DatapathDown(ct_id=1, dp_id=2))
+    self.assertTrue(recorder.received.wait(2))
+    self.assertEquals(recorder.msgs[0].get_dp_id(), 2)
+    stuck.close()
+
+  def test_pending_capped(self):
+    SocketIPC.MAX_PENDING_FRAMES = 10
+    for i in range(25):
+      self.hub.send(CHANNEL, "absent", DatapathDown(ct_id=0, dp_id=i))
+    self.assertEquals(len(self.hub._pending["absent"]), 10)
+
+    # The newest frames are the ones kept
+    recorder = Recorder()
+    peer = SocketIPC.SocketIPCMessageService(self.address, "absent")
+    peer.listen(CHANNEL, RFProtocolFactory(), recorder, False)
+    self.assertTrue(wait_for(lambda: len(recorder.msgs) == 10))
+    self.assertEquals([msg.get_dp_id() for msg in recorder.msgs],
+                      range(15, 25))
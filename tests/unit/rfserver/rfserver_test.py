@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import threading
+import logging
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../rfserver")
+
+from rflib.defs import *
+from rflib.ipc.IPCMetrics import IPCMetrics
+from rflib.ipc.RFProtocol import *
+from rflib.types.Action import *
+from rflib.types.Match import *
+from rftable import *
+from rfdispatch import RFDispatcher
+from rfserver import RFServer
+
+class MockWriter(object):
+  def save(self, data): pass
+  def remove(self, id_): pass
+  def save_many(self, saves, removes): pass
+
+def make_table(cls):
+  """ A table without a database behind it """
+  class Table(cls):
+    def __init__(self):
+      pass
+  table = Table()
+  table._lock = threading.RLock()
+  table._entries = {}
+  table._index = dict((fields, {}) for fields in table.indexes)
+  table._writer = MockWriter()
+  return table
+
+class MockIPC(object):
+  def __init__(self):
+    self.metrics = IPCMetrics()
+    self.sent = []
+
+  def send(self, channel_id, to, msg):
+    self.sent.append((to, msg))
+
+class MockBuffer(object):
+  """ Stands in for the MongoIPCMessageBuffer to rfproxy """
+  def __init__(self):
+    self.sent = []
+
+  def send(self, to, msg):
+    self.sent.append((to, msg))
+
+def make_server():
+  """ An RFServer with in-memory tables and no IPC """
+  class Server(RFServer):
+    def __init__(self):
+      pass
+  server = Server()
+  server.log = logging.getLogger("rfserver")
+  server.rftable = make_table(RFTable)
+  server.isltable = make_table(RFISLTable)
+  server.configured_rfvs = False
+  server.fanout_plans = {}
+  server.fanout_generation = 0
+  server.ipc = MockIPC()
+  server.rfproxy_buffer = MockBuffer()
+  server.dispatcher = RFDispatcher(server.route_key,
+                                   server.process_route_mod,
+                                   server.process_control)
+  return server
+
+def add_port(server, vm_id, vm_port, dp_id, dp_port):
+  server.rftable.set_entry(RFEntry(vm_id=vm_id, vm_port=vm_port, ct_id=0,
+                                   dp_id=dp_id, dp_port=dp_port,
+                                   vs_id=0x72667673000000ff, vs_port=dp_port,
+                                   eth_addr="02:00:00:00:00:%02x" % vm_port))
+
+def route_mod(mod, vm_id, prefix, vm_port):
+  return RouteMod(mod=mod, id=vm_id,
+                  matches=[Match.IPV4(prefix, "255.255.255.0").to_dict()],
+                  actions=[Action.OUTPUT(vm_port).to_dict()])
+
+class RouteModBatchingTest(unittest.TestCase):
+  def test_route_mod_sent_as_batch(self):
+    server = make_server()
+    for port in (1, 2, 3):
+      add_port(server, 1, port, 10, port)
+    server.process("1", RFSERVER_ID, RFCLIENT_RFSERVER_CHANNEL,
+                   route_mod(RMT_ADD, 1, "10.0.0.0", 1))
+    server.dispatcher.join()
+
+    # The route is replicated to the other two ports, in one message
+    self.assertEquals(len(server.rfproxy_buffer.sent), 1)
+    (to, msg) = server.rfproxy_buffer.sent[0]
+    self.assertEquals(to, "0")
+    self.assertEquals(msg.get_type(), ROUTE_MOD_BATCH)
+    self.assertEquals(msg.get_id(), 10)
+    self.assertEquals(msg.get_mod(), RMT_ADD)
+    in_ports = [Match.from_dict(m).get_value()
+                for route in msg.get_routes() for m in route["matches"]
+                if m["type"] == RFMT_IN_PORT]
+    self.assertEquals(in_ports, [2, 3])
+
+  def test_one_batch_per_datapath(self):
+    server = make_server()
+    for port in (1, 2):
+      add_port(server, 1, port, 10, port)
+    add_port(server, 2, 1, 20, 1)
+    add_port(server, 2, 2, 20, 2)
+    for vm_id in (1, 2):
+      server.process(str(vm_id), RFSERVER_ID, RFCLIENT_RFSERVER_CHANNEL,
+                     route_mod(RMT_ADD, vm_id, "10.0.0.0", 1))
+    server.dispatcher.join()
+    self.assertEquals(sorted(msg.get_id()
+                             for (to, msg) in server.rfproxy_buffer.sent),
+                      [10, 20])
+    for (to, msg) in server.rfproxy_buffer.sent:
+      self.assertEquals(msg.get_type(), ROUTE_MOD_BATCH)
+
+class RouteOrderTest(unittest.TestCase):
+  def test_add_and_delete_across_datapaths(self):
+    server = make_server()
+    # VM ports 1 and 3 are on datapath 10, ports 2 and 4 on datapath 20
+    add_port(server, 1, 1, 10, 1)
+    add_port(server, 1, 2, 20, 1)
+    add_port(server, 1, 3, 10, 2)
+    add_port(server, 1, 4, 20, 2)
+    # The route to a prefix moves back and forth between the datapaths
+    expected = []
+    for i in range(50):
+      for (mod, vm_port, dp_id) in ((RMT_ADD, 1, 10), (RMT_DELETE, 1, 10),
+                                    (RMT_ADD, 2, 20), (RMT_DELETE, 2, 20)):
+        server.process("1", RFSERVER_ID, RFCLIENT_RFSERVER_CHANNEL,
+                       route_mod(mod, 1, "10.0.0.0", vm_port))
+        expected.append((mod, dp_id))
+    server.dispatcher.join()
+    self.assertEquals([(msg.get_mod(), msg.get_id())
+                       for (to, msg) in server.rfproxy_buffer.sent], expected)
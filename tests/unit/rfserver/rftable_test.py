@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import threading
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../rfserver")
+
+from rftable import *
+
+class MockWriter(object):
+  """ Stands in for MongoWriteBehind, keeping the documents written """
+  def __init__(self):
+    self.docs = {}
+
+  def save(self, data):
+    self.docs[data["_id"]] = data
+
+  def remove(self, id_):
+    self.docs.pop(id_, None)
+
+  def save_many(self, saves, removes):
+    for data in saves:
+      self.save(data)
+    for id_ in removes:
+      self.remove(id_)
+
+def make_table(cls=RFTable):
+  """ A table without a database behind it """
+  class Table(cls):
+    def __init__(self):
+      pass
+  table = Table()
+  table._lock = threading.RLock()
+  table._entries = {}
+  table._index = dict((fields, {}) for fields in table.indexes)
+  table._writer = MockWriter()
+  return table
+
+class RFTableTypesTest(unittest.TestCase):
+  # Does not fit in a signed 64-bit integer
+  BIG_ID = 0x8000000000000001
+
+  def setUp(self):
+    self.table = make_table()
+    self.table.set_entry(RFEntry(ct_id=0, dp_id=self.BIG_ID, dp_port=1))
+    self.table.set_entry(RFEntry(ct_id=0, dp_id=2, dp_port=1))
+
+  def test_stored_ids(self):
+    docs = self.table._writer.docs.values()
+    self.assertEquals(sorted(doc["dp_id"] for doc in docs),
+                      ["0x0000000000000002", "0x8000000000000001"])
+    self.assertTrue(all(doc["dp_port"] == 1 for doc in docs))
+    self.assertTrue(all(doc["vm_id"] is None for doc in docs))
+
+  def test_query_types(self):
+    for dp_id in (self.BIG_ID, long(self.BIG_ID), "0x8000000000000001",
+                  str(self.BIG_ID)):
+      entry = self.table.get_entry_by_dp_port(0, dp_id, 1)
+      self.assertNotEquals(entry, None, "lookup by %r" % dp_id)
+      self.assertEquals(entry.dp_id, self.BIG_ID)
+    self.assertTrue(self.table.is_dp_registered("0", "0x0000000000000002"))
+
+  def test_set_entry_types(self):
+    self.table.set_entry(RFEntry(ct_id="0", dp_id="0x03", dp_port="4"))
+    entry = self.table.get_entry_by_dp_port(0, 3, 4)
+    self.assertEquals((entry.ct_id, entry.dp_id, entry.dp_port), (0, 3, 4))
+
+  def test_round_trip(self):
+    for data in self.table._writer.docs.values():
+      entry = RFEntry()
+      entry.from_dict(dict(data))
+      self.assertEquals(entry.to_dict(), data)
+
+  def test_older_documents(self):
+    # All strings, and integers with big ids as decimal strings
+    for data in ({"_id": 1, "vm_id": "", "vm_port": "", "ct_id": "0",
+                  "dp_id": "9223372036854775809", "dp_port": "1",
+                  "vs_id": "", "vs_port": "", "eth_addr": ""},
+                 {"_id": 2, "vm_id": None, "vm_port": None, "ct_id": 0,
+                  "dp_id": "9223372036854775809", "dp_port": 1,
+                  "vs_id": None, "vs_port": None, "eth_addr": None}):
+      entry = RFEntry()
+      entry.from_dict(data)
+      self.assertEquals(entry.dp_id, self.BIG_ID)
+      self.assertEquals(entry.to_dict()["dp_id"], "0x8000000000000001")
+
+class MockCollection(object):
+  """ A collection whose bulk operations fail a number of times first """
+  name = "rftable"
+
+  def __init__(self, failures):
+    self.failures = failures
+    self.docs = {}
+
+  def remove(self):
+    self.docs = {}
+
+  def initialize_unordered_bulk_op(self):
+    return MockBulk(self)
+
+class MockBulk(object):
+  def __init__(self, collection):
+    self.collection = collection
+    self.ops = []
+    self.id_ = None
+
+  def find(self, query):
+    self.id_ = query["_id"]
+    return self
+
+  def upsert(self):
+    return self
+
+  def replace_one(self, data):
+    self.ops.append((self.id_, data))
+
+  def remove_one(self):
+    self.ops.append((self.id_, None))
+
+  def execute(self):
+    if self.collection.failures:
+      self.collection.failures -= 1
+      raise mongo.errors.AutoReconnect("connection refused")
+    for (id_, data) in self.ops:
+      if data is None:
+        self.collection.docs.pop(id_, None)
+      else:
+        self.collection.docs[id_] = data
+
+class MongoWriteBehindTest(unittest.TestCase):
+  def setUp(self):
+    import rftable
+    self.retry_min = rftable.WRITE_RETRY_MIN
+    rftable.WRITE_RETRY_MIN = 0.001
+
+  def tearDown(self):
+    import rftable
+    rftable.WRITE_RETRY_MIN = self.retry_min
+
+  def test_retry_failed_write(self):
+    collection = MockCollection(failures=2)
+    writer = MongoWriteBehind(collection)
+    writer.save({"_id": 1, "a": 1})
+    writer.save({"_id": 2, "a": 2})
+    writer.flush()
+    self.assertEquals(collection.failures, 0)
+    self.assertEquals(sorted(collection.docs), [1, 2])
+
+  def test_newer_change_wins(self):
+    collection = MockCollection(failures=1)
+    writer = MongoWriteBehind(collection)
+    writer.save({"_id": 1, "a": 1})
+    writer.save({"_id": 1, "a": 2})
+    writer.flush()
+    self.assertEquals(collection.docs, {1: {"_id": 1, "a": 2}})
+
+  def test_requeue_under_newer_changes(self):
+    writer = MongoWriteBehind(MockCollection(failures=0))
+    # The worker waits for the condition, so it cannot take these changes
+    with writer._cond:
+      writer._pending = {1: {"_id": 1, "a": 2}}
+      writer._requeue(False, {1: {"_id": 1, "a": 1}, 2: None})
+      self.assertEquals(writer._pending, {1: {"_id": 1, "a": 2}, 2: None})
+      writer._pending = {}
+      writer._clear = True
+      writer._requeue(False, {3: None})
+      self.assertEquals(writer._pending, {})
+      writer._cond.notify()
+    writer.flush()
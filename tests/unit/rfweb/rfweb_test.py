@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import json
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../rfweb")
+
+import rfweb
+
+def request(path, query, etag=None):
+  env = {"PATH_INFO": path, "QUERY_STRING": query}
+  if etag is not None:
+    env["HTTP_IF_NONE_MATCH"] = etag
+  response = {}
+  def start_response(status, headers):
+    response["status"] = status
+    response["headers"] = dict(headers)
+  body = "".join(rfweb.application(env, start_response))
+  return (response["status"], response["headers"], body)
+
+class ResponseCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.calls = 0
+    self.api = rfweb.API
+    rfweb.API = {"rftable": self.rftable}
+    rfweb.cache = rfweb.ResponseCache(60, 16)
+
+  def tearDown(self):
+    rfweb.API = self.api
+
+  def rftable(self, env, conn):
+    self.calls += 1
+    return (200, json.dumps([{"vm_id": "0x0000000000000001"}]), rfweb.JSON)
+
+  def test_cache_key(self):
+    self.assertEquals(
+      rfweb.cache_key({"PATH_INFO": "/messages/x",
+                       "QUERY_STRING": "limit=5&callback=cb1&_=123&types=1"}),
+      rfweb.cache_key({"PATH_INFO": "/messages/x",
+                       "QUERY_STRING": "types=1&_=456&limit=5&callback=cb2"}))
+    self.assertNotEquals(
+      rfweb.cache_key({"PATH_INFO": "/messages/x", "QUERY_STRING": "limit=5"}),
+      rfweb.cache_key({"PATH_INFO": "/messages/x", "QUERY_STRING": "limit=6"}))
+
+  def test_jsonp_hits_cache(self):
+    (_, _, body1) = request("/rftable", "callback=cb1&_=1")
+    (_, _, body2) = request("/rftable", "callback=cb2&_=2")
+    self.assertEquals(self.calls, 1)
+    self.assertTrue(body1.startswith("cb1(") and body1.endswith(")"))
+    self.assertTrue(body2.startswith("cb2(") and body2.endswith(")"))
+    self.assertEquals(body1[4:], body2[4:])
+
+  def test_etag(self):
+    (_, headers, _) = request("/rftable", "callback=cb1&_=1")
+    etag = headers["ETag"]
+    (status, _, _) = request("/rftable", "callback=cb1&_=2", etag)
+    self.assertEquals(status, rfweb.STATUS_LINES[304])
+    # Another callback needs another body
+    (status, _, body) = request("/rftable", "callback=cb2&_=3", etag)
+    self.assertEquals(status, rfweb.STATUS_LINES[200])
+    self.assertTrue(body.startswith("cb2("))
+
+class JSONListTest(unittest.TestCase):
+  def test_small(self):
+    docs = [{"i": i} for i in range(rfweb.STREAM_MIN_DOCS)]
+    body = rfweb.json_list(docs)
+    self.assertTrue(isinstance(body, str))
+    self.assertEquals(json.loads(body), docs)
+
+  def test_streamed(self):
+    docs = [{"i": i} for i in range(rfweb.STREAM_MIN_DOCS + 1)]
+    body = rfweb.json_list(docs, lambda doc: {"j": doc["i"]})
+    self.assertFalse(isinstance(body, str))
+    self.assertEquals(json.loads("".join(body)),
+                      [{"j": i} for i in range(len(docs))])
+
+class MockSeries(object):
+  """ The rfseries collection, keeping the last query """
+  def __init__(self, docs):
+    self.docs = docs
+    self.query = None
+
+  def find(self, query, sort=None):
+    self.query = query
+    return self.docs
+
+class MockConnection(object):
+  def __init__(self, docs):
+    class DB(object):
+      pass
+    self.db = DB()
+    self.db.rfseries = MockSeries(docs)
+
+class SeriesTest(unittest.TestCase):
+  def series(self, query, docs=[]):
+    conn = MockConnection(docs)
+    env = {"QUERY_STRING": query}
+    (status, body, ctype) = rfweb.series(env, conn, "sw")
+    if status != 200:
+      return (status, body, conn.db.rfseries.query)
+    return (status, json.loads(body), conn.db.rfseries.query)
+
+  def test_tier_selection(self):
+    # The finest tier giving at most SERIES_MAX_POINTS points
+    for (span, tier) in ((3600, 5), (36000, 60), (86400, 3600)):
+      (_, body, query) = self.series("start=0&end=%d" % span)
+      self.assertEquals(body["tier"], tier)
+      self.assertEquals(query["tier"], tier)
+
+  def test_explicit_tier(self):
+    (_, body, _) = self.series("start=0&end=86400&tier=5")
+    self.assertEquals(body["tier"], 5)
+    (status, _, _) = self.series("start=0&end=86400&tier=7")
+    self.assertEquals(status, 400)
+    (status, _, _) = self.series("start=0&end=x")
+    self.assertEquals(status, 400)
+
+  def test_range(self):
+    docs = [{"points": [{"t": t} for t in range(0, 3600, 5)]},
+            {"points": [{"t": t} for t in range(3600, 7200, 5)]}]
+    (_, body, query) = self.series("start=3000&end=4000&tier=5", docs)
+    span = 5 * rfweb.SERIES_POINTS_PER_DOCUMENT
+    self.assertEquals(query["start"], {"$gt": 3000 - span, "$lte": 4000})
+    self.assertEquals([p["t"] for p in body["points"]],
+                      range(3000, 4001, 5))